@@ -1,21 +1,43 @@
 import asyncio
 import json
 import logging
+import time
+from collections import deque
+from collections.abc import AsyncIterator, Callable
+from contextlib import asynccontextmanager
 from typing import Any
 
 import aiohttp
-from tenacity import before_sleep_log, retry, retry_if_exception_type, wait_fixed
+from tenacity import (RetryCallState, before_sleep_log, retry, retry_if_exception_type, wait_exponential_jitter,
+                      wait_fixed)
 
 from botli_dataclasses import API_Challenge_Reponse, Challenge_Request
 from config import Config
 from enums import Decline_Reason, Variant
+from position_cache import Position_Cache
+from request_scheduler import Rate_Limit_Error, Request_Scheduler
+from stream_decoder import Stream_Decoder
+from stream_events import Event_Stream_Event, Game_Stream_Event
 
 logger = logging.getLogger(__name__)
+
+
+def wait_unless_rate_limited(wait: Callable[[RetryCallState], float]) -> Callable[[RetryCallState], float]:
+    def wait_func(retry_state: RetryCallState) -> float:
+        # The scheduler already holds the retry back until the Retry-After of the server has passed.
+        if retry_state.outcome and isinstance(retry_state.outcome.exception(), Rate_Limit_Error):
+            return 0.0
+
+        return wait(retry_state)
+
+    return wait_func
+
+
 BASIC_RETRY_CONDITIONS = {'retry': retry_if_exception_type((aiohttp.ClientError, TimeoutError)),
-                          'wait': wait_fixed(5.0),
+                          'wait': wait_unless_rate_limited(wait_fixed(5.0)),
                           'before_sleep': before_sleep_log(logger, logging.DEBUG)}
 JSON_RETRY_CONDITIONS = {'retry': retry_if_exception_type((aiohttp.ClientError, json.JSONDecodeError, TimeoutError)),
-                         'wait': wait_fixed(5.0),
+                         'wait': wait_unless_rate_limited(wait_fixed(5.0)),
                          'before_sleep': before_sleep_log(logger, logging.DEBUG)}
 GAME_STREAM_RETRY_CONDITIONS = {'retry': retry_if_exception_type((aiohttp.ClientError,
                                                                   json.JSONDecodeError,
@@ -23,19 +45,38 @@ GAME_STREAM_RETRY_CONDITIONS = {'retry': retry_if_exception_type((aiohttp.Client
                                 'wait': wait_fixed(1.0),
                                 'before_sleep': before_sleep_log(logger, logging.DEBUG)}
 MOVE_RETRY_CONDITIONS = {'retry': retry_if_exception_type((aiohttp.ClientError, TimeoutError)),
-                         'wait': wait_fixed(1.0),
+                         'wait': wait_unless_rate_limited(wait_exponential_jitter(initial=0.05, max=0.5, jitter=0.1)),
                          'before_sleep': before_sleep_log(logger, logging.DEBUG)}
 STREAM_TIMEOUT = aiohttp.ClientTimeout(sock_connect=5.0, sock_read=9.0)
+MOVE_KEEPALIVE_INTERVAL = 15.0
+MOVE_IDLE_TIME = 120.0
+MOVE_LATENCY_SAMPLES = 500
 
 
 class API:
     def __init__(self, config: Config) -> None:
+        # Every running game holds one connection of this session for its stream.
+        lichess_connector = aiohttp.TCPConnector(limit=config.event_loop.connection_limit,
+                                                 limit_per_host=config.event_loop.connection_limit_per_host)
         self.lichess_session = aiohttp.ClientSession(config.url, headers={'Authorization': f'Bearer {config.token}',
                                                                           'User-Agent': f'BotLi/{config.version}'},
+                                                     connector=lichess_connector,
                                                      timeout=aiohttp.ClientTimeout(total=5.0))
         self.external_session = aiohttp.ClientSession(headers={'User-Agent': f'BotLi/{config.version}'})
+        move_connector = aiohttp.TCPConnector(limit=0, keepalive_timeout=2 * MOVE_KEEPALIVE_INTERVAL)
+        self.move_session = aiohttp.ClientSession(config.url, headers={'Authorization': f'Bearer {config.token}',
+                                                                       'User-Agent': f'BotLi/{config.version}'},
+                                                  connector=move_connector,
+                                                  timeout=aiohttp.ClientTimeout(total=1.0))
+        self.move_latencies: deque[float] = deque(maxlen=MOVE_LATENCY_SAMPLES)
+        self.last_move_time = 0.0
+        self.keepalive_task: asyncio.Task[None] | None = None
+        self.position_cache = Position_Cache(config.position_cache)
+        self.stream_decoder = Stream_Decoder()
+        self.scheduler = Request_Scheduler()
 
     async def __aenter__(self) -> 'API':
+        self.keepalive_task = asyncio.create_task(self._keep_move_session_warm())
         return self
 
     async def __aexit__(self, *_) -> None:
@@ -44,15 +85,36 @@ class API:
     def append_user_agent(self, username: str) -> None:
         self.lichess_session.headers['User-Agent'] += f' user:{username}'
         self.external_session.headers['User-Agent'] += f' user:{username}'
+        self.move_session.headers['User-Agent'] += f' user:{username}'
 
     async def close(self) -> None:
+        if self.keepalive_task:
+            self.keepalive_task.cancel()
+
         await self.lichess_session.close()
         await self.external_session.close()
+        await self.move_session.close()
+        await self.position_cache.close()
+
+    @asynccontextmanager
+    async def _request(self,
+                       method: str,
+                       path: str,
+                       session: aiohttp.ClientSession | None = None,
+                       **kwargs: Any) -> AsyncIterator[aiohttp.ClientResponse]:
+        priority = self.scheduler.get_priority(path)
+        await self.scheduler.acquire(priority)
+        async with (session or self.lichess_session).request(method, path, **kwargs) as response:
+            if response.status == 429:
+                retry_after = self.scheduler.pause(priority, response.headers.get('Retry-After'))
+                raise Rate_Limit_Error(priority, retry_after)
+
+            yield response
 
     @retry(**BASIC_RETRY_CONDITIONS)
     async def abort_game(self, game_id: str) -> bool:
         try:
-            async with self.lichess_session.post(f'/api/bot/game/{game_id}/abort') as response:
+            async with self._request('POST', f'/api/bot/game/{game_id}/abort') as response:
                 response.raise_for_status()
                 return True
         except aiohttp.ClientResponseError as e:
@@ -61,7 +123,7 @@ class API:
 
     @retry(**JSON_RETRY_CONDITIONS)
     async def accept_challenge(self, challenge_id: str) -> bool:
-        async with self.lichess_session.post(f'/api/challenge/{challenge_id}/accept') as response:
+        async with self._request('POST', f'/api/challenge/{challenge_id}/accept') as response:
             json_response = await response.json()
             if 'error' in json_response:
                 print(f'Challenge "{challenge_id}" could not be accepted: {json_response["error"]}')
@@ -71,7 +133,7 @@ class API:
     @retry(**BASIC_RETRY_CONDITIONS)
     async def cancel_challenge(self, challenge_id: str) -> bool:
         try:
-            async with self.lichess_session.post(f'/api/challenge/{challenge_id}/cancel') as response:
+            async with self._request('POST', f'/api/challenge/{challenge_id}/cancel') as response:
                 response.raise_for_status()
                 return True
         except aiohttp.ClientResponseError as e:
@@ -81,7 +143,7 @@ class API:
     @retry(**BASIC_RETRY_CONDITIONS)
     async def claim_victory(self, game_id: str) -> bool:
         try:
-            async with self.lichess_session.post(f'/api/bot/game/{game_id}/claim-victory') as response:
+            async with self._request('POST', f'/api/bot/game/{game_id}/claim-victory') as response:
                 response.raise_for_status()
                 return True
         except aiohttp.ClientResponseError as e:
@@ -92,25 +154,20 @@ class API:
                                challenge_request: Challenge_Request,
                                queue: asyncio.Queue[API_Challenge_Reponse]) -> None:
         try:
-            async with self.lichess_session.post(f'/api/challenge/{challenge_request.opponent_username}',
-                                                 data={'rated': 'true' if challenge_request.rated else 'false',
-                                                       'clock.limit': challenge_request.initial_time,
-                                                       'clock.increment': challenge_request.increment,
-                                                       'color': challenge_request.color,
-                                                       'variant': challenge_request.variant,
-                                                       'keepAliveStream': 'true'},
-                                                 timeout=aiohttp.ClientTimeout(total=challenge_request.timeout)
-                                                 ) as response:
-
-                if response.status == 429:
-                    await queue.put(API_Challenge_Reponse(has_reached_rate_limit=True))
-                    return
+            async with self._request('POST', f'/api/challenge/{challenge_request.opponent_username}',
+                                     data={'rated': 'true' if challenge_request.rated else 'false',
+                                           'clock.limit': challenge_request.initial_time,
+                                           'clock.increment': challenge_request.increment,
+                                           'color': challenge_request.color,
+                                           'variant': challenge_request.variant,
+                                           'keepAliveStream': 'true'},
+                                     timeout=aiohttp.ClientTimeout(total=challenge_request.timeout)
+                                     ) as response:
 
                 async for line in response.content:
-                    if not line.strip():
+                    if (data := self.stream_decoder.decode(line)) is None:
                         continue
 
-                    data: dict[str, Any] = json.loads(line)
                     await queue.put(API_Challenge_Reponse(data.get('id'),
                                                           data.get('done') == 'accepted',
                                                           data.get('error'),
@@ -118,6 +175,8 @@ class API:
                                                           'clock.limit' in data,
                                                           'clock.increment' in data))
 
+        except Rate_Limit_Error:
+            await queue.put(API_Challenge_Reponse(has_reached_rate_limit=True))
         except (aiohttp.ClientError, json.JSONDecodeError) as e:
             await queue.put(API_Challenge_Reponse(error=str(e)))
         except TimeoutError:
@@ -126,8 +185,8 @@ class API:
     @retry(**BASIC_RETRY_CONDITIONS)
     async def decline_challenge(self, challenge_id: str, reason: Decline_Reason) -> bool:
         try:
-            async with self.lichess_session.post(f'/api/challenge/{challenge_id}/decline',
-                                                 data={'reason': reason}) as response:
+            async with self._request('POST', f'/api/challenge/{challenge_id}/decline',
+                                     data={'reason': reason}) as response:
                 response.raise_for_status()
                 return True
         except aiohttp.ClientResponseError as e:
@@ -136,7 +195,7 @@ class API:
 
     @retry(**JSON_RETRY_CONDITIONS)
     async def get_account(self) -> dict[str, Any]:
-        async with self.lichess_session.get('/api/account') as response:
+        async with self._request('GET', '/api/account') as response:
             json_response = await response.json()
 
             if 'error' in json_response:
@@ -145,6 +204,9 @@ class API:
             return json_response
 
     async def get_chessdb_eval(self, fen: str, timeout: int) -> dict[str, Any] | None:
+        if cache_entry := await self.position_cache.get('chessdb', Variant.STANDARD, fen):
+            return cache_entry.response
+
         try:
             async with self.external_session.get('http://www.chessdb.cn/cdb.php',
                                                  params={'action': 'queryall',
@@ -152,56 +214,82 @@ class API:
                                                          'json': 1},
                                                  timeout=aiohttp.ClientTimeout(total=timeout)) as response:
                 response.raise_for_status()
-                return await response.json()
+                json_response = await response.json()
         except (aiohttp.ClientError, json.JSONDecodeError) as e:
             print(f'ChessDB: {e}')
+            return
         except TimeoutError:
             print(f'ChessDB: Timed out after {timeout} second(s).')
+            return
+
+        if json_response.get('status') != 'rate limit exceeded':
+            self.position_cache.put('chessdb', Variant.STANDARD, fen, json_response,
+                                    is_negative=json_response.get('status') != 'ok')
+
+        return json_response
 
     async def get_cloud_eval(self, fen: str, variant: Variant, timeout: int) -> dict[str, Any] | None:
+        if cache_entry := await self.position_cache.get('cloud', variant, fen):
+            return cache_entry.response
+
         try:
-            async with self.lichess_session.get('/api/cloud-eval', params={'fen': fen, 'variant': variant},
-                                                timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+            async with self._request('GET', '/api/cloud-eval', params={'fen': fen, 'variant': variant},
+                                     timeout=aiohttp.ClientTimeout(total=timeout)) as response:
                 if response.status == 404:
+                    self.position_cache.put('cloud', variant, fen, None, is_negative=True)
                     return
                 response.raise_for_status()
-                return await response.json()
+                json_response = await response.json()
         except (aiohttp.ClientError, json.JSONDecodeError) as e:
             print(f'Cloud: {e}')
+            return
         except TimeoutError:
             print(f'Cloud: Timed out after {timeout} second(s).')
+            return
+
+        self.position_cache.put('cloud', variant, fen, json_response, is_negative='error' in json_response)
+        return json_response
 
     async def get_egtb(self, fen: str, variant: str, timeout: int) -> dict[str, Any] | None:
+        if cache_entry := await self.position_cache.get('egtb', variant, fen):
+            return cache_entry.response
+
         try:
             async with self.external_session.get(f'https://tablebase.lichess.ovh/{variant}',
                                                  params={'fen': fen},
                                                  timeout=aiohttp.ClientTimeout(total=timeout)) as response:
 
                 response.raise_for_status()
-                return await response.json()
+                json_response = await response.json()
         except (aiohttp.ClientError, json.JSONDecodeError) as e:
             print(f'EGTB: {e}')
+            return
         except TimeoutError:
             print(f'EGTB: Timed out after {timeout} second(s).')
+            return
+
+        self.position_cache.put('egtb', variant, fen, json_response,
+                                is_negative=json_response.get('category') == 'unknown')
+        return json_response
 
     @retry(**JSON_RETRY_CONDITIONS)
-    async def get_event_stream(self, queue: asyncio.Queue[dict[str, Any]]) -> None:
+    async def get_event_stream(self, queue: asyncio.Queue[Event_Stream_Event]) -> None:
         async with self.lichess_session.get('/api/stream/event', timeout=STREAM_TIMEOUT) as response:
             async for line in response.content:
-                if line.strip():
-                    await queue.put(json.loads(line))
+                if (event := self.stream_decoder.decode_event(line)) is not None:
+                    await queue.put(event)
 
     @retry(**GAME_STREAM_RETRY_CONDITIONS)
-    async def get_game_stream(self, game_id: str, queue: asyncio.Queue[dict[str, Any]]) -> None:
+    async def get_game_stream(self, game_id: str, queue: asyncio.Queue[Game_Stream_Event]) -> None:
         async with self.lichess_session.get(f'/api/bot/game/stream/{game_id}', timeout=STREAM_TIMEOUT) as response:
             async for line in response.content:
-                if line.strip():
-                    await queue.put(json.loads(line))
+                if (event := self.stream_decoder.decode_game_event(line)) is not None:
+                    await queue.put(event)
 
     @retry(**JSON_RETRY_CONDITIONS)
     async def get_online_bots(self) -> list[dict[str, Any]]:
-        async with self.lichess_session.get('/api/bot/online', timeout=STREAM_TIMEOUT) as response:
-            return [json.loads(line) async for line in response.content if line.strip()]
+        async with self._request('GET', '/api/bot/online', timeout=STREAM_TIMEOUT) as response:
+            return [bot async for line in response.content if (bot := self.stream_decoder.decode(line)) is not None]
 
     async def get_opening_explorer(self,
                                    username: str,
@@ -219,7 +307,7 @@ class API:
         # MSK Chess doesn't have /api/token/test endpoint
         # Check scopes from account endpoint instead
         try:
-            async with self.lichess_session.get('/api/account') as response:
+            async with self._request('GET', '/api/account') as response:
                 if response.status == 200:
                     # If we can access account, assume we have bot:play scope
                     return 'bot:play'
@@ -229,19 +317,18 @@ class API:
 
     @retry(**JSON_RETRY_CONDITIONS)
     async def get_tournament_info(self, tournament_id: str) -> dict[str, Any]:
-        async with self.lichess_session.get(f'/api/tournament/{tournament_id}') as response:
+        async with self._request('GET', f'/api/tournament/{tournament_id}') as response:
             return await response.json()
 
     @retry(**JSON_RETRY_CONDITIONS)
-    async def get_user_status(self, username: str) -> dict[str, Any]:
-        async with self.lichess_session.get('/api/users/status', params={'ids': username}) as response:
-            json_response = await response.json()
-            return json_response[0]
+    async def get_user_statuses(self, usernames: list[str]) -> list[dict[str, Any]]:
+        async with self._request('GET', '/api/users/status', params={'ids': ','.join(usernames)}) as response:
+            return await response.json()
 
     @retry(**JSON_RETRY_CONDITIONS)
     async def handle_takeback(self, game_id: str, accept: bool) -> bool:
         accept_str = 'yes' if accept else 'no'
-        async with self.lichess_session.post(f'/api/bot/game/{game_id}/takeback/{accept_str}') as response:
+        async with self._request('POST', f'/api/bot/game/{game_id}/takeback/{accept_str}') as response:
             json_response = await response.json()
             if 'error' in json_response:
                 print(f'Takeback error: {json_response["error"]}')
@@ -251,7 +338,7 @@ class API:
     @retry(**JSON_RETRY_CONDITIONS)
     async def join_team(self, team: str, password: str | None) -> bool:
         data = {'password': password} if password else None
-        async with self.lichess_session.post(f'/team/{team.lower()}/join', data=data) as response:
+        async with self._request('POST', f'/team/{team.lower()}/join', data=data) as response:
             json_response = await response.json()
             if 'error' in json_response:
                 print(f'Joining team "{team}" failed: {json_response["error"]}')
@@ -265,7 +352,7 @@ class API:
             data['team'] = team.lower()
         if password:
             data['password'] = password
-        async with self.lichess_session.post(f'/api/tournament/{tournament_id}/join', data=data) as response:
+        async with self._request('POST', f'/api/tournament/{tournament_id}/join', data=data) as response:
             json_response = await response.json()
             if 'error' in json_response:
                 print(f'Joining tournament "{tournament_id}" failed: {json_response["error"]}')
@@ -283,7 +370,7 @@ class API:
     @retry(**BASIC_RETRY_CONDITIONS)
     async def resign_game(self, game_id: str) -> bool:
         try:
-            async with self.lichess_session.post(f'/api/bot/game/{game_id}/resign') as response:
+            async with self._request('POST', f'/api/bot/game/{game_id}/resign') as response:
                 response.raise_for_status()
                 return True
         except aiohttp.ClientResponseError as e:
@@ -292,9 +379,9 @@ class API:
 
     async def send_chat_message(self, game_id: str, room: str, text: str) -> bool:
         try:
-            async with self.lichess_session.post(f'/api/bot/game/{game_id}/chat',
-                                                 data={'room': room, 'text': text},
-                                                 timeout=aiohttp.ClientTimeout(total=1.0)) as response:
+            async with self._request('POST', f'/api/bot/game/{game_id}/chat',
+                                     data={'room': room, 'text': text},
+                                     timeout=aiohttp.ClientTimeout(total=1.0)) as response:
                 response.raise_for_status()
                 return True
         except (aiohttp.ClientError, TimeoutError):
@@ -302,11 +389,14 @@ class API:
 
     @retry(**MOVE_RETRY_CONDITIONS)
     async def send_move(self, game_id: str, uci_move: str, offer_draw: bool) -> bool:
+        start_time = time.perf_counter()
         try:
-            async with self.lichess_session.post(f'/api/bot/game/{game_id}/move/{uci_move}',
-                                                 params={'offeringDraw': 'true' if offer_draw else 'false'},
-                                                 timeout=aiohttp.ClientTimeout(total=1.0)) as response:
+            async with self._request('POST', f'/api/bot/game/{game_id}/move/{uci_move}',
+                                     params={'offeringDraw': 'true' if offer_draw else 'false'},
+                                     session=self.move_session) as response:
                 response.raise_for_status()
+                self.move_latencies.append(time.perf_counter() - start_time)
+                self.last_move_time = time.monotonic()
                 return True
         except aiohttp.ClientResponseError as e:
             if 500 <= e.status <= 599:
@@ -315,10 +405,28 @@ class API:
                 print(e)
             return False
 
+    async def warm_up_move_session(self) -> None:
+        self.last_move_time = time.monotonic()
+        await self._send_move_keepalive()
+
+    async def _keep_move_session_warm(self) -> None:
+        while True:
+            await asyncio.sleep(MOVE_KEEPALIVE_INTERVAL)
+
+            if time.monotonic() - self.last_move_time <= MOVE_IDLE_TIME:
+                await self._send_move_keepalive()
+
+    async def _send_move_keepalive(self) -> None:
+        try:
+            async with self.move_session.head('/', allow_redirects=False):
+                pass
+        except (aiohttp.ClientError, TimeoutError) as e:
+            logger.debug('Move session keepalive failed: %s', e)
+
     @retry(**BASIC_RETRY_CONDITIONS)
     async def upgrade_account(self) -> bool:
         try:
-            async with self.lichess_session.post('/api/bot/account/upgrade') as response:
+            async with self._request('POST', '/api/bot/account/upgrade') as response:
                 response.raise_for_status()
                 return True
         except aiohttp.ClientResponseError as e:
@@ -328,7 +436,7 @@ class API:
     @retry(**BASIC_RETRY_CONDITIONS)
     async def withdraw_tournament(self, tournament_id: str) -> bool:
         try:
-            async with self.lichess_session.post(f'/api/tournament/{tournament_id}/withdraw') as response:
+            async with self._request('POST', f'/api/tournament/{tournament_id}/withdraw') as response:
                 response.raise_for_status()
                 return True
         except aiohttp.ClientResponseError as e:
@@ -338,7 +446,7 @@ class API:
     @retry(**BASIC_RETRY_CONDITIONS)
     async def decline_draw(self, game_id: str) -> bool:
         try:
-            async with self.lichess_session.post(f'/api/bot/game/{game_id}/draw/no') as response:
+            async with self._request('POST', f'/api/bot/game/{game_id}/draw/no') as response:
                 response.raise_for_status()
                 return True
         except aiohttp.ClientResponseError as e:
@@ -348,7 +456,7 @@ class API:
     @retry(**BASIC_RETRY_CONDITIONS)
     async def accept_draw(self, game_id: str) -> bool:
         try:
-            async with self.lichess_session.post(f'/api/bot/game/{game_id}/draw/yes') as response:
+            async with self._request('POST', f'/api/bot/game/{game_id}/draw/yes') as response:
                 response.raise_for_status()
                 return True
         except aiohttp.ClientResponseError as e:
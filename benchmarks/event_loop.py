@@ -0,0 +1,27 @@
+import argparse
+import sys
+
+from benchmarks.load_test import format_percentiles, get_parser, get_percentiles, load_config, run_load_test
+from loop_setup import uvloop
+
+
+def main(args: argparse.Namespace) -> int:
+    loops = ['default', 'uvloop'] if uvloop is not None else ['default']
+    if uvloop is None:
+        print('uvloop is not installed, only the default event loop is measured.')
+
+    for loop in loops:
+        args.uvloop = loop == 'uvloop'
+        report, lags, api, duration = run_load_test(args, load_config(args))
+        print(f'{loop} loop: {report["finished"]}/{args.games} games in {duration:.1f} s, '
+              f'{report["moves"]} bot moves, {report["flags"]} flagged')
+        print(f'  send_move latency:  {format_percentiles(get_percentiles(list(api.move_latencies)))}')
+        print(f'  Response time:      {format_percentiles(report["response_time_ms"])}')
+        print(f'  Event loop lag:     {format_percentiles(get_percentiles(lags))}')
+
+    return 0
+
+
+if __name__ == '__main__':
+    parser = get_parser('Compare move latency of the default event loop and uvloop under the mock load test.')
+    sys.exit(main(parser.parse_args()))
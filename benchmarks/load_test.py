@@ -0,0 +1,195 @@
+import argparse
+import asyncio
+import contextlib
+import os
+import socket
+import subprocess
+import sys
+import time
+from typing import Any
+
+import aiohttp
+
+from api import API
+from benchmarks.mock_server import get_percentile
+from config import Config
+from configs import Syzygy_Config
+from engine import Engine
+from engine_pool import Engine_Pool
+from event_handler import Event_Handler
+from game_manager import Game_Manager
+from loop_setup import run
+
+LAG_INTERVAL = 0.1
+
+
+class Loop_Lag_Monitor:
+    def __init__(self) -> None:
+        self.lags: list[float] = []
+
+    async def run(self) -> None:
+        while True:
+            start_time = time.perf_counter()
+            await asyncio.sleep(LAG_INTERVAL)
+            self.lags.append(max(time.perf_counter() - start_time - LAG_INTERVAL, 0.0))
+
+
+async def wait_for_server(url: str, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession(url) as session:
+        while True:
+            try:
+                async with session.get('/mock/report') as response:
+                    response.raise_for_status()
+                    return
+            except aiohttp.ClientError:
+                if time.monotonic() > deadline:
+                    raise
+
+                await asyncio.sleep(0.1)
+
+
+async def run_games(args: argparse.Namespace, config: Config, url: str) -> tuple[dict[str, Any], list[float], API]:
+    lag_monitor = Loop_Lag_Monitor()
+    lag_task = asyncio.create_task(lag_monitor.run())
+
+    async with API(config) as api, aiohttp.ClientSession(url) as control_session:
+        account = await api.get_account()
+        username: str = account['username']
+        api.append_user_agent(username)
+
+        engine_pool = Engine_Pool(config)
+        # Like the startup engine test, a tested engine is handed to the pool and must serve the first game.
+        hands_off_engine = config.engine_pool.enabled and not any(syzygy_config.enabled
+                                                                  for syzygy_config in config.syzygy.values())
+        if hands_off_engine:
+            tested_engine = await Engine.test(config.engines['standard'])
+            await engine_pool.add('standard', Syzygy_Config(False, [], 0, False), tested_engine)
+        game_manager = Game_Manager(api, config, username, engine_pool)
+        game_manager_task = asyncio.create_task(game_manager.run())
+        event_handler_task = asyncio.create_task(Event_Handler(api, config, username, game_manager).run())
+        await asyncio.sleep(0.5)
+
+        async with control_session.post('/mock/games', json={'count': args.games,
+                                                             'time_controls': args.tc,
+                                                             'challenges': args.challenges}) as response:
+            response.raise_for_status()
+
+        deadline = time.monotonic() + args.timeout
+        while True:
+            await asyncio.sleep(1.0)
+            async with control_session.get('/mock/report') as response:
+                report = await response.json()
+
+            if report['finished'] + report['declined'] >= args.games or time.monotonic() > deadline:
+                break
+
+        game_manager.stop()
+        await game_manager_task
+        event_handler_task.cancel()
+
+        if config.engine_pool.enabled:
+            report['engine_pool'] = {'reused': engine_pool.reused,
+                                     'spawned': engine_pool.spawned,
+                                     'tested_engine_reused': not hands_off_engine or engine_pool.reused > 0}
+
+    lag_task.cancel()
+    return report, lag_monitor.lags, api
+
+
+def get_percentiles(samples: list[float]) -> dict[str, float]:
+    return {f'p{percentile}': get_percentile(samples, percentile) * 1000 for percentile in (50, 90, 99, 100)}
+
+
+def format_percentiles(percentiles: dict[str, float]) -> str:
+    return '  '.join(f'{name} {value:7.1f} ms' for name, value in percentiles.items())
+
+
+def print_report(args: argparse.Namespace, report: dict[str, Any], lags: list[float], api: API) -> None:
+    move_latencies = list(api.move_latencies)
+    print(f'{report["started"]}/{args.games} games started, {report["finished"]} finished, '
+          f'{report["declined"]} declined, {report["moves"]} bot moves')
+    print(f'Results:              {report["results"]}')
+    print(f'Flag rate:            {report["flag_rate"] * 100:.1f} % ({report["flags"]} flagged)')
+    print(f'Response time:        {format_percentiles(report["response_time_ms"])}')
+    print(f'send_move latency:    {format_percentiles(get_percentiles(move_latencies))}')
+    print(f'Event loop lag:       {format_percentiles(get_percentiles(lags))}')
+    print(f'Chat messages:        {report["chat_messages"]}')
+    if pool_report := report.get('engine_pool'):
+        print(f'Engine pool:          {pool_report["reused"]} leases reused an idle engine, '
+              f'{pool_report["spawned"]} spawned one')
+        if not pool_report['tested_engine_reused']:
+            print('  The tested engine was not reused by any game.')
+    for line in api.scheduler.get_stats():
+        print(f'  {line}')
+    for endpoint, count in report['requests'].items():
+        print(f'  {count:6} {endpoint}')
+
+
+def get_free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def load_config(args: argparse.Namespace) -> Config:
+    config = Config.from_yaml(args.config)
+    config.token = 'mock'
+    config.challenge.concurrency = max(config.challenge.concurrency, args.games)
+    config.matchmaking.delay = 0
+    config.event_loop.uvloop = args.uvloop
+    if args.thread_pool_workers is not None:
+        config.event_loop.thread_pool_workers = args.thread_pool_workers
+    return config
+
+
+def run_load_test(args: argparse.Namespace,
+                  config: Config) -> tuple[dict[str, Any], list[float], API, float]:
+    port = args.port or get_free_port()
+    config.url = f'http://127.0.0.1:{port}'
+
+    # The server runs in its own process so that its work does not show up as event loop lag of the bot.
+    server = subprocess.Popen([sys.executable, '-m', 'benchmarks.mock_server', '--port', str(port),
+                               '--plies', str(args.plies), '--opponent-delay', str(args.opponent_delay),
+                               '--seed', str(args.seed)],
+                              stdout=subprocess.DEVNULL)
+    try:
+        asyncio.run(wait_for_server(config.url, 10.0))
+        start_time = time.perf_counter()
+        with open(os.devnull, 'w', encoding='utf-8') as devnull:
+            with contextlib.redirect_stdout(sys.stdout if args.verbose else devnull):
+                report, lags, api = run(run_games(args, config, config.url), config.event_loop)
+        return report, lags, api, time.perf_counter() - start_time
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def get_parser(description: str) -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--config', '-c', default='config.yml', help='Config of the bot. URL and token are replaced.')
+    parser.add_argument('--games', '-n', type=int, default=4, help='Number of simultaneous games.')
+    parser.add_argument('--tc', nargs='+', default=['1+0'], help='Time controls assigned to the games in turn.')
+    parser.add_argument('--plies', type=int, default=80, help='Ply after which the scripted opponents resign.')
+    parser.add_argument('--opponent-delay', type=float, default=0.2, help='Average think time of the opponents.')
+    parser.add_argument('--challenges', action='store_true',
+                        help='Send challenges that the bot has to accept instead of starting the games directly.')
+    parser.add_argument('--thread-pool-workers', type=int, help='Overrides "thread_pool_workers" of the config.')
+    parser.add_argument('--port', type=int, help='Port of the mock server. A free port is used if omitted.')
+    parser.add_argument('--timeout', type=float, default=600.0, help='Max duration of the run in seconds.')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the scripted opponents.')
+    parser.add_argument('--verbose', '-v', action='store_true', help='Show the output of the bot.')
+    return parser
+
+
+def main(args: argparse.Namespace) -> int:
+    report, lags, api, duration = run_load_test(args, load_config(args))
+    print(f'Finished in {duration:.1f} s')
+    print_report(args, report, lags, api)
+    return 0
+
+
+if __name__ == '__main__':
+    parser = get_parser('Play simultaneous games against the local mock server.')
+    parser.add_argument('--uvloop', action='store_true', help='Run the bot on uvloop.')
+    sys.exit(main(parser.parse_args()))
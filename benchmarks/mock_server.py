@@ -0,0 +1,435 @@
+import argparse
+import asyncio
+import json
+import random
+import string
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Any
+
+import chess
+from aiohttp import web
+
+KEEPALIVE_INTERVAL = 5.0
+OPPONENTS = [('MockFish', 2400), ('MockZero', 2600), ('MockLeela', 2200), ('MockCrafty', 2000)]
+SPEEDS = [(29, 'ultraBullet'), (179, 'bullet'), (479, 'blitz'), (1499, 'rapid')]
+
+
+def get_speed(initial_ms: int, increment_ms: int) -> str:
+    estimated_seconds = (initial_ms + 40 * increment_ms) / 1000
+    for limit, speed in SPEEDS:
+        if estimated_seconds <= limit:
+            return speed
+
+    return 'classical'
+
+
+def get_percentile(samples: list[float], percentile: float) -> float:
+    if not samples:
+        return 0.0
+
+    samples = sorted(samples)
+    return samples[min(int(len(samples) * percentile / 100), len(samples) - 1)]
+
+
+@dataclass
+class Mock_Game:
+    id_: str
+    opponent: str
+    opponent_rating: int
+    bot_is_white: bool
+    initial_ms: int
+    increment_ms: int
+    max_plies: int
+    board: chess.Board = field(default_factory=chess.Board)
+    wtime: int = 0
+    btime: int = 0
+    turn_started: float = field(default_factory=time.monotonic)
+    status: str = 'started'
+    winner: str | None = None
+    streams: list[asyncio.Queue[dict[str, Any] | None]] = field(default_factory=list)
+    response_times: list[float] = field(default_factory=list)
+    chat_messages: int = 0
+    flag_task: asyncio.Task[None] | None = None
+
+    def __post_init__(self) -> None:
+        self.wtime = self.btime = self.initial_ms
+
+    @property
+    def is_bot_turn(self) -> bool:
+        return self.board.turn == self.bot_is_white
+
+    @property
+    def bot_color(self) -> str:
+        return 'white' if self.bot_is_white else 'black'
+
+    def get_state(self) -> dict[str, Any]:
+        state = {'type': 'gameState', 'moves': ' '.join(move.uci() for move in self.board.move_stack),
+                 'wtime': self.wtime, 'btime': self.btime, 'winc': self.increment_ms, 'binc': self.increment_ms,
+                 'status': self.status}
+        if self.winner:
+            state['winner'] = self.winner
+        return state
+
+    def get_full(self, username: str) -> dict[str, Any]:
+        bot = {'id': username.lower(), 'name': username, 'title': 'BOT', 'rating': 2500}
+        opponent = {'id': self.opponent.lower(), 'name': self.opponent, 'title': 'BOT',
+                    'rating': self.opponent_rating}
+        return {'type': 'gameFull', 'id': self.id_, 'rated': False,
+                'variant': {'key': 'standard', 'name': 'Standard', 'short': 'Std'},
+                'clock': {'initial': self.initial_ms, 'increment': self.increment_ms},
+                'speed': get_speed(self.initial_ms, self.increment_ms),
+                'white': bot if self.bot_is_white else opponent,
+                'black': opponent if self.bot_is_white else bot,
+                'initialFen': 'startpos', 'state': self.get_state()}
+
+    def push(self, move: chess.Move) -> float:
+        elapsed = time.monotonic() - self.turn_started
+        # Like on Lichess, the clocks only start after each side has made its first move.
+        if len(self.board.move_stack) >= 2:
+            clock = 'wtime' if self.board.turn == chess.WHITE else 'btime'
+            remaining = getattr(self, clock) - int(elapsed * 1000)
+            if remaining < 0:
+                setattr(self, clock, 0)
+                self.status = 'outoftime'
+                self.winner = 'black' if self.board.turn == chess.WHITE else 'white'
+                return elapsed
+
+            setattr(self, clock, remaining + self.increment_ms)
+
+        self.board.push(move)
+        self.turn_started = time.monotonic()
+
+        if outcome := self.board.outcome():
+            match outcome.termination:
+                case chess.Termination.CHECKMATE:
+                    self.status = 'mate'
+                case chess.Termination.STALEMATE:
+                    self.status = 'stalemate'
+                case _:
+                    self.status = 'draw'
+
+            if outcome.winner is not None:
+                self.winner = 'white' if outcome.winner else 'black'
+        elif len(self.board.move_stack) >= self.max_plies and not self.is_bot_turn:
+            # Scripted opponents resign long games so that every game of a run ends.
+            self.status = 'resign'
+            self.winner = self.bot_color
+
+        return elapsed
+
+
+class Mock_Server:
+    def __init__(self, username: str, max_plies: int, opponent_delay: float) -> None:
+        self.username = username
+        self.max_plies = max_plies
+        self.opponent_delay = opponent_delay
+        self.games: dict[str, Mock_Game] = {}
+        self.challenges: dict[str, Mock_Game] = {}
+        self.declined_challenges = 0
+        self.event_streams: list[asyncio.Queue[dict[str, Any]]] = []
+        self.requests: dict[str, int] = {}
+        self.app = web.Application(middlewares=[self._count_requests])
+        self.app.add_routes([web.head('/', self._head),
+                             web.get('/api/account', self._account),
+                             web.get('/api/stream/event', self._event_stream),
+                             web.get('/api/bot/game/stream/{game_id}', self._game_stream),
+                             web.post('/api/bot/game/{game_id}/move/{uci_move}', self._move),
+                             web.post('/api/bot/game/{game_id}/chat', self._chat),
+                             web.post('/api/bot/game/{game_id}/abort', self._abort),
+                             web.post('/api/bot/game/{game_id}/resign', self._resign),
+                             web.post('/api/bot/game/{game_id}/{action}/{answer}', self._ok),
+                             web.post('/api/challenge/{challenge_id}/accept', self._accept_challenge),
+                             web.post('/api/challenge/{challenge_id}/decline', self._decline_challenge),
+                             web.get('/api/bot/online', self._online_bots),
+                             web.get('/api/users/status', self._user_status),
+                             web.post('/mock/games', self._create_games),
+                             web.get('/mock/report', self._report)])
+
+    async def create_games(self, count: int, time_controls: list[str], challenges: bool) -> list[str]:
+        game_ids: list[str] = []
+        for i in range(count):
+            initial, increment = time_controls[i % len(time_controls)].split('+')
+            opponent, rating = OPPONENTS[i % len(OPPONENTS)]
+            game = Mock_Game(self._get_id(), opponent, rating, i % 2 == 0,
+                             int(float(initial) * 60_000), int(increment) * 1000, self.max_plies)
+            game_ids.append(game.id_)
+
+            if challenges:
+                self.challenges[game.id_] = game
+                self._send_event({'type': 'challenge', 'challenge': self._get_challenge(game)})
+            else:
+                self._start_game(game)
+
+        return game_ids
+
+    def get_report(self) -> dict[str, Any]:
+        games = list(self.games.values())
+        finished = [game for game in games if game.status != 'started']
+        response_times = [response_time for game in games for response_time in game.response_times]
+        flags = sum(game.status == 'outoftime' and game.winner != game.bot_color for game in finished)
+        return {'games': len(games) + len(self.challenges),
+                'started': len(games),
+                'finished': len(finished),
+                'declined': self.declined_challenges,
+                'pending_challenges': len(self.challenges),
+                'moves': len(response_times),
+                'flags': flags,
+                'flag_rate': flags / len(finished) if finished else 0.0,
+                'response_time_ms': {f'p{percentile}': get_percentile(response_times, percentile) * 1000
+                                     for percentile in (50, 90, 99, 100)},
+                'results': {status: sum(game.status == status for game in finished)
+                            for status in sorted({game.status for game in finished})},
+                'chat_messages': sum(game.chat_messages for game in games),
+                'requests': dict(sorted(self.requests.items()))}
+
+    def _start_game(self, game: Mock_Game) -> None:
+        self.games[game.id_] = game
+        self._send_event({'type': 'gameStart', 'game': {'id': game.id_, 'gameId': game.id_, 'color': game.bot_color,
+                                                        'speed': get_speed(game.initial_ms, game.increment_ms),
+                                                        'opponent': {'id': game.opponent.lower(),
+                                                                     'username': game.opponent}}})
+        if game.is_bot_turn:
+            game.flag_task = asyncio.create_task(self._flag_watchdog(game))
+        else:
+            asyncio.create_task(self._play_opponent_move(game))
+
+    def _finish_game(self, game: Mock_Game) -> None:
+        if game.flag_task:
+            game.flag_task.cancel()
+
+        self._broadcast(game)
+        for queue in game.streams:
+            queue.put_nowait(None)
+        self._send_event({'type': 'gameFinish', 'game': {'id': game.id_, 'gameId': game.id_,
+                                                         'status': {'name': game.status}}})
+
+    def _broadcast(self, game: Mock_Game) -> None:
+        state = game.get_state()
+        for queue in game.streams:
+            queue.put_nowait(state)
+
+    def _send_event(self, event: dict[str, Any]) -> None:
+        for queue in self.event_streams:
+            queue.put_nowait(event)
+
+    async def _play_opponent_move(self, game: Mock_Game) -> None:
+        await asyncio.sleep(random.uniform(0.5, 1.5) * self.opponent_delay)
+        if game.status != 'started':
+            return
+
+        moves = list(game.board.legal_moves)
+        captures = [move for move in moves if game.board.is_capture(move)]
+        game.push(random.choice(captures if captures and random.random() < 0.5 else moves))
+        if game.status != 'started':
+            self._finish_game(game)
+            return
+
+        self._broadcast(game)
+        game.flag_task = asyncio.create_task(self._flag_watchdog(game))
+
+    async def _flag_watchdog(self, game: Mock_Game) -> None:
+        ply = len(game.board.move_stack)
+        remaining_ms = game.wtime if game.bot_is_white else game.btime
+        await asyncio.sleep(remaining_ms / 1000 if ply >= 2 else 30.0)
+        if game.status != 'started' or len(game.board.move_stack) != ply:
+            return
+
+        game.status = 'outoftime' if ply >= 2 else 'noStart'
+        game.winner = 'black' if game.bot_is_white else 'white'
+        if game.bot_is_white:
+            game.wtime = 0
+        else:
+            game.btime = 0
+        self._finish_game(game)
+
+    async def _ndjson_stream(self,
+                             request: web.Request,
+                             queue: asyncio.Queue[Any],
+                             first_events: list[dict[str, Any]]) -> web.StreamResponse:
+        response = web.StreamResponse(headers={'Content-Type': 'application/x-ndjson'})
+        await response.prepare(request)
+        try:
+            for event in first_events:
+                await response.write(json.dumps(event).encode() + b'\n')
+
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), KEEPALIVE_INTERVAL)
+                except TimeoutError:
+                    await response.write(b'\n')
+                    continue
+
+                if event is None:
+                    break
+
+                await response.write(json.dumps(event).encode() + b'\n')
+
+            await response.write_eof()
+        except ConnectionResetError:
+            # The bot closed the stream, e.g. on shutdown.
+            pass
+
+        return response
+
+    async def _event_stream(self, request: web.Request) -> web.StreamResponse:
+        queue: asyncio.Queue[dict[str, Any]] = asyncio.Queue()
+        self.event_streams.append(queue)
+        try:
+            return await self._ndjson_stream(request, queue, [])
+        finally:
+            self.event_streams.remove(queue)
+
+    async def _game_stream(self, request: web.Request) -> web.StreamResponse:
+        if (game := self.games.get(request.match_info['game_id'])) is None:
+            raise web.HTTPNotFound()
+
+        queue: asyncio.Queue[dict[str, Any] | None] = asyncio.Queue()
+        if game.status == 'started':
+            game.streams.append(queue)
+        else:
+            queue.put_nowait(None)
+
+        try:
+            return await self._ndjson_stream(request, queue, [game.get_full(self.username)])
+        finally:
+            if queue in game.streams:
+                game.streams.remove(queue)
+
+    async def _move(self, request: web.Request) -> web.Response:
+        if (game := self.games.get(request.match_info['game_id'])) is None:
+            raise web.HTTPNotFound()
+
+        if game.status != 'started' or not game.is_bot_turn:
+            return web.json_response({'error': 'Not your turn, or game already over'}, status=400)
+
+        try:
+            move = game.board.parse_uci(request.match_info['uci_move'])
+        except ValueError:
+            return web.json_response({'error': 'Invalid move'}, status=400)
+
+        if game.flag_task:
+            game.flag_task.cancel()
+
+        game.response_times.append(game.push(move))
+        if game.status != 'started':
+            self._finish_game(game)
+        else:
+            self._broadcast(game)
+            asyncio.create_task(self._play_opponent_move(game))
+
+        return web.json_response({'ok': True})
+
+    async def _chat(self, request: web.Request) -> web.Response:
+        if game := self.games.get(request.match_info['game_id']):
+            game.chat_messages += 1
+
+        return web.json_response({'ok': True})
+
+    async def _abort(self, request: web.Request) -> web.Response:
+        return await self._end_game(request, 'aborted', None)
+
+    async def _resign(self, request: web.Request) -> web.Response:
+        if (game := self.games.get(request.match_info['game_id'])) is None:
+            raise web.HTTPNotFound()
+
+        return await self._end_game(request, 'resign', 'black' if game.bot_is_white else 'white')
+
+    async def _end_game(self, request: web.Request, status: str, winner: str | None) -> web.Response:
+        if (game := self.games.get(request.match_info['game_id'])) is None:
+            raise web.HTTPNotFound()
+
+        if game.status == 'started':
+            game.status = status
+            game.winner = winner
+            self._finish_game(game)
+
+        return web.json_response({'ok': True})
+
+    async def _accept_challenge(self, request: web.Request) -> web.Response:
+        if (game := self.challenges.pop(request.match_info['challenge_id'], None)) is None:
+            return web.json_response({'error': 'Challenge not found'}, status=404)
+
+        self._start_game(game)
+        return web.json_response({'ok': True})
+
+    async def _decline_challenge(self, request: web.Request) -> web.Response:
+        if self.challenges.pop(request.match_info['challenge_id'], None):
+            self.declined_challenges += 1
+
+        return web.json_response({'ok': True})
+
+    async def _online_bots(self, request: web.Request) -> web.StreamResponse:
+        bots = [{'id': name.lower(), 'username': name, 'title': 'BOT',
+                 'perfs': {speed: {'rating': rating, 'games': 1000}
+                           for speed in ('bullet', 'blitz', 'rapid', 'classical')}}
+                for name, rating in OPPONENTS]
+        return web.Response(body=b''.join(json.dumps(bot).encode() + b'\n' for bot in bots),
+                            content_type='application/x-ndjson')
+
+    async def _user_status(self, request: web.Request) -> web.Response:
+        return web.json_response([{'id': username.lower(), 'name': username, 'online': True}
+                                  for username in request.query.get('ids', '').split(',') if username])
+
+    async def _account(self, request: web.Request) -> web.Response:
+        return web.json_response({'id': self.username.lower(), 'username': self.username, 'title': 'BOT'})
+
+    async def _head(self, request: web.Request) -> web.Response:
+        return web.Response()
+
+    async def _ok(self, request: web.Request) -> web.Response:
+        return web.json_response({'ok': True})
+
+    async def _create_games(self, request: web.Request) -> web.Response:
+        data = await request.json()
+        game_ids = await self.create_games(data['count'], data['time_controls'], data.get('challenges', False))
+        return web.json_response({'ids': game_ids})
+
+    async def _report(self, request: web.Request) -> web.Response:
+        return web.json_response(self.get_report())
+
+    @web.middleware
+    async def _count_requests(self, request: web.Request, handler: Any) -> web.StreamResponse:
+        if not request.path.startswith('/mock/'):
+            route = request.match_info.route.resource.canonical if request.match_info.route.resource else '?'
+            key = f'{request.method} {route}'
+            self.requests[key] = self.requests.get(key, 0) + 1
+
+        return await handler(request)
+
+    def _get_challenge(self, game: Mock_Game) -> dict[str, Any]:
+        initial, increment = game.initial_ms // 1000, game.increment_ms // 1000
+        return {'id': game.id_, 'status': 'created', 'rated': False,
+                'challenger': {'id': game.opponent.lower(), 'name': game.opponent, 'title': 'BOT',
+                               'rating': game.opponent_rating},
+                'destUser': {'id': self.username.lower(), 'name': self.username, 'title': 'BOT', 'rating': 2500},
+                'variant': {'key': 'standard', 'name': 'Standard', 'short': 'Std'},
+                'speed': get_speed(game.initial_ms, game.increment_ms),
+                'timeControl': {'type': 'clock', 'limit': initial, 'increment': increment,
+                                'show': f'{initial // 60}+{increment}'},
+                'color': game.bot_color, 'perf': {'name': get_speed(game.initial_ms, game.increment_ms)}}
+
+    def _get_id(self) -> str:
+        while (id_ := ''.join(random.choices(string.ascii_letters + string.digits, k=8))) in self.games:
+            continue
+
+        return id_
+
+
+def main(args: argparse.Namespace) -> int:
+    random.seed(args.seed)
+    server = Mock_Server(args.username, args.plies, args.opponent_delay)
+    web.run_app(server.app, host=args.host, port=args.port, print=lambda message: print(message, flush=True))
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local stand-in for the Lichess bot API with scripted opponents.')
+    parser.add_argument('--host', default='127.0.0.1', help='Host to listen on.')
+    parser.add_argument('--port', type=int, default=9090, help='Port to listen on.')
+    parser.add_argument('--username', default='BotLi', help='Name of the account the bot logs in as.')
+    parser.add_argument('--plies', type=int, default=80, help='Ply after which the scripted opponents resign.')
+    parser.add_argument('--opponent-delay', type=float, default=0.2, help='Average think time of the opponents.')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the scripted opponents.')
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,77 @@
+import argparse
+import random
+import sys
+import time
+
+import chess
+
+from position_history import Position_History
+
+
+def play_game(plies: int, seed: int) -> list[chess.Move]:
+    rng = random.Random(seed)
+    board = chess.Board()
+    moves: list[chess.Move] = []
+    while len(moves) < plies:
+        if board.is_game_over():
+            board.reset()
+            moves.clear()
+            continue
+
+        # Prefer knight and king moves so that positions actually repeat.
+        legal_moves = list(board.legal_moves)
+        shuffling_moves = [move for move in legal_moves
+                           if board.piece_type_at(move.from_square) in (chess.KNIGHT, chess.KING)
+                           and not board.is_capture(move)]
+        move = rng.choice(shuffling_moves if shuffling_moves and rng.random() < 0.7 else legal_moves)
+        board.push(move)
+        moves.append(move)
+
+    return moves
+
+
+def copy_repetition(board: chess.Board, move: chess.Move) -> bool:
+    board = board.copy()
+    board.push(move)
+    return board.is_repetition(count=2)
+
+
+def main(args: argparse.Namespace) -> int:
+    moves = play_game(args.plies, args.seed)
+
+    board = chess.Board()
+    history = Position_History(board)
+    copy_time = 0.0
+    history_time = 0.0
+    checks = 0
+    for move in moves:
+        candidates = list(board.legal_moves)[:args.candidates]
+
+        start_time = time.perf_counter()
+        expected = [copy_repetition(board, candidate) for candidate in candidates]
+        copy_time += time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        actual = [history.is_repetition(candidate) for candidate in candidates]
+        history_time += time.perf_counter() - start_time
+
+        if actual != expected:
+            print(f'Mismatch at ply {board.ply()}: {board.fen()}')
+            return 1
+
+        checks += len(candidates)
+        history.push(move)
+
+    print(f'{len(moves)} plies, {checks} candidate checks, '
+          f'{sum(count - 1 for count in history.counts.values())} repeated positions')
+    print(f'Board copy        {copy_time / checks * 1_000_000:8.1f} µs per check')
+    print(f'Position history  {history_time / checks * 1_000_000:8.1f} µs per check')
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare repetition checks of candidate moves over one game.')
+    parser.add_argument('--plies', type=int, default=200, help='Length of the game.')
+    parser.add_argument('--candidates', type=int, default=8, help='Candidate moves checked per ply.')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the random game.')
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,78 @@
+import argparse
+import json
+import random
+import sys
+import time
+
+import chess
+
+from stream_decoder import Stream_Decoder
+
+
+def record_game_stream(plies: int, seed: int) -> list[bytes]:
+    rng = random.Random(seed)
+    board = chess.Board()
+    state = {'type': 'gameState', 'moves': '', 'wtime': 180_000, 'btime': 180_000, 'winc': 2000, 'binc': 2000,
+             'status': 'started'}
+    lines = [json.dumps({'type': 'gameFull', 'id': 'AbCdEfGh', 'rated': True, 'variant': {'key': 'standard'},
+                         'clock': {'initial': 180_000, 'increment': 2000}, 'speed': 'blitz',
+                         'white': {'id': 'botli', 'name': 'BotLi', 'title': 'BOT', 'rating': 2500},
+                         'black': {'id': 'opponent', 'name': 'Opponent', 'rating': 2400},
+                         'initialFen': 'startpos', 'state': state}).encode() + b'\n']
+
+    moves: list[str] = []
+    while len(moves) < plies and not board.is_game_over():
+        move = rng.choice(list(board.legal_moves))
+        board.push(move)
+        moves.append(move.uci())
+        state['moves'] = ' '.join(moves)
+        state['wtime' if board.turn else 'btime'] -= rng.randint(100, 3000)
+        lines.append(json.dumps(state).encode() + b'\n')
+
+        if rng.random() < 0.3:
+            lines.append(b'\n')
+
+        if rng.random() < 0.05:
+            lines.append(json.dumps({'type': 'chatLine', 'room': 'player', 'username': 'Opponent',
+                                     'text': 'good game'}).encode() + b'\n')
+
+    return lines
+
+
+def load_stream(path: str) -> list[bytes]:
+    with open(path, 'rb') as stream:
+        return stream.readlines()
+
+
+def legacy_decode(line: bytes) -> dict | None:
+    if line.strip():
+        return json.loads(line)
+
+
+def main(args: argparse.Namespace) -> int:
+    lines = load_stream(args.file) if args.file else record_game_stream(args.plies, args.seed)
+    size = sum(len(line) for line in lines)
+    print(f'{len(lines)} lines, {size / 1024:.1f} KiB')
+
+    decoders = [('json.loads with strip', legacy_decode)]
+    decoders += [(f'Stream_Decoder {backend}', Stream_Decoder(backend).decode)
+                 for backend in Stream_Decoder.get_available_backends()]
+    for name, decode in decoders:
+        start_time = time.perf_counter()
+        for _ in range(args.rounds):
+            for line in lines:
+                decode(line)
+        total_time = time.perf_counter() - start_time
+        print(f'{name:26} {total_time / (args.rounds * len(lines)) * 1_000_000:8.2f} µs per line     '
+              f'{args.rounds * size / total_time / 1024 / 1024:8.1f} MiB/s')
+
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Replay a recorded NDJSON stream through the stream decoders.')
+    parser.add_argument('--file', '-f', help='Recorded stream with one event per line. A game is generated if omitted.')
+    parser.add_argument('--plies', type=int, default=200, help='Length of the generated game.')
+    parser.add_argument('--rounds', type=int, default=50, help='Number of times the stream is replayed.')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the generated game.')
+    sys.exit(main(parser.parse_args()))
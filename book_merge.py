@@ -0,0 +1,147 @@
+import argparse
+import os
+import random
+import sys
+import time
+
+import chess
+import chess.polyglot
+import chess.variant
+import numpy as np
+import yaml
+
+from book_store import MERGED_ENTRY, POLYGLOT_ENTRY, Book_Candidate, Merged_Book, Polyglot_Book
+
+
+def merge_books(names: dict[str, str]) -> np.ndarray:
+    if len(names) > 255:
+        raise ValueError('A merged book can not be created from more than 255 books.')
+
+    parts: list[np.ndarray] = []
+    for source, path in enumerate(names.values()):
+        book = Polyglot_Book(path)
+        polyglot_entries = book.entries[book.entries['weight'] > 0]
+
+        part = np.empty(len(polyglot_entries), dtype=MERGED_ENTRY)
+        for field in POLYGLOT_ENTRY.names or ():
+            part[field] = polyglot_entries[field]
+        part['source'] = source
+        parts.append(part)
+
+    entries = np.concatenate(parts) if parts else np.empty(0, dtype=MERGED_ENTRY)
+    entries = entries[np.lexsort((entries['source'], entries['key']))]
+    if not len(entries):
+        return entries
+
+    is_group_start = np.ones(len(entries), dtype=bool)
+    is_group_start[1:] = (entries['key'][1:] != entries['key'][:-1]) | (entries['source'][1:] != entries['source'][:-1])
+    group_starts = np.flatnonzero(is_group_start)
+    group_weights = np.add.reduceat(entries['weight'].astype(np.float64), group_starts)
+    group_sizes = np.diff(np.append(group_starts, len(entries)))
+    entries['share'] = entries['weight'] / np.repeat(group_weights, group_sizes) * 100.0
+    return entries
+
+
+def save_merged_book(output_path: str, names: dict[str, str], entries: np.ndarray) -> None:
+    if output_dir := os.path.dirname(output_path):
+        os.makedirs(output_dir, exist_ok=True)
+
+    with open(output_path, 'wb') as output:
+        np.savez(output, entries=entries, names=np.array(list(names)))
+
+
+def load_book_names(config_path: str, key: str) -> dict[str, str]:
+    with open(config_path, encoding='utf-8') as yaml_input:
+        yaml_config = yaml.safe_load(yaml_input)
+
+    books_config = (yaml_config.get('opening_books') or {}).get('books') or {}
+    if key not in books_config:
+        raise RuntimeError(f'The key "{key}" is not defined in the opening_books books section.')
+
+    names: dict[str, str] = {}
+    for book_name in books_config[key]['names']:
+        if book_name not in (yaml_config.get('books') or {}):
+            raise RuntimeError(f'The book "{book_name}" is not defined in the books section.')
+
+        names[book_name] = yaml_config['books'][book_name]
+
+    return names
+
+
+def sample_positions(books: list[Polyglot_Book], variant: str, count: int) -> list[chess.Board]:
+    VariantBoard = chess.variant.find_variant(variant)
+    positions: list[chess.Board] = []
+    while len(positions) < count:
+        board = VariantBoard()
+        for _ in range(random.randint(0, 16)):
+            if not (entries := [entry for book in books for entry in book.find_all(board)]):
+                break
+
+            board.push(random.choice(entries).move)
+        positions.append(board)
+
+    return positions
+
+
+def benchmark(names: dict[str, str], merged_path: str, variant: str, count: int) -> None:
+    books = [Polyglot_Book(path) for path in names.values()]
+    merged_book = Merged_Book(merged_path)
+    positions = sample_positions(books, variant, count)
+    readers = [chess.polyglot.open_reader(path) for path in names.values()]
+
+    def python_chess_lookup(board: chess.Board) -> list[list[float]]:
+        shares: list[list[float]] = []
+        for reader in readers:
+            entries = list(reader.find_all(board))
+            total_weight = sum(entry.weight for entry in entries)
+            shares.append([entry.weight / total_weight * 100.0 for entry in entries])
+        return shares
+
+    def per_reader_lookup(board: chess.Board) -> None:
+        for book in books:
+            Book_Candidate.from_entries(book.find_all(board))
+
+    def merged_lookup(board: chess.Board) -> None:
+        merged_book.find_groups(board)
+
+    print(f'{len(positions)} positions, {len(books)} books, {len(merged_book)} merged entries')
+    for name, lookup in [('python-chess per reader', python_chess_lookup),
+                         ('memory mapped per reader', per_reader_lookup),
+                         ('merged index', merged_lookup)]:
+        start_time = time.perf_counter()
+        for board in positions:
+            lookup(board)
+        mean_time = (time.perf_counter() - start_time) / len(positions)
+        print(f'{name:26} {mean_time * 1_000_000:8.1f} µs per lookup')
+
+    for reader in readers:
+        reader.close()
+
+
+def main(args: argparse.Namespace) -> int:
+    for key in args.keys:
+        names = load_book_names(args.config, key)
+        output_path = os.path.join(args.output, f'{key}.npz')
+
+        start_time = time.perf_counter()
+        entries = merge_books(names)
+        save_merged_book(output_path, names, entries)
+        print(f'Merged {len(names)} books with {len(entries)} entries into "{output_path}" '
+              f'in {time.perf_counter() - start_time:.1f} seconds.')
+        print(f'Add \'merged: "{output_path}"\' to the "{key}" section of opening_books to use it.')
+
+        if args.benchmark:
+            benchmark(names, output_path, args.variant, args.positions)
+
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Merge the books of opening_books keys into single indexed files.')
+    parser.add_argument('keys', nargs='+', help='Keys of the opening_books books section to merge.')
+    parser.add_argument('--config', '-c', default='config.yml', help='Path to config.yml.')
+    parser.add_argument('--output', '-o', default=os.path.join('books', 'merged'), help='Output directory.')
+    parser.add_argument('--variant', default='chess', help='Variant used to sample benchmark positions.')
+    parser.add_argument('--positions', type=int, default=10_000, help='Number of benchmark positions.')
+    parser.add_argument('--benchmark', '-b', action='store_true', help='Compare lookup latency after merging.')
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,156 @@
+import itertools
+import os
+from collections.abc import Iterable
+from dataclasses import dataclass
+
+import chess
+import chess.polyglot
+import numpy as np
+
+POLYGLOT_ENTRY = np.dtype([('key', '>u8'), ('raw_move', '>u2'), ('weight', '>u2'), ('learn', '>u4')])
+MERGED_ENTRY = np.dtype([('key', '<u8'), ('raw_move', '<u2'), ('weight', '<u2'), ('learn', '<u4'),
+                         ('source', 'u1'), ('share', '<f4')])
+
+
+@dataclass
+class Book_Candidate:
+    move: chess.Move
+    weight: int
+    learn: int
+    share: float
+
+    @classmethod
+    def from_entries(cls, entries: Iterable[chess.polyglot.Entry]) -> list['Book_Candidate']:
+        candidates = [Book_Candidate(entry.move, entry.weight, entry.learn, 0.0) for entry in entries]
+        _set_shares(candidates)
+        return candidates
+
+
+class Polyglot_Book:
+    def __init__(self, path: str) -> None:
+        size = os.path.getsize(path)
+        if size % POLYGLOT_ENTRY.itemsize:
+            raise OSError(f'Invalid file size: "{path}" is not a valid polyglot opening book.')
+
+        self.path = path
+        if size:
+            self.entries = np.memmap(path, dtype=POLYGLOT_ENTRY, mode='r')
+        else:
+            self.entries = np.empty(0, dtype=POLYGLOT_ENTRY)
+        self.keys = self.entries['key'].astype(np.uint64)
+        self.keys.flags.writeable = False
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def find_all(self, board: chess.Board) -> list[chess.polyglot.Entry]:
+        key = np.uint64(chess.polyglot.zobrist_hash(board))
+        start = int(self.keys.searchsorted(key, side='left'))
+        end = int(self.keys.searchsorted(key, side='right'))
+        if start == end:
+            return []
+
+        entries: list[chess.polyglot.Entry] = []
+        for entry_key, raw_move, weight, learn in self.entries[start:end].tolist():
+            if weight < 1:
+                continue
+
+            move = _decode_move(board, raw_move)
+            if not board.is_legal(move):
+                continue
+
+            entries.append(chess.polyglot.Entry(entry_key, raw_move, weight, learn, move))
+
+        return entries
+
+
+class Merged_Book:
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with np.load(path) as data:
+            entries: np.ndarray = np.asarray(data['entries'])
+            names: np.ndarray = np.asarray(data['names'])
+        self.entries = entries
+        self.names: list[str] = names.tolist()
+
+        if self.entries.dtype != MERGED_ENTRY:
+            raise OSError(f'"{path}" is not a merged opening book.')
+
+        self.keys = np.ascontiguousarray(self.entries['key'])
+        self.keys.flags.writeable = False
+        self.entries.flags.writeable = False
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def find_groups(self, board: chess.Board) -> list[tuple[str, list[Book_Candidate]]]:
+        key = np.uint64(chess.polyglot.zobrist_hash(board))
+        start = int(self.keys.searchsorted(key, side='left'))
+        end = int(self.keys.searchsorted(key, side='right'))
+
+        groups: list[tuple[str, list[Book_Candidate]]] = []
+        rows = self.entries[start:end].tolist()
+        for source, source_rows in itertools.groupby(rows, key=lambda row: row[4]):
+            candidates: list[Book_Candidate] = []
+            has_illegal_move = False
+            for _, raw_move, weight, learn, _, share in source_rows:
+                move = _decode_move(board, raw_move)
+                if not board.is_legal(move):
+                    has_illegal_move = True
+                    continue
+
+                candidates.append(Book_Candidate(move, weight, learn, share))
+
+            if not candidates:
+                continue
+
+            if has_illegal_move:
+                _set_shares(candidates)
+
+            groups.append((self.names[source], candidates))
+
+        return groups
+
+
+def _decode_move(board: chess.Board, raw_move: int) -> chess.Move:
+    to_square = raw_move & 0x3f
+    from_square = (raw_move >> 6) & 0x3f
+    promotion_part = (raw_move >> 12) & 0x7
+    promotion = promotion_part + 1 if promotion_part else None
+
+    if from_square == to_square:
+        return chess.Move(from_square, to_square, drop=promotion)
+
+    return board._from_chess960(board.chess960, from_square, to_square, promotion)
+
+
+def _set_shares(candidates: list[Book_Candidate]) -> None:
+    total_weight = sum(candidate.weight for candidate in candidates)
+    for candidate in candidates:
+        candidate.share = candidate.weight / total_weight * 100.0
+
+
+class Book_Store:
+    books: dict[str, Polyglot_Book] = {}
+    merged_books: dict[str, Merged_Book] = {}
+
+    @classmethod
+    def open(cls, path: str) -> Polyglot_Book:
+        real_path = os.path.realpath(path)
+        if (book := cls.books.get(real_path)) is None:
+            book = cls.books[real_path] = Polyglot_Book(real_path)
+
+        return book
+
+    @classmethod
+    def open_merged(cls, path: str) -> Merged_Book:
+        real_path = os.path.realpath(path)
+        if (book := cls.merged_books.get(real_path)) is None:
+            book = cls.merged_books[real_path] = Merged_Book(real_path)
+
+        return book
+
+    @classmethod
+    def preload(cls, paths: list[str]) -> None:
+        for path in paths:
+            cls.open(path)
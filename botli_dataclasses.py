@@ -5,9 +5,10 @@ from typing import Any, Literal
 
 import chess
 import chess.engine
-from chess.polyglot import MemoryMappedReader
 
+from book_store import Merged_Book, Polyglot_Book
 from enums import Challenge_Color, Perf_Type, Variant
+from stream_events import Chat_Line_Event, Game_Full_Event, Game_State_Event
 
 
 @dataclass
@@ -26,7 +27,8 @@ class API_Challenge_Reponse:
 class Book_Settings:
     selection: Literal['weighted_random', 'uniform_random', 'best_move'] = 'best_move'
     max_depth: int | None = None
-    readers: dict[str, MemoryMappedReader] = field(default_factory=dict)
+    readers: dict[str, Polyglot_Book] = field(default_factory=dict)
+    merged_book: Merged_Book | None = None
 
 
 @dataclass
@@ -86,7 +88,7 @@ class Chat_Message:
     room: Literal['player', 'spectator']
 
     @classmethod
-    def from_chatLine_event(cls, chatLine_event: dict[str, Any]) -> 'Chat_Message':
+    def from_chatLine_event(cls, chatLine_event: Chat_Line_Event) -> 'Chat_Message':
         username = chatLine_event['username']
         text = chatLine_event['text']
         room = chatLine_event['room']
@@ -114,11 +116,11 @@ class Game_Information:
     variant: Variant
     variant_name: str
     initial_fen: str
-    state: dict[str, Any]
+    state: Game_State_Event
     tournament_id: str | None
 
     @classmethod
-    def from_gameFull_event(cls, gameFull_event: dict[str, Any]) -> 'Game_Information':
+    def from_gameFull_event(cls, gameFull_event: Game_Full_Event) -> 'Game_Information':
         assert gameFull_event['type'] == 'gameFull'
 
         id_ = gameFull_event['id']
@@ -212,6 +214,15 @@ class Game_Information:
         return chess.engine.Opponent(self.black_name, self.black_title, self.black_rating, self.black_title == 'BOT')
 
 
+@dataclass
+class Game_Result:
+    game_id: str
+    was_aborted: bool = False
+    ejected_tournament: str | None = None
+    info: Game_Information | None = None
+    final_state: Game_State_Event | None = None
+
+
 @dataclass
 class Gaviota_Result:
     move: chess.Move
@@ -308,6 +319,29 @@ class Move_Response:
     is_engine_move: bool = field(default=False, kw_only=True)
 
 
+@dataclass
+class Ponder_Stats:
+    hits: int = 0
+    misses: int = 0
+    saved_time: float = 0.0
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / (self.hits + self.misses) if self.hits + self.misses else 0.0
+
+    def __str__(self) -> str:
+        return (f'Ponder hits: {self.hits}/{self.hits + self.misses} ({self.hit_rate * 100:.0f} %)     '
+                f'Time saved: {self.saved_time:.1f} s')
+
+
+@dataclass
+class Prefetch_Request:
+    source: Literal['cloud', 'chessdb', 'egtb']
+    variant: str
+    fen: str
+    timeout: int
+
+
 @dataclass
 class Syzygy_Result:
     move: chess.Move
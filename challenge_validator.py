@@ -1,8 +1,7 @@
-from typing import Any
-
 from config import Config
 from enums import Decline_Reason
 from game_manager import Game_Manager
+from stream_events import Challenge_Info
 
 
 class Challenge_Validator:
@@ -18,7 +17,7 @@ class Challenge_Validator:
         self.max_rating_diff = config.challenge.max_rating_diff if config.challenge.max_rating_diff is not None else 10000
         self.variant_rating_diffs = config.challenge.variant_rating_diffs if config.challenge.variant_rating_diffs is not None else {}
 
-    def get_decline_reason(self, challenge_event: dict[str, Any]) -> Decline_Reason | None:
+    def get_decline_reason(self, challenge_event: Challenge_Info) -> Decline_Reason | None:
         speed: str = challenge_event['speed']
         if speed == 'ultraBullet':
             print('Time control "UltraBullet" is not allowed for bots.')
@@ -3,8 +3,11 @@ import platform
 import time
 import asyncio
 from collections import defaultdict
+from collections.abc import Coroutine
+from typing import Any
 
 import chess
+import chess.engine
 
 import psutil
 
@@ -13,6 +16,8 @@ from botli_dataclasses import Chat_Message, Game_Information
 from config import Config
 from lichess_game import Lichess_Game
 from openings_db import get_opening_info
+from service_engine import Service_Engine
+from stream_events import Chat_Line_Event
 from enums import Variant
 
 
@@ -22,13 +27,15 @@ class Chatter:
                  config: Config,
                  username: str,
                  game_information: Game_Information,
-                 lichess_game: Lichess_Game
+                 lichess_game: Lichess_Game,
+                 service_engine: Service_Engine
                  ) -> None:
         self.api = api
         self.config = config
         self.username = username
         self.game_info = game_information
         self.lichess_game = lichess_game
+        self.service_engine = service_engine
         self.cpu_message = self._get_cpu()
         self.draw_message = self._get_draw_message(config)
         self.name_message = self._get_name_message(config.version)
@@ -39,8 +46,9 @@ class Chatter:
         self.spectator_goodbye = self._format_message(config.messages.goodbye_spectators)
         self.print_eval_rooms: set[str] = set()
         self.hint_counter: int = 0
+        self.service_tasks: set[asyncio.Task[None]] = set()
 
-    async def handle_chat_message(self, chatLine_Event: dict) -> None:
+    async def handle_chat_message(self, chatLine_Event: Chat_Line_Event) -> None:
         chat_message = Chat_Message.from_chatLine_event(chatLine_Event)
 
         if chat_message.username == 'lichess':
@@ -95,6 +103,13 @@ class Chatter:
                                                                         'Feel free to challenge me again, '
                                                                         'I will accept the challenge if possible.'))
 
+    async def close(self) -> None:
+        # Late service engine replies must not reach the chat of a finished game.
+        for task in self.service_tasks:
+            task.cancel()
+
+        await asyncio.gather(*self.service_tasks, return_exceptions=True)
+
     async def _handle_command(self, chat_message: Chat_Message) -> None:
         command = chat_message.text[1:].lower()
         
@@ -104,7 +119,7 @@ class Chatter:
             case 'draw':
                 await self.api.send_chat_message(self.game_info.id_, chat_message.room, self.draw_message)
             case 'eval':
-                await self._send_last_message(chat_message.room)
+                await self._send_eval(chat_message.room)
             case 'motor':
                 await self.api.send_chat_message(self.game_info.id_, chat_message.room, self.lichess_game.engine.name)
             case 'name':
@@ -320,21 +335,51 @@ class Chatter:
                                                          f"Request hints in order. Next hint is hint number {self.hint_counter + 1}.")
             return
         
+        # Hints use lines the game engine already has or the service engine, never a search of the game engine.
+        board = self.lichess_game.board.copy(stack=False)
+        if lines := self.lichess_game.get_ranked_lines():
+            await self._send_hint(chat_message.room, requested_hint, board, lines)
+            return
+
+        if not self.service_engine.is_enabled:
+            await self.api.send_chat_message(self.game_info.id_, chat_message.room,
+                                             "I have not analysed this position yet. Please ask again in a moment.")
+            return
+
+        self._run_service_task(self._send_service_hint(chat_message.room, requested_hint, board))
+
+    async def _send_service_hint(self, room: str, requested_hint: int, board: chess.Board) -> None:
+        lines = await self.service_engine.analyse(board)
+        if not lines or board != self.lichess_game.board:
+            await self.api.send_chat_message(self.game_info.id_, room,
+                                             "I have not analysed this position yet. Please ask again in a moment.")
+            return
+
+        await self._send_hint(room, requested_hint, board, lines)
+
+    async def _send_hint(self,
+                         room: str,
+                         requested_hint: int,
+                         board: chess.Board,
+                         lines: list[chess.engine.InfoDict]) -> None:
         try:
-            best_move, info = await self.lichess_game.engine.make_hint_move(
-                self.lichess_game.board
-            )
-            move_san = self.lichess_game.board.san(best_move)
+            best_line = lines[0]
+            move_san = board.san(best_line.get('pv', [])[0])
             message = f"Hint {requested_hint}: The suggested move is {move_san}"
             
-            if 'score' in info:
-                score = self.lichess_game._format_score(info['score'])
+            if 'score' in best_line:
+                score = self.lichess_game._format_score(best_line['score']).strip()
                 message += f" with evaluation {score}"
+
+            alternatives = [f"{board.san(line['pv'][0])} ({self.lichess_game._format_score(line['score']).strip()})"
+                            for line in lines[1:3] if 'pv' in line and 'score' in line]
+            if alternatives:
+                message += f". Alternatives: {', '.join(alternatives)}"
             
-            await self.api.send_chat_message(self.game_info.id_, chat_message.room, message)
+            await self.api.send_chat_message(self.game_info.id_, room, message)
             self.hint_counter = requested_hint
         except Exception as e:
-            await self.api.send_chat_message(self.game_info.id_, chat_message.room,
+            await self.api.send_chat_message(self.game_info.id_, room,
                                                      "Hint unavailable.")
 
     async def _handle_ping_command(self, chat_message: Chat_Message) -> None:
@@ -350,6 +395,48 @@ class Chatter:
             await self.api.send_chat_message(self.game_info.id_, chat_message.room,
                                            "Could not measure ping to Lichess.")
 
+    async def _send_eval(self, room: str) -> None:
+        if self.lichess_game.is_our_turn:
+            await self._send_last_message(room)
+            return
+
+        if lines := self.lichess_game.get_ranked_lines():
+            await self._send_eval_message(room, lines)
+            return
+
+        if not self.service_engine.is_enabled:
+            await self._send_last_message(room)
+            return
+
+        self._run_service_task(self._send_service_eval(room, self.lichess_game.board.copy(stack=False)))
+
+    async def _send_service_eval(self, room: str, board: chess.Board) -> None:
+        lines = await self.service_engine.analyse(board)
+        if not lines or board != self.lichess_game.board:
+            await self._send_last_message(room)
+            return
+
+        await self._send_eval_message(room, lines)
+
+    async def _send_eval_message(self, room: str, lines: list[chess.engine.InfoDict]) -> None:
+        if 'score' not in (best_line := lines[0]):
+            await self._send_last_message(room)
+            return
+
+        # While the opponent thinks, the analysis of the current position is fresher than our last move.
+        score = best_line['score'].pov(self.lichess_game.is_white)
+        message = f'Evaluation: {score}' if score.is_mate() else f'Evaluation: {score.score(mate_score=0) / 100:+.2f}'
+        if room == 'spectator':
+            message = self._append_pv(message, lines)
+
+        await self.api.send_chat_message(self.game_info.id_, room, message)
+
+    def _run_service_task(self, coroutine: Coroutine[Any, Any, None]) -> None:
+        # Service engine requests can take seconds, the game stream must keep handling moves meanwhile.
+        task = asyncio.create_task(coroutine)
+        self.service_tasks.add(task)
+        task.add_done_callback(self.service_tasks.discard)
+
     async def _send_last_message(self, room: str) -> None:
         last_message = self.lichess_game.last_message.replace('Engine', 'Evaluation')
         last_message = ' '.join(last_message.split())
@@ -411,18 +498,22 @@ class Chatter:
                                     'ram': self.ram_message})
         return message.format_map(mapping)
 
-    def _append_pv(self, initial_message: str = '') -> str:
-        if len(self.lichess_game.last_pv) < 2:
+    def _append_pv(self, initial_message: str = '', lines: list[chess.engine.InfoDict] | None = None) -> str:
+        if lines := lines or self.lichess_game.get_ranked_lines():
+            board = self.lichess_game.board.copy(stack=False)
+            pv = lines[0].get('pv', [])
+        elif len(self.lichess_game.last_pv) < 2:
             return initial_message
-
-        if initial_message:
-            initial_message += ' '
-
-        if self.lichess_game.is_our_turn:
+        elif self.lichess_game.is_our_turn:
             board = self.lichess_game.board.copy(stack=1)
             board.pop()
+            pv = self.lichess_game.last_pv[1:]
         else:
             board = self.lichess_game.board.copy(stack=False)
+            pv = self.lichess_game.last_pv[1:]
+
+        if initial_message:
+            initial_message += ' '
 
         if board.turn:
             initial_message += 'PV:'
@@ -430,7 +521,7 @@ class Chatter:
             initial_message += f'PV: {board.fullmove_number}...'
 
         final_message = initial_message
-        for move in self.lichess_game.last_pv[1:]:
+        for move in pv:
             if board.turn:
                 initial_message += f' {board.fullmove_number}.'
             initial_message += f' {board.san(move)}'
@@ -7,10 +7,13 @@ from typing import Any
 
 import yaml
 
-from configs import (Books_Config, Challenge_Config, Chat_Config, ChessDB_Config, Engine_Config, Gaviota_Config,
-                     Lichess_Cloud_Config, Limit_Config, Matchmaking_Config, Matchmaking_Type_Config, Messages_Config,
-                     Offer_Draw_Config, Online_EGTB_Config, Online_Moves_Config, Opening_Books_Config,
-                     Opening_Explorer_Config, Rematch_Config, Resign_Config, Syzygy_Config)
+from configs import (Books_Config, Challenge_Config, Chat_Config, ChessDB_Config, Engine_Config, Engine_Pool_Config,
+                     Event_Loop_Config, Game_Workers_Config, Gaviota_Config, Lichess_Cloud_Config, Limit_Config,
+                     Loop_Monitor_Config, Matchmaking_Config, Matchmaking_Type_Config, Messages_Config,
+                     Move_Overhead_Config, Offer_Draw_Config, Online_EGTB_Config, Online_Moves_Config,
+                     Opening_Books_Config, Opening_Explorer_Config, Position_Cache_Config, Prefetch_Config,
+                     Racing_Config, Rematch_Config, Resign_Config, Resource_Planner_Config, Service_Engine_Config,
+                     Syzygy_Config)
 
 
 @dataclass
@@ -18,10 +21,18 @@ class Config:
     url: str
     token: str
     engines: dict[str, Engine_Config]
+    engine_pool: Engine_Pool_Config
     syzygy: dict[str, Syzygy_Config]
     gaviota: Gaviota_Config
     opening_books: Opening_Books_Config
     online_moves: Online_Moves_Config
+    position_cache: Position_Cache_Config
+    move_overhead: Move_Overhead_Config
+    loop_monitor: Loop_Monitor_Config
+    event_loop: Event_Loop_Config
+    game_workers: Game_Workers_Config
+    service_engine: Service_Engine_Config
+    resource_planner: Resource_Planner_Config
     offer_draw: Offer_Draw_Config
     resign: Resign_Config
     challenge: Challenge_Config
@@ -49,10 +60,19 @@ class Config:
         cls._check_sections(yaml_config)
 
         engine_configs = cls._get_engine_configs(yaml_config['engines'])
+        engine_pool_config = cls._get_engine_pool_config(yaml_config.get('engine_pool') or {})
         syzygy_config = cls._get_syzygy_configs(yaml_config['syzygy'])
         gaviota_config = cls._get_gaviota_config(yaml_config['gaviota'])
         opening_books_config = cls._get_opening_books_config(yaml_config)
         online_moves_config = cls._get_online_moves_config(yaml_config['online_moves'])
+        position_cache_config = cls._get_position_cache_config(yaml_config.get('position_cache') or {})
+        move_overhead_config = cls._get_move_overhead_config(yaml_config.get('move_overhead') or {})
+        loop_monitor_config = cls._get_loop_monitor_config(yaml_config.get('loop_monitor') or {})
+        event_loop_config = cls._get_event_loop_config(yaml_config.get('event_loop') or {})
+        game_workers_config = cls._get_game_workers_config(yaml_config.get('game_workers') or {})
+        service_engine_config = cls._get_service_engine_config(yaml_config.get('service_engine') or {},
+                                                               engine_configs)
+        resource_planner_config = cls._get_resource_planner_config(yaml_config.get('resource_planner') or {})
         offer_draw_config = cls._get_offer_draw_config(yaml_config['offer_draw'])
         resign_config = cls._get_resign_config(yaml_config['resign'])
         challenge_config = cls._get_challenge_config(yaml_config['challenge'])
@@ -67,10 +87,18 @@ class Config:
         return cls(yaml_config.get('url', 'https://mskchess.ru'),
                    yaml_config['token'],
                    engine_configs,
+                   engine_pool_config,
                    syzygy_config,
                    gaviota_config,
                    opening_books_config,
                    online_moves_config,
+                   position_cache_config,
+                   move_overhead_config,
+                   loop_monitor_config,
+                   event_loop_config,
+                   game_workers_config,
+                   service_engine_config,
+                   resource_planner_config,
                    offer_draw_config,
                    resign_config,
                    challenge_config,
@@ -145,6 +173,14 @@ class Config:
 
             limits_settings = settings['limits'] or {}
 
+            time_manager = settings.get('time_manager') or 'uci'
+            if time_manager not in ['uci', 'budget']:
+                raise RuntimeError(f'`engines` `{key}` subsection "time_manager" must be "uci" or "budget".')
+
+            ponder_multipv = settings.get('ponder_multipv') or 1
+            if not isinstance(ponder_multipv, int) or ponder_multipv < 1:
+                raise RuntimeError(f'`engines` `{key}` subsection "ponder_multipv" must be a positive integer.')
+
             engine_configs[key] = Engine_Config(settings['path'],
                                                 settings['ponder'],
                                                 settings['silence_stderr'],
@@ -152,10 +188,32 @@ class Config:
                                                 settings['uci_options'] or {},
                                                 Limit_Config(limits_settings.get('time'),
                                                              limits_settings.get('depth'),
-                                                             limits_settings.get('nodes')))
+                                                             limits_settings.get('nodes')),
+                                                time_manager,
+                                                ponder_multipv)
 
         return engine_configs
 
+    @staticmethod
+    def _get_engine_pool_config(engine_pool_section: dict[str, Any]) -> Engine_Pool_Config:
+        engine_pool_sections = [
+            ['enabled', bool, '"enabled" must be a bool.'],
+            ['size', int, '"size" must be an integer.'],
+            ['max_idle', int, '"max_idle" must be an integer.'],
+            ['max_lifetime', int, '"max_lifetime" must be an integer.'],
+            ['health_check_timeout', float, '"health_check_timeout" must be a float.']]
+
+        for subsection in engine_pool_sections:
+            if subsection[0] in engine_pool_section:
+                if not isinstance(engine_pool_section[subsection[0]], subsection[1]):
+                    raise TypeError(f'`engine_pool` subsection {subsection[2]}')
+
+        return Engine_Pool_Config(engine_pool_section.get('enabled', False),
+                                  engine_pool_section.get('size', 1),
+                                  engine_pool_section.get('max_idle', 2),
+                                  engine_pool_section.get('max_lifetime', 3600),
+                                  engine_pool_section.get('health_check_timeout', 2.0))
+
     @staticmethod
     def _get_syzygy_configs(syzygy_section: dict[str, dict[str, Any]]) -> dict[str, Syzygy_Config]:
         syzygy_sections = [
@@ -182,10 +240,15 @@ class Config:
                 if not os.path.isdir(path):
                     raise RuntimeError(f'Your {key} syzygy path "{path}" is not a directory.')
 
+            max_open_tables = settings.get('max_open_tables')
+            if max_open_tables is not None and (not isinstance(max_open_tables, int) or max_open_tables < 1):
+                raise TypeError(f'`syzygy` `{key}` subsection "max_open_tables" must be a positive integer.')
+
             syzygy_configs[key] = Syzygy_Config(settings['enabled'],
                                                 settings['paths'],
                                                 settings['max_pieces'],
-                                                settings['instant_play'])
+                                                settings['instant_play'],
+                                                max_open_tables)
 
         return syzygy_configs
 
@@ -251,7 +314,15 @@ class Config:
 
                 names[book_name] = config['books'][book_name]
 
-            books[section] = Books_Config(settings['selection'], settings.get('max_depth'), names, settings.get('random_selection', False))
+            if 'merged' in settings:
+                if not isinstance(settings['merged'], str):
+                    raise TypeError(f'`opening_books` `books` `{section}` field "merged" must be a string wrapped in quotes.')
+
+                if not os.path.isfile(settings['merged']):
+                    raise RuntimeError(f'The merged book "{settings["merged"]}" of `{section}` does not exist. '
+                                       f'Create it with: python book_merge.py {section}')
+
+            books[section] = Books_Config(settings['selection'], settings.get('max_depth'), names, settings.get('random_selection', False), settings.get('merged'))
 
         return Opening_Books_Config(config['opening_books']['enabled'],
                                     config['opening_books']['priority'],
@@ -391,7 +462,244 @@ class Config:
         return Online_Moves_Config(Config._get_opening_explorer_config(online_moves_section['opening_explorer']),
                                    Config._get_lichess_cloud_config(online_moves_section['lichess_cloud']),
                                    Config._get_chessdb_config(online_moves_section['chessdb']),
-                                   Config._get_online_egtb_config(online_moves_section['online_egtb']))
+                                   Config._get_online_egtb_config(online_moves_section['online_egtb']),
+                                   Config._get_racing_config(online_moves_section.get('racing') or {}),
+                                   Config._get_prefetch_config(online_moves_section.get('prefetch') or {}))
+
+    @staticmethod
+    def _get_racing_config(racing_section: dict[str, Any]) -> Racing_Config:
+        if 'enabled' in racing_section and not isinstance(racing_section['enabled'], bool):
+            raise TypeError('`online_moves` `racing` subsection "enabled" must be a bool.')
+
+        deadlines: dict[str, float] = {}
+        for source, deadline in (racing_section.get('deadlines') or {}).items():
+            if source not in ['opening_explorer', 'lichess_cloud', 'chessdb', 'online_egtb']:
+                raise RuntimeError(f'`online_moves` `racing` `deadlines` has unknown move source "{source}".')
+
+            if not isinstance(deadline, int | float):
+                raise TypeError(f'`online_moves` `racing` `deadlines` field "{source}" must be a number.')
+
+            deadlines[source] = float(deadline)
+
+        return Racing_Config(racing_section.get('enabled', False), deadlines)
+
+    @staticmethod
+    def _get_prefetch_config(prefetch_section: dict[str, Any]) -> Prefetch_Config:
+        prefetch_sections = [
+            ['enabled', bool, '"enabled" must be a bool.'],
+            ['concurrency', int, '"concurrency" must be an integer.'],
+            ['max_requests_per_minute', int, '"max_requests_per_minute" must be an integer.'],
+            ['max_replies', int, '"max_replies" must be an integer.']]
+
+        for subsection in prefetch_sections:
+            if subsection[0] in prefetch_section:
+                if not isinstance(prefetch_section[subsection[0]], subsection[1]):
+                    raise TypeError(f'`online_moves` `prefetch` subsection {subsection[2]}')
+
+        return Prefetch_Config(prefetch_section.get('enabled', False),
+                               prefetch_section.get('concurrency', 2),
+                               prefetch_section.get('max_requests_per_minute', 30),
+                               prefetch_section.get('max_replies', 3))
+
+    @staticmethod
+    def _get_position_cache_config(position_cache_section: dict[str, Any]) -> Position_Cache_Config:
+        position_cache_sections = [
+            ['enabled', bool, '"enabled" must be a bool.'],
+            ['path', str | None, '"path" must be a string wrapped in quotes.'],
+            ['memory_size', int, '"memory_size" must be an integer.'],
+            ['ttl', dict, '"ttl" must be a dictionary with indented keys followed by colons.'],
+            ['negative_ttl', int, '"negative_ttl" must be an integer.']]
+
+        for subsection in position_cache_sections:
+            if subsection[0] in position_cache_section:
+                if not isinstance(position_cache_section[subsection[0]], subsection[1]):
+                    raise TypeError(f'`position_cache` subsection {subsection[2]}')
+
+        ttls = {'cloud': 604_800, 'chessdb': 86_400, 'egtb': 2_592_000}
+        for source, ttl in (position_cache_section.get('ttl') or {}).items():
+            if source not in ttls:
+                raise RuntimeError(f'`position_cache` `ttl` has unknown source "{source}".')
+
+            if not isinstance(ttl, int):
+                raise TypeError(f'`position_cache` `ttl` field "{source}" must be an integer.')
+
+            ttls[source] = ttl
+
+        return Position_Cache_Config(position_cache_section.get('enabled', False),
+                                     position_cache_section.get('path') or '',
+                                     position_cache_section.get('memory_size', 10_000),
+                                     ttls,
+                                     position_cache_section.get('negative_ttl', 3600))
+
+    @staticmethod
+    def _get_move_overhead_config(move_overhead_section: dict[str, Any]) -> Move_Overhead_Config:
+        move_overhead_sections = [
+            ['adaptive', bool, '"adaptive" must be a bool.'],
+            ['percentile', int, '"percentile" must be an integer.'],
+            ['samples', int, '"samples" must be an integer.'],
+            ['limits', dict, '"limits" must be a dictionary with indented keys followed by colons.']]
+
+        for subsection in move_overhead_sections:
+            if subsection[0] in move_overhead_section:
+                if not isinstance(move_overhead_section[subsection[0]], subsection[1]):
+                    raise TypeError(f'`move_overhead` subsection {subsection[2]}')
+
+        percentile = move_overhead_section.get('percentile', 90)
+        if not 0 < percentile <= 100:
+            raise RuntimeError('`move_overhead` `percentile` must be between 1 and 100.')
+
+        samples = move_overhead_section.get('samples', 30)
+        if samples < 1:
+            raise RuntimeError('`move_overhead` `samples` must be at least 1.')
+
+        limits = {'ultraBullet': (0.1, 0.5), 'bullet': (0.2, 1.0), 'blitz': (0.3, 2.0),
+                  'rapid': (0.5, 3.0), 'classical': (0.5, 5.0)}
+        for speed, limit in (move_overhead_section.get('limits') or {}).items():
+            if speed not in limits:
+                raise RuntimeError(f'`move_overhead` `limits` has unknown speed "{speed}".')
+
+            if not isinstance(limit, dict) or not all(isinstance(limit.get(key), int | float)
+                                                      for key in ('min', 'max')):
+                raise TypeError(f'`move_overhead` `limits` field "{speed}" must have a number for "min" and "max".')
+
+            if limit['min'] > limit['max']:
+                raise RuntimeError(f'`move_overhead` `limits` field "{speed}" has "min" greater than "max".')
+
+            limits[speed] = (float(limit['min']), float(limit['max']))
+
+        return Move_Overhead_Config(move_overhead_section.get('adaptive', False),
+                                    percentile,
+                                    samples,
+                                    limits)
+
+    @staticmethod
+    def _get_loop_monitor_config(loop_monitor_section: dict[str, Any]) -> Loop_Monitor_Config:
+        loop_monitor_sections = [
+            ['enabled', bool, '"enabled" must be a bool.'],
+            ['slow_callback', float, '"slow_callback" must be a float.'],
+            ['interval', int, '"interval" must be an integer.'],
+            ['path', str | None, '"path" must be a string wrapped in quotes.']]
+
+        for subsection in loop_monitor_sections:
+            if subsection[0] in loop_monitor_section:
+                if not isinstance(loop_monitor_section[subsection[0]], subsection[1]):
+                    raise TypeError(f'`loop_monitor` subsection {subsection[2]}')
+
+        return Loop_Monitor_Config(loop_monitor_section.get('enabled', False),
+                                   loop_monitor_section.get('slow_callback', 0.05),
+                                   loop_monitor_section.get('interval', 300),
+                                   loop_monitor_section.get('path') or '')
+
+    @staticmethod
+    def _get_event_loop_config(event_loop_section: dict[str, Any]) -> Event_Loop_Config:
+        event_loop_sections = [
+            ['uvloop', bool, '"uvloop" must be a bool.'],
+            ['thread_pool_workers', int, '"thread_pool_workers" must be an integer.'],
+            ['connection_limit', int, '"connection_limit" must be an integer.'],
+            ['connection_limit_per_host', int, '"connection_limit_per_host" must be an integer.']]
+
+        for subsection in event_loop_sections:
+            if subsection[0] in event_loop_section:
+                if not isinstance(event_loop_section[subsection[0]], subsection[1]):
+                    raise TypeError(f'`event_loop` subsection {subsection[2]}')
+
+                if event_loop_section[subsection[0]] < 0:
+                    raise RuntimeError(f'`event_loop` subsection "{subsection[0]}" must not be negative.')
+
+        return Event_Loop_Config(event_loop_section.get('uvloop', False),
+                                 event_loop_section.get('thread_pool_workers', 0),
+                                 event_loop_section.get('connection_limit', 100),
+                                 event_loop_section.get('connection_limit_per_host', 0))
+
+    @staticmethod
+    def _get_game_workers_config(game_workers_section: dict[str, Any]) -> Game_Workers_Config:
+        if 'count' in game_workers_section:
+            if not isinstance(game_workers_section['count'], int):
+                raise TypeError('`game_workers` subsection "count" must be an integer.')
+
+            if game_workers_section['count'] < 0:
+                raise RuntimeError('`game_workers` subsection "count" must not be negative.')
+
+        return Game_Workers_Config(game_workers_section.get('count', 0))
+
+    @staticmethod
+    def _get_service_engine_config(service_engine_section: dict[str, Any],
+                                   engine_configs: dict[str, Engine_Config]) -> Service_Engine_Config:
+        service_engine_sections = [
+            ['enabled', bool, '"enabled" must be a bool.'],
+            ['engine', str, '"engine" must be a string wrapped in quotes.'],
+            ['threads', int, '"threads" must be an integer.'],
+            ['hash', int, '"hash" must be an integer.'],
+            ['nice', int, '"nice" must be an integer.'],
+            ['cpu_affinity', list, '"cpu_affinity" must be a list.'],
+            ['time', float, '"time" must be a float.'],
+            ['multipv', int, '"multipv" must be an integer.'],
+            ['deadline', float, '"deadline" must be a float.'],
+            ['queue_size', int, '"queue_size" must be an integer.']]
+
+        for subsection in service_engine_sections:
+            if subsection[0] in service_engine_section:
+                if not isinstance(service_engine_section[subsection[0]], subsection[1]):
+                    raise TypeError(f'`service_engine` subsection {subsection[2]}')
+
+        service_engine_config = Service_Engine_Config(service_engine_section.get('enabled', False),
+                                                      service_engine_section.get('engine', 'standard'),
+                                                      service_engine_section.get('threads', 1),
+                                                      service_engine_section.get('hash', 64),
+                                                      service_engine_section.get('nice', 10),
+                                                      service_engine_section.get('cpu_affinity') or [],
+                                                      service_engine_section.get('time', 1.0),
+                                                      service_engine_section.get('multipv', 3),
+                                                      service_engine_section.get('deadline', 3.0),
+                                                      service_engine_section.get('queue_size', 8))
+        if not service_engine_config.enabled:
+            return service_engine_config
+
+        if service_engine_config.engine not in engine_configs:
+            raise RuntimeError(f'`service_engine` engine "{service_engine_config.engine}" is not in `engines`.')
+
+        for name in ['threads', 'hash', 'multipv', 'queue_size']:
+            if getattr(service_engine_config, name) < 1:
+                raise RuntimeError(f'`service_engine` subsection "{name}" must be at least 1.')
+
+        if service_engine_config.time <= 0.0 or service_engine_config.deadline <= 0.0:
+            raise RuntimeError('`service_engine` subsections "time" and "deadline" must be positive.')
+
+        if not all(isinstance(cpu, int) and cpu >= 0 for cpu in service_engine_config.cpu_affinity):
+            raise TypeError('`service_engine` subsection "cpu_affinity" must be a list of CPU numbers.')
+
+        return service_engine_config
+
+    @staticmethod
+    def _get_resource_planner_config(resource_planner_section: dict[str, Any]) -> Resource_Planner_Config:
+        resource_planner_sections = [
+            ['enabled', bool, '"enabled" must be a bool.'],
+            ['cpus', list, '"cpus" must be a list.'],
+            ['hash', int, '"hash" must be an integer.'],
+            ['min_hash', int, '"min_hash" must be an integer.'],
+            ['numa', bool, '"numa" must be a bool.'],
+            ['rebalance_threads', bool, '"rebalance_threads" must be a bool.']]
+
+        for subsection in resource_planner_sections:
+            if subsection[0] in resource_planner_section:
+                if not isinstance(resource_planner_section[subsection[0]], subsection[1]):
+                    raise TypeError(f'`resource_planner` subsection {subsection[2]}')
+
+        resource_planner_config = Resource_Planner_Config(resource_planner_section.get('enabled', False),
+                                                          resource_planner_section.get('cpus') or [],
+                                                          resource_planner_section.get('hash', 0),
+                                                          resource_planner_section.get('min_hash', 16),
+                                                          resource_planner_section.get('numa', False),
+                                                          resource_planner_section.get('rebalance_threads', True))
+
+        if not all(isinstance(cpu, int) and cpu >= 0 for cpu in resource_planner_config.cpus):
+            raise TypeError('`resource_planner` subsection "cpus" must be a list of CPU numbers.')
+
+        if resource_planner_config.hash < 0 or resource_planner_config.min_hash < 1:
+            raise RuntimeError('`resource_planner` subsection "hash" must not be negative '
+                               'and "min_hash" must be at least 1.')
+
+        return resource_planner_config
 
     @staticmethod
     def _get_offer_draw_config(offer_draw_section: dict[str, Any]) -> Offer_Draw_Config:
@@ -17,6 +17,17 @@ class Engine_Config:
     move_overhead_multiplier: float
     uci_options: dict[str, Any]
     limits: Limit_Config
+    time_manager: str
+    ponder_multipv: int
+
+
+@dataclass
+class Engine_Pool_Config:
+    enabled: bool
+    size: int
+    max_idle: int
+    max_lifetime: int
+    health_check_timeout: float
 
 
 @dataclass
@@ -25,6 +36,7 @@ class Syzygy_Config:
     paths: list[str]
     max_pieces: int
     instant_play: bool
+    max_open_tables: int | None = None
 
 
 @dataclass
@@ -40,6 +52,7 @@ class Books_Config:
     max_depth: int | None
     names: dict[str, str]
     random_selection: bool = False
+    merged: str | None = None
 
 
 @dataclass
@@ -100,12 +113,90 @@ class Online_EGTB_Config:
     timeout: int
 
 
+@dataclass
+class Racing_Config:
+    enabled: bool
+    deadlines: dict[str, float]
+
+
+@dataclass
+class Prefetch_Config:
+    enabled: bool
+    concurrency: int
+    max_requests_per_minute: int
+    max_replies: int
+
+
 @dataclass
 class Online_Moves_Config:
     opening_explorer: Opening_Explorer_Config
     lichess_cloud: Lichess_Cloud_Config
     chessdb: ChessDB_Config
     online_egtb: Online_EGTB_Config
+    racing: Racing_Config
+    prefetch: Prefetch_Config
+
+
+@dataclass
+class Position_Cache_Config:
+    enabled: bool
+    path: str
+    memory_size: int
+    ttls: dict[str, int]
+    negative_ttl: int
+
+
+@dataclass
+class Move_Overhead_Config:
+    adaptive: bool
+    percentile: int
+    samples: int
+    limits: dict[str, tuple[float, float]]
+
+
+@dataclass
+class Loop_Monitor_Config:
+    enabled: bool
+    slow_callback: float
+    interval: int
+    path: str
+
+
+@dataclass
+class Event_Loop_Config:
+    uvloop: bool
+    thread_pool_workers: int
+    connection_limit: int
+    connection_limit_per_host: int
+
+
+@dataclass
+class Game_Workers_Config:
+    count: int
+
+
+@dataclass
+class Service_Engine_Config:
+    enabled: bool
+    engine: str
+    threads: int
+    hash: int
+    nice: int
+    cpu_affinity: list[int]
+    time: float
+    multipv: int
+    deadline: float
+    queue_size: int
+
+
+@dataclass
+class Resource_Planner_Config:
+    enabled: bool
+    cpus: list[int]
+    hash: int
+    min_hash: int
+    numa: bool
+    rebalance_threads: bool
 
 
 @dataclass
@@ -1,11 +1,15 @@
 import asyncio
 import os
 import subprocess
+import time
 
 import chess
 import chess.engine
+import psutil
 
+from botli_dataclasses import Ponder_Stats
 from configs import Engine_Config, Limit_Config, Syzygy_Config
+from time_manager import TIME_MANAGERS, Budget_Time_Manager
 
 
 class Engine:
@@ -14,12 +18,27 @@ class Engine:
                  engine: chess.engine.UciProtocol,
                  ponder: bool,
                  opponent: chess.engine.Opponent,
-                 limit_config: Limit_Config) -> None:
+                 limit_config: Limit_Config,
+                 time_manager: Budget_Time_Manager | None,
+                 ponder_multipv: int) -> None:
         self.transport = transport
         self.engine = engine
         self.ponder = ponder
         self.opponent = opponent
         self.limit_config = limit_config
+        self.time_manager = time_manager
+        self.ponder_multipv = ponder_multipv
+        self.analysis: chess.engine.AnalysisResult | None = None
+        self.analysis_board: chess.Board | None = None
+        self.search_board: chess.Board | None = None
+        self.search_info: chess.engine.InfoDict = {}
+        self.ponder_board: chess.Board | None = None
+        self.ponder_start = 0.0
+        self.ponder_paused = False
+        self.ponder_stats = Ponder_Stats()
+        self.pending_options: dict[str, int] = {}
+        self.pending_cpus: list[int] | None = None
+        self.resources_deferred = False
 
     @classmethod
     async def from_config(cls,
@@ -30,24 +49,38 @@ class Engine:
 
         transport, engine = await chess.engine.popen_uci(engine_config.path, stderr=stderr)
 
-        await cls._configure_engine(engine, engine_config, syzygy_config)
-        await engine.send_opponent_information(opponent=opponent)
+        try:
+            await cls._configure_engine(engine, engine_config, syzygy_config)
+            await engine.send_opponent_information(opponent=opponent)
+        except BaseException:
+            # A cancelled pool spawn must not leave the started process behind.
+            transport.close()
+            raise
 
-        return cls(transport, engine, engine_config.ponder, opponent, engine_config.limits)
+        time_manager_type = TIME_MANAGERS.get(engine_config.time_manager)
+        time_manager = time_manager_type() if time_manager_type else None
+        return cls(transport, engine, engine_config.ponder, opponent, engine_config.limits, time_manager,
+                   engine_config.ponder_multipv)
 
     @classmethod
-    async def test(cls, engine_config: Engine_Config) -> None:
-        stderr = subprocess.DEVNULL if engine_config.silence_stderr else None
+    async def spawn(cls, engine_config: Engine_Config, syzygy_config: Syzygy_Config) -> 'Engine':
+        return await cls.from_config(engine_config, syzygy_config, chess.engine.Opponent(None, None, None, False))
 
-        transport, engine = await chess.engine.popen_uci(engine_config.path, stderr=stderr)
-        await cls._configure_engine(engine, engine_config, Syzygy_Config(False, [], 0, False))
-        result = await engine.play(chess.Board(), chess.engine.Limit(time=0.1), info=chess.engine.INFO_ALL)
+    @classmethod
+    async def test(cls, engine_config: Engine_Config) -> 'Engine':
+        engine = await cls.spawn(engine_config, Syzygy_Config(False, [], 0, False))
+
+        try:
+            result = await engine.engine.play(chess.Board(), chess.engine.Limit(time=0.1), info=chess.engine.INFO_ALL)
+        except BaseException:
+            await engine.close()
+            raise
 
         if not result.move:
+            await engine.close()
             raise RuntimeError('Engine could not make a move!')
 
-        await engine.quit()
-        transport.close()
+        return engine
 
     @staticmethod
     async def _configure_engine(engine: chess.engine.UciProtocol,
@@ -75,12 +108,57 @@ class Engine:
     def name(self) -> str:
         return self.engine.id['name']
 
+    @property
+    def is_alive(self) -> bool:
+        return self.transport.get_returncode() is None
+
+    @property
+    def ponders_on_reply(self) -> bool:
+        # Only searches started by play() continue with "go ponder" after the best move, which has a single line.
+        return self.ponder and self.time_manager is None and self.ponder_multipv == 1
+
+    async def set_opponent(self, opponent: chess.engine.Opponent) -> None:
+        self.opponent = opponent
+        await self.engine.send_opponent_information(opponent=opponent)
+
+    async def new_game(self, timeout: float) -> bool:
+        if not self.is_alive:
+            return False
+
+        try:
+            # The ping stops a running ponder search before the engine state is reset.
+            await asyncio.wait_for(self.engine.ping(), timeout)
+            self.engine.send_line('ucinewgame')
+            await asyncio.wait_for(self.engine.ping(), timeout)
+        except (TimeoutError, chess.engine.EngineError, chess.engine.EngineTerminatedError):
+            return False
+
+        self.opponent = chess.engine.Opponent(None, None, None, False)
+        self.ponder_board = None
+        self.ponder_paused = False
+        self.ponder_stats = Ponder_Stats()
+        self.analysis = self.analysis_board = self.search_board = None
+        if self.time_manager:
+            self.time_manager.reset()
+        return True
+
     async def make_move(self,
                         board: chess.Board,
                         white_time: float,
                         black_time: float,
                         increment: float
                         ) -> tuple[chess.Move, chess.engine.InfoDict]:
+        if self.pending_options or self.pending_cpus is not None:
+            if self._is_ponderhit(board) and not self.resources_deferred:
+                # Changing options stops the ponder search, a ponderhit keeps it for one more move.
+                self.resources_deferred = True
+            else:
+                # The ponder search is stopped by the new options, so it is no ponderhit even on a matching board.
+                if not self._is_ponderhit(board):
+                    self._check_ponderhit(board)
+                self.ponder_board = None
+                await self.apply_pending_options()
+
         if len(board.move_stack) < 2:
             time_limit = 10.0 if self.opponent.is_engine else 5.0
             if self.limit_config.time:
@@ -88,6 +166,16 @@ class Engine:
 
             limit = chess.engine.Limit(time=time_limit, depth=self.limit_config.depth, nodes=self.limit_config.nodes)
             ponder = False
+        elif self.time_manager:
+            own_time = white_time if board.turn == chess.WHITE else black_time
+            self.ponder_board = None
+            move, info = await self.time_manager.search(self.engine, board, own_time, increment, self.limit_config)
+
+            if not move:
+                raise RuntimeError('Engine could not make a move!')
+
+            self._remember_search(board, info)
+            return move, info
         else:
             limit = chess.engine.Limit(white_clock=white_time, white_inc=increment,
                                        black_clock=black_time, black_inc=increment,
@@ -96,31 +184,110 @@ class Engine:
                                        nodes=self.limit_config.nodes)
             ponder = self.ponder
 
+        if ponder:
+            self._check_ponderhit(board)
+
         result = await self.engine.play(board, limit, info=chess.engine.INFO_ALL, ponder=ponder)
 
         if not result.move:
             raise RuntimeError('Engine could not make a move!')
 
-        return result.move, result.info
+        self._remember_search(board, result.info)
+        if ponder and result.ponder:
+            # The engine continues with "go ponder" on the expected reply until the next search.
+            self.ponder_board = board.copy()
+            self.ponder_board.push(result.move)
+            self.ponder_board.push(result.ponder)
+            self.ponder_start = time.perf_counter()
 
-    async def make_hint_move(self, board: chess.Board) -> tuple[chess.Move, chess.engine.InfoDict]:
-        limit = chess.engine.Limit(time=1.0, depth=10)
-        result = await self.engine.play(board, limit, info=chess.engine.INFO_ALL)
-        
-        if not result.move:
-            raise RuntimeError('Engine could not make a move!')
-        
         return result.move, result.info
 
+    async def apply_pending_options(self) -> None:
+        self.resources_deferred = False
+        if self.pending_options:
+            options, self.pending_options = self.pending_options, {}
+            await self.engine.configure(options)
+
+        # The CPUs change together with Threads, search threads started later inherit the pinned main thread.
+        if self.pending_cpus is not None:
+            cpus, self.pending_cpus = self.pending_cpus, None
+            self.set_affinity(cpus)
+
+    def set_affinity(self, cpus: list[int]) -> None:
+        try:
+            process = psutil.Process(self.transport.get_pid())
+            if hasattr(os, 'sched_setaffinity'):
+                # Linux pins threads individually, search threads that already exist do not follow the process.
+                for thread in process.threads():
+                    os.sched_setaffinity(thread.id, cpus)
+            else:
+                process.cpu_affinity(cpus)
+        except (psutil.Error, AttributeError, OSError) as e:
+            print(f'Engine "{self.name}" could not be pinned to CPUs {cpus}: {e}')
+
+    def get_ranked_lines(self, board: chess.Board) -> list[chess.engine.InfoDict]:
+        # Lines come from the running ponder analysis or the last search, the engine never searches for them.
+        if self.analysis and board == self.analysis_board:
+            if lines := [info for info in self.analysis.multipv if info.get('pv')]:
+                return lines
+
+        if self.search_board is None or not (pv := self.search_info.get('pv')):
+            return []
+
+        line_board = self.search_board.copy(stack=False)
+        for index, move in enumerate(pv):
+            if line_board == board:
+                line = self.search_info.copy()
+                line['pv'] = pv[index:]
+                if 'depth' in line:
+                    line['depth'] = max(line['depth'] - index, 1)
+                return [line]
+
+            line_board.push(move)
+
+        return []
+
     async def start_pondering(self, board: chess.Board) -> None:
+        if self.ponder_paused:
+            self.ponder_paused = False
+            return
+
         if self.ponder:
-            await self.engine.analysis(board)
+            self.ponder_board = None
+            self.analysis_board = board.copy(stack=False)
+            self.analysis = await self.engine.analysis(board, multipv=self.ponder_multipv)
 
     async def stop_pondering(self, board: chess.Board) -> None:
+        # Only the reply to the current move is not pondered, the next engine move ponders again.
         if self.ponder:
-            self.ponder = False
+            self.ponder_paused = True
+            self.ponder_board = None
+            self.analysis = None
             await self.engine.analysis(board, chess.engine.Limit(time=0.001))
 
+    def _remember_search(self, board: chess.Board, info: chess.engine.InfoDict) -> None:
+        self.search_board = board.copy(stack=False)
+        self.search_info = info
+
+    def _is_ponderhit(self, board: chess.Board) -> bool:
+        if self.ponder_board is None:
+            return False
+
+        return board.move_stack == self.ponder_board.move_stack and board == self.ponder_board
+
+    def _check_ponderhit(self, board: chess.Board) -> None:
+        if self.ponder_board is None:
+            return
+
+        # On a matching position python-chess sends "ponderhit" instead of "stop", so the search keeps its work.
+        if self._is_ponderhit(board):
+            self.ponder_stats.hits += 1
+            self.ponder_stats.saved_time += time.perf_counter() - self.ponder_start
+        else:
+            self.ponder_stats.misses += 1
+
+        self.ponder_board = None
+
     async def close(self) -> None:
         try:
             await asyncio.wait_for(self.engine.quit(), 5.0)
@@ -0,0 +1,163 @@
+import asyncio
+import time
+from collections import defaultdict, deque
+
+import chess.engine
+
+from config import Config
+from configs import Syzygy_Config
+from engine import Engine
+from resource_planner import Resource_Planner
+
+Pool_Key = tuple[str, bool, tuple[str, ...], int]
+
+
+class Engine_Pool:
+    def __init__(self, config: Config, worker_index: int | None = None) -> None:
+        self.config = config
+        self.pool_config = config.engine_pool
+        self.planner = Resource_Planner(config, worker_index)
+        self.idle: defaultdict[Pool_Key, deque[Engine]] = defaultdict(deque)
+        self.leased: dict[Engine, Pool_Key] = {}
+        self.spawn_times: dict[Engine, float] = {}
+        self.syzygy_configs: dict[Pool_Key, Syzygy_Config] = {}
+        self.replenish_tasks: dict[Pool_Key, asyncio.Task[None]] = {}
+        self.close_tasks: set[asyncio.Task[None]] = set()
+        self.reused = 0
+        self.spawned = 0
+
+    async def acquire(self,
+                      engine_key: str,
+                      syzygy_config: Syzygy_Config,
+                      opponent: chess.engine.Opponent) -> Engine:
+        engine_config = self.config.engines[engine_key]
+        if not self.pool_config.enabled:
+            engine = await Engine.from_config(engine_config, syzygy_config, opponent)
+            await self.planner.lease(engine)
+            return engine
+
+        key = self._get_key(engine_key, syzygy_config)
+        self.syzygy_configs[key] = syzygy_config
+
+        if (engine := self._pop_idle(key)) is None:
+            if any(idle_key[0] == engine_key and engines for idle_key, engines in self.idle.items()):
+                print(f'Idle "{engine_key}" engines do not match the syzygy configuration of the game.')
+            engine = await self._spawn(key)
+            self.spawned += 1
+        else:
+            self.reused += 1
+
+        self.leased[engine] = key
+        engine.ponder = engine_config.ponder
+        await engine.set_opponent(opponent)
+        await self.planner.lease(engine)
+        self._replenish(key)
+        return engine
+
+    async def release(self, engine: Engine) -> None:
+        self.planner.release(engine)
+        key = self.leased.pop(engine, None)
+        if key is None:
+            await self._close(engine)
+            return
+
+        self._reap_idle()
+        if self._is_expired(engine) or self.idle_count >= self.pool_config.max_idle:
+            await self._close(engine)
+            return
+
+        if not await engine.new_game(self.pool_config.health_check_timeout):
+            print(f'Engine "{key[0]}" failed the health check and is replaced.')
+            await self._close(engine)
+            self._replenish(key)
+            return
+
+        if self.idle_count >= self.pool_config.max_idle:
+            await self._close(engine)
+            return
+
+        self.idle[key].append(engine)
+
+    async def add(self, engine_key: str, syzygy_config: Syzygy_Config, engine: Engine) -> None:
+        if not self.pool_config.enabled:
+            await engine.close()
+            return
+
+        key = self._get_key(engine_key, syzygy_config)
+        self.syzygy_configs[key] = syzygy_config
+        self.spawn_times[engine] = time.monotonic()
+        self.leased[engine] = key
+        await self.release(engine)
+
+    async def close(self) -> None:
+        replenish_tasks = list(self.replenish_tasks.values())
+        for task in replenish_tasks:
+            task.cancel()
+
+        # Engines spawned before the cancellation are already idle and closed below.
+        await asyncio.gather(*replenish_tasks, return_exceptions=True)
+
+        for engines in self.idle.values():
+            while engines:
+                await self._close(engines.popleft())
+
+        for task in list(self.close_tasks):
+            await task
+
+    @property
+    def idle_count(self) -> int:
+        return sum(len(engines) for engines in self.idle.values())
+
+    def _get_key(self, engine_key: str, syzygy_config: Syzygy_Config) -> Pool_Key:
+        # Paths and piece limit of a disabled syzygy config are never sent to the engine.
+        if not syzygy_config.enabled:
+            return engine_key, False, (), 0
+
+        return engine_key, syzygy_config.enabled, tuple(syzygy_config.paths), syzygy_config.max_pieces
+
+    def _pop_idle(self, key: Pool_Key) -> Engine | None:
+        while self.idle[key]:
+            engine = self.idle[key].popleft()
+            if engine.is_alive and not self._is_expired(engine):
+                return engine
+
+            self._close_later(engine)
+
+    def _reap_idle(self) -> None:
+        # Idle engines of configurations that are no longer played would otherwise outlive their lifetime.
+        for engines in self.idle.values():
+            for engine in [engine for engine in engines if not engine.is_alive or self._is_expired(engine)]:
+                engines.remove(engine)
+                self._close_later(engine)
+
+    def _is_expired(self, engine: Engine) -> bool:
+        return time.monotonic() - self.spawn_times.get(engine, 0.0) > self.pool_config.max_lifetime
+
+    async def _spawn(self, key: Pool_Key) -> Engine:
+        engine = await Engine.spawn(self.config.engines[key[0]], self.syzygy_configs[key])
+        self.spawn_times[engine] = time.monotonic()
+        return engine
+
+    async def _close(self, engine: Engine) -> None:
+        self.spawn_times.pop(engine, None)
+        await engine.close()
+
+    def _close_later(self, engine: Engine) -> None:
+        task = asyncio.create_task(self._close(engine))
+        self.close_tasks.add(task)
+        task.add_done_callback(self.close_tasks.discard)
+
+    def _replenish(self, key: Pool_Key) -> None:
+        if key in self.replenish_tasks:
+            return
+
+        self.replenish_tasks[key] = asyncio.create_task(self._replenish_task(key))
+
+    async def _replenish_task(self, key: Pool_Key) -> None:
+        try:
+            while len(self.idle[key]) < self.pool_config.size and self.idle_count < self.pool_config.max_idle:
+                self.idle[key].append(await self._spawn(key))
+        except (OSError, chess.engine.EngineError, chess.engine.EngineTerminatedError) as e:
+            print(f'Engine pool could not spawn engine "{key[0]}": {e}')
+        finally:
+            del self.replenish_tasks[key]
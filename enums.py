@@ -1,4 +1,4 @@
-from enum import StrEnum
+from enum import IntEnum, StrEnum
 
 
 class Challenge_Color(StrEnum):
@@ -52,3 +52,11 @@ class Perf_Type(StrEnum):
 class Busy_Reason(StrEnum):
     OFFLINE = 'offline'
     PLAYING = 'playing'
+
+
+class Request_Priority(IntEnum):
+    MOVE = 0
+    GAME_CONTROL = 1
+    CHAT = 2
+    BACKGROUND = 3
+    CLOUD = 4
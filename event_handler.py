@@ -1,11 +1,11 @@
 import asyncio
-from typing import Any
 
 from api import API
 from botli_dataclasses import Challenge
 from challenge_validator import Challenge_Validator
 from config import Config
 from game_manager import Game_Manager
+from stream_events import Challenge_Info, Event_Stream_Event
 
 
 class Event_Handler:
@@ -14,10 +14,10 @@ class Event_Handler:
         self.username = username
         self.game_manager = game_manager
         self.challenge_validator = Challenge_Validator(config, game_manager)
-        self.last_challenge_event: dict[str, Any] | None = None
+        self.last_challenge_event: Challenge_Info | None = None
 
     async def run(self) -> None:
-        event_queue: asyncio.Queue[dict[str, Any]] = asyncio.Queue()
+        event_queue: asyncio.Queue[Event_Stream_Event] = asyncio.Queue()
         asyncio.create_task(self.api.get_event_stream(event_queue))
         while event := await event_queue.get():
             match event['type']:
@@ -47,7 +47,7 @@ class Event_Handler:
                     if opponent_name == self.username:
                         continue
 
-                    print(f'{opponent_name} declined challenge: {event["challenge"]["declineReason"]}')
+                    print(f'{opponent_name} declined challenge: {event["challenge"].get("declineReason")}')
                 case 'challengeCanceled':
                     if event['challenge']['challenger']['name'] == self.username:
                         continue
@@ -60,7 +60,7 @@ class Event_Handler:
                 case _:
                     print(event)
 
-    def _print_challenge_event(self, challenge_event: dict[str, Any]) -> None:
+    def _print_challenge_event(self, challenge_event: Challenge_Info) -> None:
         id_str = f'ID: {challenge_event["id"]}'
         title = challenge_event['challenger'].get('title') or ''
         name = challenge_event['challenger']['name']
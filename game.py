@@ -1,37 +1,56 @@
 import asyncio
+import time
 from itertools import islice
-from typing import Any
 
 from api import API
 from botli_dataclasses import Game_Information
 from chatter import Chatter
 
 from config import Config
+from engine_pool import Engine_Pool
 from lichess_game import Lichess_Game
+from prefetcher import Prefetcher
+from service_engine import Service_Engine
+from stream_events import Game_State_Event, Game_Stream_Event
 
 
 class Game:
-    def __init__(self, api: API, config: Config, username: str, game_id: str, rematch_manager=None) -> None:
+    def __init__(self,
+                 api: API,
+                 config: Config,
+                 username: str,
+                 game_id: str,
+                 engine_pool: Engine_Pool,
+                 prefetcher: Prefetcher,
+                 service_engine: Service_Engine,
+                 rematch_manager=None) -> None:
         self.api = api
         self.config = config
         self.username = username
         self.game_id = game_id
+        self.engine_pool = engine_pool
+        self.prefetcher = prefetcher
+        self.service_engine = service_engine
         self.rematch_manager = rematch_manager
 
         self.takeback_count = 0
         self.was_aborted = False
         self.ejected_tournament: str | None = None
+        self.info: Game_Information | None = None
+        self.final_state: Game_State_Event | None = None
 
         self.move_task: asyncio.Task[None] | None = None
         self.bot_offered_draw = False
 
 
     async def run(self) -> None:
-        game_stream_queue: asyncio.Queue[dict[str, Any]] = asyncio.Queue()
+        game_stream_queue: asyncio.Queue[Game_Stream_Event] = asyncio.Queue()
         asyncio.create_task(self.api.get_game_stream(self.game_id, game_stream_queue))
-        info = Game_Information.from_gameFull_event(await game_stream_queue.get())
-        lichess_game = await Lichess_Game.acreate(self.api, self.config, self.username, info)
-        chatter = Chatter(self.api, self.config, self.username, info, lichess_game)
+        game_full_event = await game_stream_queue.get()
+        assert game_full_event['type'] == 'gameFull'
+        info = self.info = Game_Information.from_gameFull_event(game_full_event)
+        lichess_game = await Lichess_Game.acreate(self.api, self.config, self.username, info, self.engine_pool)
+        chatter = Chatter(self.api, self.config, self.username, info, lichess_game, self.service_engine)
 
 
         self._print_game_information(info)
@@ -42,12 +61,15 @@ class Game:
             await lichess_game.close()
             return
 
-        await chatter.send_greetings()
+        # Greetings wait in the chat lane of the scheduler and must not delay the first move, neither may the warm-up.
+        greetings_task = asyncio.create_task(chatter.send_greetings())
+        warm_up_task = asyncio.create_task(self.api.warm_up_move_session())
 
         if lichess_game.is_our_turn:
             await self._make_move(lichess_game, chatter)
         else:
             await lichess_game.start_pondering()
+            self.prefetcher.submit(lichess_game.get_prefetch_requests())
 
         opponent_is_bot = info.white_title == 'BOT' and info.black_title == 'BOT'
         abortion_seconds = 30 if opponent_is_bot else 60
@@ -116,10 +138,11 @@ class Game:
 
                 self._print_result_message(event, lichess_game, info)
                 await chatter.send_goodbyes()
+                self.final_state = event
                 
                 # Handle rematch logic
                 if self.rematch_manager and not self.was_aborted:
-                    await self._handle_rematch(event, info)
+                    await self.rematch_manager.handle_game_end(event, info)
                 
                 break
 
@@ -127,6 +150,13 @@ class Game:
                 self.move_task = asyncio.create_task(self._make_move(lichess_game, chatter))
 
         abortion_task.cancel()
+        await chatter.close()
+        await greetings_task
+        await warm_up_task
+        if self.config.move_overhead.adaptive:
+            print(lichess_game.move_overhead_info)
+        if ponder_info := lichess_game.ponder_info:
+            print(ponder_info)
         await lichess_game.close()
 
     def _should_accept_draw(self, lichess_game: Lichess_Game) -> bool:
@@ -143,8 +173,8 @@ class Game:
                 return False
                 
             scores_count = len(lichess_game.scores)
-            if scores_count > 0:
-                last_score = lichess_game.scores[-1].relative.score(mate_score=40_000)
+            if scores_count > 0 and (latest_score := lichess_game.latest_score):
+                last_score = latest_score.relative.score(mate_score=40_000)
                 return abs(last_score) <= self.config.offer_draw.score * 2  # More lenient score threshold
             else:
                 return current_move > 20  # Accept if no scores available but game is long enough
@@ -161,8 +191,8 @@ class Game:
         
         if scores_count < min_scores_needed:
             if current_move > 50:
-                if scores_count > 0:
-                    last_score = lichess_game.scores[-1].relative.score(mate_score=40_000)
+                if scores_count > 0 and (latest_score := lichess_game.latest_score):
+                    last_score = latest_score.relative.score(mate_score=40_000)
                     return abs(last_score) <= self.config.offer_draw.score * 3
                 else:
                     return current_move > 60
@@ -176,6 +206,10 @@ class Game:
             if abs(score_cp) > draw_score:
                 return False
 
+        # The analysis of the current position may already see what our past scores missed.
+        if latest_score := lichess_game.latest_score:
+            return abs(latest_score.relative.score(mate_score=40_000)) <= draw_score
+
         return True
 
 
@@ -186,7 +220,10 @@ class Game:
             await self.api.resign_game(self.game_id)
         else:
             self.bot_offered_draw = lichess_move.offer_draw
+            start_time = time.perf_counter()
             await self.api.send_move(self.game_id, lichess_move.uci_move, lichess_move.offer_draw)
+            lichess_game.record_send_time(time.perf_counter() - start_time)
+            self.prefetcher.submit(lichess_game.get_prefetch_requests())
             await chatter.print_eval()
         self.move_task = None
 
@@ -206,7 +243,7 @@ class Game:
         print(f'\n{message}\n{128 * "-"}')
 
     def _print_result_message(self,
-                              game_state: dict[str, Any],
+                              game_state: Game_State_Event,
                               lichess_game: Lichess_Game,
                               info: Game_Information) -> None:
         if winner := game_state.get('winner'):
@@ -270,20 +307,3 @@ class Game:
         message = (5 * ' ').join([info.id_str, opponents_str, message])
 
         print(f'{message}\n{128 * "-"}')
-
-    async def _handle_rematch(self, game_state: dict[str, Any], info: Game_Information) -> None:
-        """Handle rematch logic after game ends."""
-        try:
-            winner = game_state.get('winner')
-            game_result = game_state.get('status', 'unknown')
-            
-            # Check if we should offer a rematch
-            if self.rematch_manager.should_offer_rematch(info, game_result, winner):
-                await self.rematch_manager.offer_rematch(info)
-            else:
-                # Notify rematch manager that game finished without rematch
-                opponent_name = self.rematch_manager._get_opponent_name(info)
-                if opponent_name:
-                    self.rematch_manager.on_game_finished(opponent_name)
-        except Exception as e:
-            print(f'Error handling rematch: {e}')
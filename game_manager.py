@@ -7,21 +7,30 @@ from api import API
 from botli_dataclasses import Challenge, Challenge_Request, Tournament, Tournament_Request
 from challenger import Challenger
 from config import Config
+from engine_pool import Engine_Pool
 from game import Game
+from game_worker import Game_Workers, Worker_Game
 from matchmaking import Matchmaking
+from prefetcher import Prefetcher
 from rematch_manager import Rematch_Manager
+from service_engine import Service_Engine
+from tablebase_store import Tablebase_Store
 
 
 class Game_Manager:
-    def __init__(self, api: API, config: Config, username: str) -> None:
+    def __init__(self, api: API, config: Config, username: str, engine_pool: Engine_Pool) -> None:
         self.api = api
         self.config = config
         self.username = username
+        self.engine_pool = engine_pool
+        self.prefetcher = Prefetcher(api, config)
+        self.service_engine = Service_Engine(config)
 
         self.challenger = Challenger(api)
         self.changed_event = Event()
         self.matchmaking = Matchmaking(api, config, username)
         self.rematch_manager = Rematch_Manager(api, config, username)
+        self.game_workers = Game_Workers(config, username) if config.game_workers.count else None
 
         self.challenge_requests: deque[Challenge_Request] = deque()
         self.current_matchmaking_game_id: str | None = None
@@ -32,7 +41,7 @@ class Game_Manager:
         self.open_challenges: deque[Challenge] = deque()
         self.reserved_game_spots = 0
         self.started_game_events: deque[dict[str, Any]] = deque()
-        self.tasks: dict[Task[None], Game] = {}
+        self.tasks: dict[Task[None], Game | Worker_Game] = {}
         self.tournament_requests: deque[Tournament_Request] = deque()
         self.tournament_ids_to_leave: deque[str] = deque()
         self.unstarted_tournaments: dict[str, Tournament] = {}
@@ -44,6 +53,9 @@ class Game_Manager:
         self.changed_event.set()
 
     async def run(self) -> None:
+        if self.game_workers:
+            self.game_workers.start()
+
         while self.is_running:
             try:
                 async with asyncio.timeout_at(self.next_matchmaking):
@@ -98,6 +110,14 @@ class Game_Manager:
         for task in list(self.tasks):
             await task
 
+        if self.game_workers:
+            await self.game_workers.close()
+
+        self.prefetcher.close()
+        await self.service_engine.close()
+        await self.engine_pool.close()
+        Tablebase_Store.close()
+
     @property
     def is_busy(self) -> bool:
         return len(self.tasks) + len(self.tournaments) + self.reserved_game_spots >= self.config.challenge.concurrency
@@ -232,6 +252,7 @@ class Game_Manager:
 
     def _task_callback(self, task: Task[None]) -> None:
         game = self.tasks.pop(task)
+        self.engine_pool.planner.set_game_count(len(self.tasks))
 
         if game.game_id == self.current_matchmaking_game_id:
             self.matchmaking.on_game_finished(game.was_aborted)
@@ -256,10 +277,15 @@ class Game_Manager:
             self.tournaments[tournament.id_] = tournament
             print(f'External joined tournament "{tournament.name}" detected.')
 
-        game = Game(self.api, self.config, self.username, game_event['id'], self.rematch_manager)
+        if self.game_workers:
+            game = Worker_Game(game_event['id'], self.game_workers, self.rematch_manager)
+        else:
+            game = Game(self.api, self.config, self.username, game_event['id'], self.engine_pool, self.prefetcher,
+                        self.service_engine, self.rematch_manager)
         task = asyncio.create_task(game.run())
         task.add_done_callback(self._task_callback)
         self.tasks[task] = game
+        self.engine_pool.planner.set_game_count(len(self.tasks))
 
     def _get_next_challenge(self) -> Challenge | None:
         if not self.open_challenges:
@@ -0,0 +1,179 @@
+import asyncio
+import multiprocessing
+import signal
+import threading
+from dataclasses import dataclass, field
+from multiprocessing.connection import Connection
+from multiprocessing.process import BaseProcess
+
+from api import API
+from botli_dataclasses import Game_Result
+from config import Config
+from engine_pool import Engine_Pool
+from game import Game
+from loop_setup import run
+from prefetcher import Prefetcher
+from rematch_manager import Rematch_Manager
+from service_engine import Service_Engine
+from tablebase_store import Tablebase_Store
+
+
+@dataclass
+class Worker_Process:
+    index: int
+    process: BaseProcess
+    connection: Connection
+    games: dict[str, asyncio.Future[Game_Result]] = field(default_factory=dict)
+
+
+class Game_Workers:
+    def __init__(self, config: Config, username: str) -> None:
+        self.config = config
+        self.username = username
+        self.workers: list[Worker_Process] = []
+
+    def start(self) -> None:
+        loop = asyncio.get_running_loop()
+        # Spawned workers start from a clean interpreter, forking would copy the running event loop.
+        context = multiprocessing.get_context('spawn')
+        for index in range(self.config.game_workers.count):
+            connection, worker_connection = context.Pipe()
+            process = context.Process(target=run_worker,
+                                      args=(worker_connection, self.config, self.username, index),
+                                      name=f'game_worker_{index}')
+            process.start()
+            worker_connection.close()
+
+            worker = Worker_Process(index, process, connection)
+            threading.Thread(target=self._receive, args=(loop, worker), daemon=True).start()
+            self.workers.append(worker)
+
+        print(f'Started {len(self.workers)} game worker(s).')
+
+    async def play(self, game_id: str) -> Game_Result:
+        alive_workers = [worker for worker in self.workers if worker.process.is_alive()]
+        if not alive_workers:
+            print(f'No game worker is running, game "{game_id}" is not played.')
+            return Game_Result(game_id)
+
+        worker = min(alive_workers, key=lambda worker: len(worker.games))
+        future = worker.games[game_id] = asyncio.get_running_loop().create_future()
+        worker.connection.send(game_id)
+        return await future
+
+    async def close(self) -> None:
+        for worker in self.workers:
+            try:
+                worker.connection.send(None)
+            except OSError:
+                pass
+
+        for worker in self.workers:
+            await asyncio.to_thread(worker.process.join)
+            worker.connection.close()
+
+        self.workers.clear()
+
+    def _receive(self, loop: asyncio.AbstractEventLoop, worker: Worker_Process) -> None:
+        while True:
+            try:
+                result: Game_Result = worker.connection.recv()
+            except (EOFError, OSError):
+                loop.call_soon_threadsafe(self._on_worker_exit, worker)
+                return
+
+            loop.call_soon_threadsafe(self._on_result, worker, result)
+
+    def _on_result(self, worker: Worker_Process, result: Game_Result) -> None:
+        if (future := worker.games.pop(result.game_id, None)) and not future.done():
+            future.set_result(result)
+
+    def _on_worker_exit(self, worker: Worker_Process) -> None:
+        if not worker.games:
+            return
+
+        print(f'Game worker {worker.index} exited with {len(worker.games)} running game(s).')
+        for game_id, future in worker.games.items():
+            if not future.done():
+                future.set_result(Game_Result(game_id))
+
+        worker.games.clear()
+
+
+class Worker_Game:
+    def __init__(self, game_id: str, game_workers: Game_Workers, rematch_manager: Rematch_Manager) -> None:
+        self.game_id = game_id
+        self.game_workers = game_workers
+        self.rematch_manager = rematch_manager
+
+        self.was_aborted = False
+        self.ejected_tournament: str | None = None
+
+    async def run(self) -> None:
+        result = await self.game_workers.play(self.game_id)
+        self.was_aborted = result.was_aborted
+        self.ejected_tournament = result.ejected_tournament
+
+        # Rematches are offered by the main process, which owns the challenge queue.
+        if result.info and result.final_state and not result.was_aborted:
+            await self.rematch_manager.handle_game_end(result.final_state, result.info)
+
+
+class Game_Worker:
+    def __init__(self, connection: Connection, config: Config, username: str, index: int) -> None:
+        self.connection = connection
+        self.config = config
+        self.username = username
+        self.engine_pool = Engine_Pool(config, index)
+        self.tasks: dict[asyncio.Task[None], Game] = {}
+
+    async def run(self) -> None:
+        game_ids: asyncio.Queue[str | None] = asyncio.Queue()
+        threading.Thread(target=self._receive, args=(asyncio.get_running_loop(), game_ids), daemon=True).start()
+
+        async with API(self.config) as api:
+            api.append_user_agent(self.username)
+            prefetcher = Prefetcher(api, self.config)
+            service_engine = Service_Engine(self.config)
+
+            while game_id := await game_ids.get():
+                game = Game(api, self.config, self.username, game_id, self.engine_pool, prefetcher,
+                            service_engine)
+                task = asyncio.create_task(game.run())
+                task.add_done_callback(self._task_callback)
+                self.tasks[task] = game
+                self.engine_pool.planner.set_game_count(len(self.tasks))
+
+            for task in list(self.tasks):
+                await task
+
+            prefetcher.close()
+            await service_engine.close()
+            await self.engine_pool.close()
+            Tablebase_Store.close()
+
+    def _receive(self, loop: asyncio.AbstractEventLoop, game_ids: asyncio.Queue[str | None]) -> None:
+        while True:
+            try:
+                game_id: str | None = self.connection.recv()
+            except (EOFError, OSError):
+                game_id = None
+
+            loop.call_soon_threadsafe(game_ids.put_nowait, game_id)
+            if game_id is None:
+                return
+
+    def _task_callback(self, task: asyncio.Task[None]) -> None:
+        game = self.tasks.pop(task)
+        self.engine_pool.planner.set_game_count(len(self.tasks))
+        self.connection.send(Game_Result(game.game_id,
+                                         game.was_aborted,
+                                         game.ejected_tournament,
+                                         game.info,
+                                         game.final_state))
+
+
+def run_worker(connection: Connection, config: Config, username: str, index: int) -> None:
+    # The main process handles Ctrl+C and stops the workers once their games are finished.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    run(Game_Worker(connection, config, username, index).run(), config.event_loop)
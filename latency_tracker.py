@@ -0,0 +1,33 @@
+import math
+from collections import deque
+
+
+class Latency_Tracker:
+    def __init__(self, samples: int, percentile: int) -> None:
+        self.percentile = percentile
+        self.clock_lags: deque[float] = deque(maxlen=samples)
+        self.send_times: deque[float] = deque(maxlen=samples)
+
+    def add_clock_lag(self, seconds: float) -> None:
+        self.clock_lags.append(max(seconds, 0.0))
+
+    def add_send_time(self, seconds: float) -> None:
+        self.send_times.append(seconds)
+
+    @property
+    def estimate(self) -> float | None:
+        # The server charges the clock lag, the send time is only what we see of it locally.
+        estimates = [self._get_percentile(samples) for samples in (self.clock_lags, self.send_times) if samples]
+        if estimates:
+            return max(estimates)
+
+    def get_summary(self) -> str:
+        clock_lag = f'{self._get_percentile(self.clock_lags) * 1000:.0f} ms' if self.clock_lags else 'n/a'
+        send_time = f'{self._get_percentile(self.send_times) * 1000:.0f} ms' if self.send_times else 'n/a'
+        return (f'P{self.percentile} clock lag: {clock_lag} ({len(self.clock_lags)} samples)     '
+                f'P{self.percentile} send time: {send_time} ({len(self.send_times)} samples)')
+
+    def _get_percentile(self, samples: deque[float]) -> float:
+        # Nearest-rank percentile, so the estimate is always an observed sample.
+        rank = math.ceil(self.percentile / 100 * len(samples))
+        return sorted(samples)[max(rank, 1) - 1]
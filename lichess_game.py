@@ -1,26 +1,31 @@
 import asyncio
 import itertools
 import random
-import struct
 import time
-from collections.abc import Awaitable, Callable, Iterable
+from collections.abc import Callable, Coroutine, Iterable, Iterator
+from contextlib import suppress
 from itertools import islice
 from typing import Any, Literal
 
 import chess
 import chess.engine
 import chess.gaviota
-import chess.polyglot
 import chess.syzygy
 from chess.variant import find_variant
 
 from api import API
+from book_store import Book_Candidate, Book_Store
 from botli_dataclasses import (Book_Settings, Game_Information, Gaviota_Result, Lichess_Move, Move_Response,
-                               Syzygy_Result)
+                               Prefetch_Request, Syzygy_Result)
 from config import Config
 from configs import Engine_Config, Syzygy_Config
 from engine import Engine
+from engine_pool import Engine_Pool
 from enums import Variant
+from latency_tracker import Latency_Tracker
+from position_history import Position_History
+from stream_events import Game_State_Event
+from tablebase_store import Tablebase_Store
 
 
 class Lichess_Game:
@@ -32,11 +37,16 @@ class Lichess_Game:
                  board: chess.Board,
                  syzygy_config: Syzygy_Config,
                  engine_key: str,
-                 engine: Engine) -> None:
+                 engine: Engine,
+                 engine_pool: Engine_Pool) -> None:
         self.api = api
         self.config = config
+        self.engine_pool = engine_pool
         self.game_info = game_info
         self.board = board
+        self.position_history = Position_History(board)
+        self.moves_string: str = self.game_info.state['moves']
+        self.uci_moves = self.moves_string.split()
         self.syzygy_config = syzygy_config
         self.white_time: float = self.game_info.state['wtime'] / 1000
         self.black_time: float = self.game_info.state['btime'] / 1000
@@ -46,6 +56,7 @@ class Lichess_Game:
         self.syzygy_tablebase = self._get_syzygy_tablebase()
         self.gaviota_tablebase = self._get_gaviota_tablebase()
         self.move_sources = self._get_move_sources()
+        self.racing_deadlines = self._get_racing_deadlines()
 
         self.opening_explorer_counter = 0
         self.out_of_opening_explorer_counter = 0
@@ -53,22 +64,32 @@ class Lichess_Game:
         self.out_of_cloud_counter = 0
         self.chessdb_counter = 0
         self.out_of_chessdb_counter = 0
-        self.move_overhead = self._get_move_overhead(config.engines[engine_key])
+        self.static_move_overhead = self._get_move_overhead(config.engines[engine_key])
+        self.move_overhead = self.static_move_overhead
+        self.latency_tracker = Latency_Tracker(config.move_overhead.samples, config.move_overhead.percentile)
+        self.pending_move_timing: tuple[float, float] | None = None
+        self.move_start_time: float | None = None
+        self.charged_time = 0.0
         self.engine = engine
         self.scores: list[chess.engine.PovScore] = []
         self.last_message = 'No eval available yet.'
         self.last_pv: list[chess.Move] = []
 
     @classmethod
-    async def acreate(cls, api: API, config: Config, username: str, game_info: Game_Information) -> 'Lichess_Game':
+    async def acreate(cls,
+                      api: API,
+                      config: Config,
+                      username: str,
+                      game_info: Game_Information,
+                      engine_pool: Engine_Pool) -> 'Lichess_Game':
         board = cls._get_board(game_info)
         is_white = game_info.white_name == username
         engine_key = cls._get_engine_key(config, board, is_white, game_info)
         syzygy_config = cls._get_syzygy_config(config, board)
-        engine = await Engine.from_config(config.engines[engine_key],
-                                          syzygy_config,
-                                          game_info.black_opponent if is_white else game_info.white_opponent)
-        return cls(api, config, username, game_info, board, syzygy_config, engine_key, engine)
+        engine = await engine_pool.acquire(engine_key,
+                                           syzygy_config,
+                                           game_info.black_opponent if is_white else game_info.white_opponent)
+        return cls(api, config, username, game_info, board, syzygy_config, engine_key, engine, engine_pool)
 
     @staticmethod
     def _get_board(game_info: Game_Information) -> chess.Board:
@@ -139,47 +160,87 @@ class Lichess_Game:
                 return Syzygy_Config(False, [], 0, False)
 
     async def make_move(self) -> Lichess_Move:
-        for move_source in self.move_sources:
-            if move_response := await move_source():
-                break
+        start_time = self.move_start_time = time.perf_counter()
+        self.charged_time = 0.0
+        own_time = self.own_time
+        if self.racing_deadlines:
+            move_response = await self._race_move_sources()
         else:
-            move, info = await self.engine.make_move(self.board, *self.engine_times)
-
-            if 'score' in info:
-                self.scores.append(info['score'])
-            message = f'Engine:  {self._format_move(move):14} {self._format_engine_info(info)}'
-            move_response = Move_Response(move, message,
-                                          pv=info.get('pv', []),
-                                          is_engine_move=len(self.board.move_stack) > 1)
+            for move_source in self.move_sources:
+                if move_response := await move_source():
+                    break
+            else:
+                move_response = self._get_engine_response(*await self.engine.make_move(self.board,
+                                                                                        *self.engine_times))
 
-        self.board.push(move_response.move)
-        if not move_response.is_engine_move:
+        self.position_history.push(move_response.move)
+        if not move_response.is_engine_move or not self.engine.ponders_on_reply:
             await self.engine.start_pondering(self.board)
 
         print(f'{move_response.public_message} {move_response.private_message}'.strip())
         self.last_message = move_response.public_message
         self.last_pv = move_response.pv
+        self.pending_move_timing = (own_time, time.perf_counter() - start_time)
 
         return Lichess_Move(move_response.move.uci(), self._offer_draw(move_response), self._resign(move_response))
 
-    def update(self, gameState_event: dict[str, Any]) -> bool:
+    def update(self, gameState_event: Game_State_Event) -> bool:
         self.white_time = gameState_event['wtime'] / 1000
         self.black_time = gameState_event['btime'] / 1000
 
-        moves = gameState_event['moves'].split()
-        if len(moves) > len(self.board.move_stack):
-            self.board.push(chess.Move.from_uci(moves[-1]))
-            return True
+        moves: str = gameState_event['moves']
+        if moves == self.moves_string:
+            return False
+
+        self._parse_moves(moves)
+        has_moved = self._sync_board()
+        self._add_clock_lag()
+        return has_moved and self.is_our_turn
 
-        return False
+    def record_send_time(self, seconds: float) -> None:
+        self.latency_tracker.add_send_time(seconds)
+        self._update_move_overhead()
 
     async def takeback(self) -> None:
-        self.board.pop()
+        self.pending_move_timing = None
+        self.position_history.pop()
         if self.is_our_turn:
-            self.board.pop()
+            self.position_history.pop()
         self.last_pv.clear()
         await self.start_pondering()
 
+    def get_ranked_lines(self) -> list[chess.engine.InfoDict]:
+        return self.engine.get_ranked_lines(self.board)
+
+    def get_prefetch_requests(self) -> list[Prefetch_Request]:
+        requests: list[Prefetch_Request] = []
+        for reply in self._get_expected_replies():
+            board = self.board.copy(stack=False)
+            board.push(reply)
+
+            if self._make_egtb_move in self.move_sources:
+                if chess.popcount(board.occupied) <= (7 if board.uci_variant == 'chess' else 6):
+                    requests.append(Prefetch_Request('egtb',
+                                                     self._get_egtb_variant(),
+                                                     board.fen(),
+                                                     self.config.online_moves.online_egtb.timeout))
+                    continue
+
+            if self._make_cloud_move in self.move_sources and self.out_of_cloud_counter < 5:
+                requests.append(Prefetch_Request('cloud',
+                                                 self.game_info.variant,
+                                                 self._get_cloud_fen(board),
+                                                 self.config.online_moves.lichess_cloud.timeout))
+
+            if self._make_chessdb_move in self.move_sources and self.out_of_chessdb_counter < 5:
+                if chess.popcount(board.occupied) > 7:
+                    requests.append(Prefetch_Request('chessdb',
+                                                     Variant.STANDARD,
+                                                     board.fen(),
+                                                     self.config.online_moves.chessdb.timeout))
+
+        return requests
+
     @property
     def is_our_turn(self) -> bool:
         return self.is_white == self.board.turn
@@ -196,20 +257,45 @@ class Lichess_Game:
     def opponent_time(self) -> float:
         return self.black_time if self.is_white else self.white_time
 
+    @property
+    def move_overhead_info(self) -> str:
+        return f'Move overhead: {self.move_overhead * 1000:.0f} ms     {self.latency_tracker.get_summary()}'
+
+    @property
+    def latest_score(self) -> chess.engine.PovScore | None:
+        # The analysis of the current position is fresher than the score of our last move.
+        for line in self.get_ranked_lines()[:1]:
+            if 'score' in line:
+                return chess.engine.PovScore(line['score'].pov(self.is_white), self.is_white)
+
+        return self.scores[-1] if self.scores else None
+
+    @property
+    def ponder_info(self) -> str | None:
+        if self.engine.ponder_stats.hits + self.engine.ponder_stats.misses:
+            return str(self.engine.ponder_stats)
+
     @property
     def engine_times(self) -> tuple[float, float, float]:
+        # Book, tablebase and online sources may already have used some of the clock for this move.
+        # Failed online lookups have already been taken from the clock, so only the rest is subtracted here.
+        spent_time = time.perf_counter() - self.move_start_time if self.move_start_time else 0.0
+        spent_time = max(spent_time - self.charged_time, 0.0)
+
         if self.is_white:
-            if self.white_time > self.move_overhead:
-                white_time = self.white_time - self.move_overhead
+            white_time = self.white_time - spent_time
+            if white_time > self.move_overhead:
+                white_time -= self.move_overhead
             else:
-                white_time = self.white_time / 2.0
+                white_time = max(white_time, 0.0) / 2.0
 
             return white_time, self.black_time, self.increment
 
-        if self.black_time > self.move_overhead:
-            black_time = self.black_time - self.move_overhead
+        black_time = self.black_time - spent_time
+        if black_time > self.move_overhead:
+            black_time -= self.move_overhead
         else:
-            black_time = self.black_time / 2.0
+            black_time = max(black_time, 0.0) / 2.0
 
         return self.white_time, black_time, self.increment
 
@@ -217,16 +303,13 @@ class Lichess_Game:
         await self.engine.start_pondering(self.board)
 
     async def close(self) -> None:
-        await self.engine.close()
-
-        for book_reader in self.book_settings.readers.values():
-            book_reader.close()
+        await self.engine_pool.release(self.engine)
 
         if self.syzygy_tablebase:
-            self.syzygy_tablebase.close()
+            Tablebase_Store.release(self.syzygy_tablebase)
 
         if self.gaviota_tablebase:
-            self.gaviota_tablebase.close()
+            Tablebase_Store.release(self.gaviota_tablebase)
 
     def _offer_draw(self, move_response: Move_Response) -> bool:
         is_0_5_0_game = self.game_info.tc_str == '0.5+0'
@@ -301,40 +384,89 @@ class Lichess_Game:
 
         return True
 
+    async def _race_move_sources(self) -> Move_Response:
+        start_time = 0.0
+        tasks: dict[Callable[[], Coroutine[Any, Any, Move_Response | None]], asyncio.Task[Move_Response | None]] = {}
+        engine_task: asyncio.Task[tuple[chess.Move, chess.engine.InfoDict]] | None = None
+
+        try:
+            for index, move_source in enumerate(self.move_sources):
+                if move_source not in self.racing_deadlines:
+                    if move_response := await move_source():
+                        return move_response
+
+                    continue
+
+                if engine_task is None:
+                    # Online sources are only asked once no local source has a move, they race from here on.
+                    start_time = time.perf_counter()
+                    tasks = {racing_source: asyncio.create_task(racing_source())
+                             for racing_source in self.move_sources[index:]
+                             if racing_source in self.racing_deadlines}
+                    engine_task = asyncio.create_task(self.engine.make_move(self.board, *self.engine_times))
+
+                remaining_time = self.racing_deadlines[move_source] - (time.perf_counter() - start_time)
+                try:
+                    if move_response := await asyncio.wait_for(tasks[move_source], max(remaining_time, 0.0)):
+                        return move_response
+                except TimeoutError:
+                    continue
+
+            if engine_task is None:
+                engine_task = asyncio.create_task(self.engine.make_move(self.board, *self.engine_times))
+
+            return self._get_engine_response(*await engine_task)
+        finally:
+            for task in tasks.values():
+                task.cancel()
+
+            if engine_task and not engine_task.done():
+                # Cancelling only ends the task, python-chess sends "stop" and consumes the bestmove in the background.
+                engine_task.cancel()
+                with suppress(asyncio.CancelledError):
+                    await engine_task
+
+    def _get_engine_response(self, move: chess.Move, info: chess.engine.InfoDict) -> Move_Response:
+        if 'score' in info:
+            self.scores.append(info['score'])
+        message = f'Engine:  {self._format_move(move):14} {self._format_engine_info(info)}'
+        return Move_Response(move, message,
+                             pv=info.get('pv', []),
+                             is_engine_move=len(self.board.move_stack) > 1)
+
     async def _make_book_move(self) -> Move_Response | None:
         if self.book_settings.max_depth and self.board.ply() >= self.book_settings.max_depth:
             return
 
-        for name, book_reader in self.book_settings.readers.items():
-            try:
-                entries = list(book_reader.find_all(self.board))
-            except struct.error:
-                print(f'Skipping book "{name}" due to error.')
-                continue
-
-            if not entries:
-                continue
-
+        for name, candidates in self._find_book_candidates():
             match self.book_settings.selection:
                 case 'weighted_random':
-                    entries.sort(key=lambda entry: random.random() ** (1.0 / entry.weight), reverse=True)
+                    candidates.sort(key=lambda candidate: random.random() ** (1.0 / candidate.weight), reverse=True)
                 case 'uniform_random':
-                    random.shuffle(entries)
+                    random.shuffle(candidates)
                 case 'best_move':
-                    entries.sort(key=lambda entry: entry.weight, reverse=True)
+                    candidates.sort(key=lambda candidate: candidate.weight, reverse=True)
 
-            for entry in entries:
-                if not self._is_repetition(entry.move):
+            for candidate in candidates:
+                if not self._is_repetition(candidate.move):
                     break
             else:
                 continue
 
-            weight = entry.weight / sum(entry.weight for entry in entries) * 100.0
-            learn = entry.learn if self.config.opening_books.read_learn else 0
+            learn = candidate.learn if self.config.opening_books.read_learn else 0
             name = name if len(self.book_settings.readers) > 1 else ''
-            public_message = f'Book:    {self._format_move(entry.move):14}'
-            private_message = f'{self._format_book_info(weight, learn)}     {name}'
-            return Move_Response(entry.move, public_message, private_message=private_message)
+            public_message = f'Book:    {self._format_move(candidate.move):14}'
+            private_message = f'{self._format_book_info(candidate.share, learn)}     {name}'
+            return Move_Response(candidate.move, public_message, private_message=private_message)
+
+    def _find_book_candidates(self) -> Iterator[tuple[str, list[Book_Candidate]]]:
+        if self.book_settings.merged_book:
+            yield from self.book_settings.merged_book.find_groups(self.board)
+            return
+
+        for name, book_reader in self.book_settings.readers.items():
+            if entries := book_reader.find_all(self.board):
+                yield name, Book_Candidate.from_entries(entries)
 
     def _get_book_settings(self) -> Book_Settings:
         if not self.config.opening_books.enabled:
@@ -350,18 +482,26 @@ class Lichess_Game:
             try:
                 selected_book_name, selected_book_path = random.choice(list(books_config.names.items()))
                 print(f"Randomly selected book: {selected_book_name} for key: {key}")
-                book_readers = {selected_book_name: chess.polyglot.open_reader(selected_book_path)}
+                book_readers = {selected_book_name: Book_Store.open(selected_book_path)}
             except Exception as e:
                 print(f"Error selecting random book for key {key}: {e}")
-                book_readers = {name: chess.polyglot.open_reader(path)
+                book_readers = {name: Book_Store.open(path)
                                for name, path in books_config.names.items()}
         else:
-            book_readers = {name: chess.polyglot.open_reader(path)
+            book_readers = {name: Book_Store.open(path)
                                for name, path in books_config.names.items()}
         
+        merged_book = None
+        if books_config.merged and len(book_readers) > 1:
+            merged_book = Book_Store.open_merged(books_config.merged)
+            if merged_book.names != list(book_readers):
+                print(f'Ignoring merged book "{books_config.merged}" as it was not created from the books of "{key}".')
+                merged_book = None
+
         return Book_Settings(books_config.selection,
                              books_config.max_depth,
-                             book_readers)
+                             book_readers,
+                             merged_book)
 
     def _get_book_key(self) -> str | None:
         suffixes: list[str] = []
@@ -502,7 +642,7 @@ class Lichess_Game:
             return
 
         start_time = time.perf_counter()
-        response = await self.api.get_cloud_eval(self.board.fen().replace('[', '/').replace(']', ''),
+        response = await self.api.get_cloud_eval(self._get_cloud_fen(self.board),
                                                  self.game_info.variant,
                                                  self.config.online_moves.lichess_cloud.timeout)
         if response is None:
@@ -593,21 +733,20 @@ class Lichess_Game:
         message = f'ChessDB: {self._format_move(move):14} {self._format_score(pov_score)}     {candidates}'
         return Move_Response(move, message)
 
-    def _probe_gaviota(self, moves: Iterable[chess.Move]) -> Gaviota_Result:
+    def _probe_gaviota(self, board: chess.Board, moves: Iterable[chess.Move]) -> Gaviota_Result:
         assert self.gaviota_tablebase
 
         best_move = chess.Move.null()
         best_wdl = -2
         best_dtm = 1_000_000
-        board_copy = self.board.copy(stack=False)
         for move in moves:
-            board_copy.push(move)
+            board.push(move)
 
-            if board_copy.is_checkmate():
+            if board.is_checkmate():
                 return Gaviota_Result(move, 2, 0)
 
-            dtm = -self.gaviota_tablebase.probe_dtm(board_copy)
-            wdl = self._value_to_wdl(dtm, board_copy.halfmove_clock)
+            dtm = -self.gaviota_tablebase.probe_dtm(board)
+            wdl = self._value_to_wdl(dtm, board.halfmove_clock)
 
             if best_move:
                 if wdl > best_wdl:
@@ -622,11 +761,13 @@ class Lichess_Game:
                 best_wdl = wdl
                 best_dtm = dtm
 
-            board_copy.pop()
+            board.pop()
 
         return Gaviota_Result(best_move, best_wdl, best_dtm)
 
     async def _make_gaviota_move(self) -> Move_Response | None:
+        assert self.gaviota_tablebase
+
         match chess.popcount(self.board.occupied):
             case pieces if pieces > self.config.gaviota.max_pieces + 1:
                 return
@@ -635,7 +776,7 @@ class Lichess_Game:
                     return
 
                 try:
-                    result = self._probe_gaviota(self.board.generate_legal_captures())
+                    result = await Tablebase_Store.probe(self.gaviota_tablebase, self.board, True, self._probe_gaviota)
                 except KeyError:
                     return
 
@@ -643,7 +784,7 @@ class Lichess_Game:
                     return
             case _:
                 try:
-                    result = self._probe_gaviota(self.board.generate_legal_moves())
+                    result = await Tablebase_Store.probe(self.gaviota_tablebase, self.board, False, self._probe_gaviota)
                 except KeyError:
                     return
 
@@ -667,22 +808,21 @@ class Lichess_Game:
         message = f'Gaviota: {self._format_move(result.move):14} {egtb_info}'
         return Move_Response(result.move, message, is_drawish=offer_draw, is_resignable=resign)
 
-    def _probe_syzygy(self, moves: Iterable[chess.Move]) -> Syzygy_Result:
+    def _probe_syzygy(self, board: chess.Board, moves: Iterable[chess.Move]) -> Syzygy_Result:
         assert self.syzygy_tablebase
 
         best_move = chess.Move.null()
         best_wdl = -2
         best_dtz = 1_000_000
         best_real_dtz = 0
-        board_copy = self.board.copy(stack=False)
         for move in moves:
-            board_copy.push(move)
+            board.push(move)
 
-            dtz = -self.syzygy_tablebase.probe_dtz(board_copy)
-            wdl = self._value_to_wdl(dtz, board_copy.halfmove_clock)
+            dtz = -self.syzygy_tablebase.probe_dtz(board)
+            wdl = self._value_to_wdl(dtz, board.halfmove_clock)
 
             real_dtz = dtz
-            if board_copy.halfmove_clock == 0:
+            if board.halfmove_clock == 0:
                 if wdl < 0:
                     dtz += 10_000
                 elif wdl > 0:
@@ -704,17 +844,19 @@ class Lichess_Game:
                 best_dtz = dtz
                 best_real_dtz = real_dtz
 
-            board_copy.pop()
+            board.pop()
 
         return Syzygy_Result(best_move, best_wdl, best_real_dtz)
 
     async def _make_syzygy_move(self) -> Move_Response | None:
+        assert self.syzygy_tablebase
+
         match chess.popcount(self.board.occupied):
             case pieces if pieces > self.syzygy_config.max_pieces + 1 or self._has_mate_score():
                 return
             case pieces if pieces == self.syzygy_config.max_pieces + 1:
                 try:
-                    result = self._probe_syzygy(self.board.generate_legal_captures())
+                    result = await Tablebase_Store.probe(self.syzygy_tablebase, self.board, True, self._probe_syzygy)
                 except KeyError:
                     return
 
@@ -722,7 +864,7 @@ class Lichess_Game:
                     return
             case _:
                 try:
-                    result = self._probe_syzygy(self.board.generate_legal_moves())
+                    result = await Tablebase_Store.probe(self.syzygy_tablebase, self.board, False, self._probe_syzygy)
                 except KeyError:
                     return
 
@@ -771,23 +913,14 @@ class Lichess_Game:
         if not (self.syzygy_config.enabled and self.syzygy_config.instant_play):
             return
 
-        tablebase = chess.syzygy.open_tablebase(self.syzygy_config.paths[0], VariantBoard=type(self.board))
-
-        for path in self.syzygy_config.paths[1:]:
-            tablebase.add_directory(path)
-
-        return tablebase
+        return Tablebase_Store.acquire_syzygy(self.syzygy_config.paths, type(self.board),
+                                              self.syzygy_config.max_open_tables)
 
     def _get_gaviota_tablebase(self) -> chess.gaviota.PythonTablebase | chess.gaviota.NativeTablebase | None:
         if not self.config.gaviota.enabled:
             return
 
-        tablebase = chess.gaviota.open_tablebase(self.config.gaviota.paths[0])
-
-        for path in self.config.gaviota.paths[1:]:
-            tablebase.add_directory(path)
-
-        return tablebase
+        return Tablebase_Store.acquire_gaviota(self.config.gaviota.paths)
 
     async def _make_egtb_move(self) -> Move_Response | None:
         max_pieces = 7 if self.board.uci_variant == 'chess' else 6
@@ -801,11 +934,10 @@ class Lichess_Game:
         if not self._has_time(self.config.online_moves.online_egtb.min_time) or self._has_mate_score():
             return
 
-        variant = 'standard' if self.board.uci_variant == 'chess' else self.board.uci_variant
-        assert variant
-
         start_time = time.perf_counter()
-        response = await self.api.get_egtb(self.board.fen(), variant, self.config.online_moves.online_egtb.timeout)
+        response = await self.api.get_egtb(self.board.fen(),
+                                           self._get_egtb_variant(),
+                                           self.config.online_moves.online_egtb.timeout)
         if response is None:
             self._reduce_own_time(time.perf_counter() - start_time)
             return
@@ -905,8 +1037,8 @@ class Lichess_Game:
 
         return output
 
-    def _get_move_sources(self) -> list[Callable[[], Awaitable[Move_Response | None]]]:
-        move_sources: list[Callable[[], Awaitable[Move_Response | None]]] = []
+    def _get_move_sources(self) -> list[Callable[[], Coroutine[Any, Any, Move_Response | None]]]:
+        move_sources: list[Callable[[], Coroutine[Any, Any, Move_Response | None]]] = []
 
         if self.config.gaviota.enabled:
             if self.board.uci_variant == 'chess':
@@ -919,7 +1051,7 @@ class Lichess_Game:
             if self.board.uci_variant in ['chess', 'antichess', 'atomic']:
                 move_sources.append(self._make_egtb_move)
 
-        opening_sources: dict[Callable[[], Awaitable[Move_Response | None]], int] = {}
+        opening_sources: dict[Callable[[], Coroutine[Any, Any, Move_Response | None]], int] = {}
 
         if self.config.opening_books.enabled:
             opening_sources[self._make_book_move] = self.config.opening_books.priority
@@ -946,9 +1078,77 @@ class Lichess_Game:
 
         return move_sources
 
+    def _get_expected_replies(self) -> list[chess.Move]:
+        replies: list[chess.Move] = []
+        if len(self.last_pv) > 1 and self.board.is_legal(self.last_pv[1]):
+            replies.append(self.last_pv[1])
+
+        for book_reader in self.book_settings.readers.values():
+            for entry in sorted(book_reader.find_all(self.board), key=lambda entry: entry.weight, reverse=True):
+                if entry.move not in replies:
+                    replies.append(entry.move)
+
+        return replies[:self.config.online_moves.prefetch.max_replies]
+
+    def _get_cloud_fen(self, board: chess.Board) -> str:
+        return board.fen().replace('[', '/').replace(']', '')
+
+    def _get_egtb_variant(self) -> str:
+        variant = 'standard' if self.board.uci_variant == 'chess' else self.board.uci_variant
+        assert variant
+
+        return variant
+
+    def _get_racing_deadlines(self) -> dict[Callable[[], Coroutine[Any, Any, Move_Response | None]], float]:
+        online_moves_config = self.config.online_moves
+        if not online_moves_config.racing.enabled:
+            return {}
+
+        deadlines = online_moves_config.racing.deadlines
+        racing_deadlines = {
+            self._make_egtb_move: deadlines.get('online_egtb', online_moves_config.online_egtb.timeout),
+            self._make_opening_explorer_move: deadlines.get('opening_explorer',
+                                                            online_moves_config.opening_explorer.timeout),
+            self._make_cloud_move: deadlines.get('lichess_cloud', online_moves_config.lichess_cloud.timeout),
+            self._make_chessdb_move: deadlines.get('chessdb', online_moves_config.chessdb.timeout)}
+
+        return {move_source: float(deadline)
+                for move_source, deadline in racing_deadlines.items()
+                if move_source in self.move_sources}
+
     def _get_move_overhead(self, engine_config: Engine_Config) -> float:
         return max(self.game_info.initial_time_ms / 60_000 * engine_config.move_overhead_multiplier, 1.0)
 
+    def _add_clock_lag(self) -> None:
+        if self.pending_move_timing is None:
+            return
+
+        own_time, think_time = self.pending_move_timing
+        self.pending_move_timing = None
+
+        # Only the event that confirms our move alone shows what the server charged for it.
+        if self.is_our_turn or len(self.uci_moves) != len(self.board.move_stack):
+            return
+
+        # The clocks do not run before each side has made its first move.
+        if len(self.board.move_stack) <= 2:
+            return
+
+        self.latency_tracker.add_clock_lag(own_time - self.own_time + self.increment - think_time)
+        self._update_move_overhead()
+
+    def _update_move_overhead(self) -> None:
+        if not self.config.move_overhead.adaptive:
+            return
+
+        if (estimate := self.latency_tracker.estimate) is None:
+            return
+
+        if limits := self.config.move_overhead.limits.get(self.game_info.speed):
+            estimate = min(max(estimate, limits[0]), limits[1])
+
+        self.move_overhead = estimate
+
     def _has_time(self, min_time: float) -> bool:
         if len(self.board.move_stack) < 2:
             return True
@@ -962,15 +1162,55 @@ class Lichess_Game:
         if len(self.board.move_stack) < 2:
             return
 
+        self.charged_time += seconds
         if self.is_white:
             self.white_time -= seconds
         else:
             self.black_time -= seconds
 
+    def _parse_moves(self, moves: str) -> None:
+        prefix_length = len(self.moves_string)
+        if moves.startswith(self.moves_string) and moves[prefix_length:prefix_length + 1] == ' ':
+            self.uci_moves += moves[prefix_length + 1:].split()
+        else:
+            self.uci_moves = moves.split()
+
+        self.moves_string = moves
+
+    def _sync_board(self) -> bool:
+        common_length = min(len(self.board.move_stack), len(self.uci_moves))
+        while common_length and not self._is_same_move(common_length - 1, self.uci_moves[common_length - 1]):
+            common_length -= 1
+
+        if common_length < len(self.board.move_stack):
+            print(f'Resyncing board from ply {common_length} after the game stream diverged.')
+            while len(self.board.move_stack) > common_length:
+                self.position_history.pop()
+
+        for uci_move in self.uci_moves[common_length:]:
+            self.position_history.push(self.board.parse_uci(uci_move))
+
+        return common_length < len(self.uci_moves)
+
+    def _is_same_move(self, ply: int, uci_move: str) -> bool:
+        move = self.board.move_stack[ply]
+        if move.uci() == uci_move:
+            return True
+
+        if ply != len(self.board.move_stack) - 1:
+            return False
+
+        # The server may use another castling notation, which python-chess only normalizes when parsing.
+        self.board.pop()
+        try:
+            return self.board.parse_uci(uci_move) == move
+        except ValueError:
+            return False
+        finally:
+            self.board.push(move)
+
     def _is_repetition(self, move: chess.Move) -> bool:
-        board = self.board.copy()
-        board.push(move)
-        return board.is_repetition(count=2)
+        return self.position_history.is_repetition(move)
 
     def _has_mate_score(self) -> bool:
         if not self.scores:
@@ -0,0 +1,156 @@
+import asyncio
+import json
+import os
+import time
+from collections import defaultdict
+from collections.abc import Callable
+from datetime import datetime
+from typing import Any
+
+from configs import Loop_Monitor_Config
+
+SAMPLE_INTERVAL = 0.1
+MAX_REPORTED_CALLBACKS = 5
+ASYNCIO_PATH = os.path.dirname(asyncio.__file__)
+
+
+class Loop_Monitor:
+    def __init__(self, config: Loop_Monitor_Config) -> None:
+        self.config = config
+        self.lags: list[float] = []
+        self.slow_callbacks: defaultdict[str, list[float]] = defaultdict(list)
+        self.window_start = time.monotonic()
+        self.task: asyncio.Task[None] | None = None
+        self.original_run: Callable[[asyncio.Handle], None] | None = None
+
+    def start(self) -> None:
+        if not self.config.enabled or self.task:
+            return
+
+        # Alternative loops like uvloop run their callbacks in native code that cannot be timed.
+        if isinstance(asyncio.get_running_loop(), asyncio.BaseEventLoop):
+            self._patch_handles()
+        else:
+            print('Slow callbacks are only attributed on the default event loop, measuring loop lag only.')
+
+        self.task = asyncio.create_task(self._sample_lag(), name='loop_monitor')
+        # The loop cancels all tasks when it closes, so the patch is also undone if stop() is never called.
+        self.task.add_done_callback(self._on_task_done)
+
+    def stop(self) -> None:
+        if self.task:
+            self.task.cancel()
+            self.task = None
+
+        self._restore_handles()
+
+    def get_summary(self) -> list[str]:
+        if not self.config.enabled:
+            return ['Loop monitor is disabled in the config.']
+
+        lags = sorted(self.lags)
+        lines = [f'Loop lag over {time.monotonic() - self.window_start:.0f} s: '
+                 f'p50 {self._get_percentile(lags, 50) * 1000:.1f} ms, '
+                 f'p99 {self._get_percentile(lags, 99) * 1000:.1f} ms, '
+                 f'max {(lags[-1] if lags else 0.0) * 1000:.1f} ms, '
+                 f'{sum(len(durations) for durations in self.slow_callbacks.values())} slow callbacks']
+
+        for name, durations in self._get_slowest_callbacks():
+            lines.append(f'  {sum(durations) * 1000:8.1f} ms in {len(durations):4} callbacks, '
+                         f'max {max(durations) * 1000:6.1f} ms: {name}')
+
+        return lines
+
+    async def _sample_lag(self) -> None:
+        while True:
+            start_time = time.perf_counter()
+            await asyncio.sleep(SAMPLE_INTERVAL)
+            self.lags.append(max(time.perf_counter() - start_time - SAMPLE_INTERVAL, 0.0))
+
+            if time.monotonic() - self.window_start >= self.config.interval:
+                self._report()
+
+    def _report(self) -> None:
+        for line in self.get_summary():
+            print(line)
+
+        if self.config.path:
+            lags = sorted(self.lags)
+            metrics = {'time': datetime.now().isoformat(timespec='seconds'),
+                       'duration': time.monotonic() - self.window_start,
+                       'lag_p50': self._get_percentile(lags, 50),
+                       'lag_p99': self._get_percentile(lags, 99),
+                       'lag_max': lags[-1] if lags else 0.0,
+                       'slow_callbacks': {name: {'count': len(durations),
+                                                 'total': sum(durations),
+                                                 'max': max(durations)}
+                                          for name, durations in self._get_slowest_callbacks()}}
+            try:
+                with open(self.config.path, 'a', encoding='utf-8') as metrics_file:
+                    metrics_file.write(json.dumps(metrics) + '\n')
+            except OSError as e:
+                print(f'Writing the loop metrics failed: {e}')
+
+        self.lags.clear()
+        self.slow_callbacks.clear()
+        self.window_start = time.monotonic()
+
+    def _patch_handles(self) -> None:
+        # Every callback and task step of the loop runs through Handle._run, so timing it covers all subsystems.
+        # The method is private and shared by all loops of the process, so only handles of this loop are timed.
+        original_run = self.original_run = asyncio.Handle._run
+        loop = asyncio.get_running_loop()
+        slow_callback = self.config.slow_callback
+        slow_callbacks = self.slow_callbacks
+
+        def _run(handle: asyncio.Handle) -> None:
+            if handle._loop is not loop:
+                original_run(handle)
+                return
+
+            start_time = time.perf_counter()
+            original_run(handle)
+            if (duration := time.perf_counter() - start_time) >= slow_callback:
+                slow_callbacks[self._get_callback_name(handle)].append(duration)
+
+        setattr(asyncio.Handle, '_run', _run)
+
+    def _on_task_done(self, task: asyncio.Task[None]) -> None:
+        if task is self.task:
+            self._restore_handles()
+
+    def _restore_handles(self) -> None:
+        if self.original_run:
+            setattr(asyncio.Handle, '_run', self.original_run)
+            self.original_run = None
+
+    def _get_slowest_callbacks(self) -> list[tuple[str, list[float]]]:
+        return sorted(self.slow_callbacks.items(),
+                      key=lambda item: sum(item[1]),
+                      reverse=True)[:MAX_REPORTED_CALLBACKS]
+
+    @staticmethod
+    def _get_callback_name(handle: asyncio.Handle) -> str:
+        callback: Any = handle._callback
+        if not isinstance(task := getattr(callback, '__self__', None), asyncio.Task):
+            return getattr(callback, '__qualname__', repr(callback))
+
+        # The outermost coroutine names the subsystem, the innermost non-asyncio one where the task suspended.
+        coroutine = task.get_coro()
+        name = getattr(coroutine, '__qualname__', repr(coroutine))
+        awaited = innermost = coroutine
+        while (awaited := getattr(awaited, 'cr_await', None)) is not None and hasattr(awaited, 'cr_code'):
+            if not awaited.cr_code.co_filename.startswith(ASYNCIO_PATH):
+                innermost = awaited
+
+        if innermost is not coroutine:
+            name += f' -> {innermost.__qualname__}'
+
+        return name
+
+    @staticmethod
+    def _get_percentile(sorted_samples: list[float], percentile: int) -> float:
+        if not sorted_samples:
+            return 0.0
+
+        return sorted_samples[min(len(sorted_samples) * percentile // 100, len(sorted_samples) - 1)]
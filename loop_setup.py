@@ -0,0 +1,34 @@
+import asyncio
+from collections.abc import Callable, Coroutine
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, TypeVar
+
+from configs import Event_Loop_Config
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+T = TypeVar('T')
+
+
+def get_loop_factory(config: Event_Loop_Config) -> Callable[[], asyncio.AbstractEventLoop] | None:
+    if not config.uvloop:
+        return
+
+    if uvloop is None:
+        print('uvloop is not installed, falling back to the default event loop.')
+        return
+
+    return uvloop.new_event_loop
+
+
+def run(coroutine: Coroutine[Any, Any, T], config: Event_Loop_Config, debug: bool | None = None) -> T:
+    with asyncio.Runner(debug=debug, loop_factory=get_loop_factory(config)) as runner:
+        # asyncio.to_thread and run_in_executor without an executor share the default executor of the loop.
+        if config.thread_pool_workers:
+            runner.get_loop().set_default_executor(ThreadPoolExecutor(config.thread_pool_workers,
+                                                                      thread_name_prefix='botli'))
+
+        return runner.run(coroutine)
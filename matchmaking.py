@@ -1,14 +1,18 @@
 import random
 from datetime import datetime, timedelta
+from typing import Any
 
 from api import API
 from botli_dataclasses import Bot, Challenge_Request, Challenge_Response, Matchmaking_Type
 from challenger import Challenger
 from config import Config
-from enums import Busy_Reason, Perf_Type, Variant
+from enums import Busy_Reason, Challenge_Color, Perf_Type, Variant
 from exceptions import NoOpponentException
 from opponents import Opponents
 
+STATUS_BATCH_SIZE = 20
+STATUS_TTL = timedelta(seconds=30)
+
 
 class Matchmaking:
     def __init__(self, api: API, config: Config, username: str) -> None:
@@ -25,6 +29,7 @@ class Matchmaking:
         self.game_start_time: datetime = datetime.now()
         self.online_bots: list[Bot] = []
         self.current_type: Matchmaking_Type | None = None
+        self.bot_statuses: dict[str, tuple[datetime, dict[str, Any]]] = {}
 
     async def create_challenge(self) -> Challenge_Response | None:
         if await self._call_update():
@@ -39,7 +44,7 @@ class Matchmaking:
             print(f'Matchmaking type: {self.current_type}')
 
         try:
-            next_opponent = self.opponents.get_opponent(self.online_bots, self.current_type)
+            next_opponent = await self._get_next_opponent(self.current_type)
         except NoOpponentException:
             print(f'Suspending matchmaking type {self.current_type.name} because no suitable opponent is available.')
             self.suspended_types.append(self.current_type)
@@ -64,19 +69,6 @@ class Matchmaking:
             return
 
         opponent, color = next_opponent
-
-        match await self._get_busy_reason(opponent):
-            case Busy_Reason.PLAYING:
-                rating_diff = opponent.rating_diffs[self.current_type.perf_type]
-                print(f'Skipping {opponent.username} ({rating_diff:+}) as {color} ...')
-                self.opponents.busy_bots.append(opponent)
-                return
-
-            case Busy_Reason.OFFLINE:
-                print(f'Removing {opponent.username} from online bots ...')
-                self.online_bots.remove(opponent)
-                return
-
         rating_diff = opponent.rating_diffs[self.current_type.perf_type]
         print(f'Challenging {opponent.username} ({rating_diff:+}) as {color} to {self.current_type.name} ...')
         challenge_request = Challenge_Request(opponent.username, self.current_type.initial_time,
@@ -243,10 +235,53 @@ class Matchmaking:
 
         return Variant(perf_type)
 
-    async def _get_busy_reason(self, bot: Bot) -> Busy_Reason | None:
-        bot_status = await self.api.get_user_status(bot.username)
+    async def _get_next_opponent(self, matchmaking_type: Matchmaking_Type) -> tuple[Bot, Challenge_Color] | None:
+        # Skips every busy or offline bot in one cycle, the statuses come from one batched request.
+        while next_opponent := self.opponents.get_opponent(self.online_bots, matchmaking_type):
+            opponent, color = next_opponent
+
+            match await self._get_busy_reason(opponent, matchmaking_type):
+                case Busy_Reason.PLAYING:
+                    rating_diff = opponent.rating_diffs[matchmaking_type.perf_type]
+                    print(f'Skipping {opponent.username} ({rating_diff:+}) as {color} ...')
+                    self.opponents.busy_bots.append(opponent)
+
+                case Busy_Reason.OFFLINE:
+                    print(f'Removing {opponent.username} from online bots ...')
+                    self.online_bots.remove(opponent)
+
+                case _:
+                    return opponent, color
+
+    async def _get_busy_reason(self, bot: Bot, matchmaking_type: Matchmaking_Type) -> Busy_Reason | None:
+        if (bot_status := self._get_cached_status(bot)) is None:
+            await self._update_bot_statuses(bot, matchmaking_type)
+            bot_status = self._get_cached_status(bot) or {}
+
         if 'online' not in bot_status:
             return Busy_Reason.OFFLINE
 
         if 'playing' in bot_status:
             return Busy_Reason.PLAYING
+
+    def _get_cached_status(self, bot: Bot) -> dict[str, Any] | None:
+        if cached_status := self.bot_statuses.get(bot.username.lower()):
+            fetched_at, bot_status = cached_status
+            if datetime.now() - fetched_at < STATUS_TTL:
+                return bot_status
+
+    async def _update_bot_statuses(self, bot: Bot, matchmaking_type: Matchmaking_Type) -> None:
+        candidates = self.opponents.get_candidates(self.online_bots, matchmaking_type, STATUS_BATCH_SIZE)
+        usernames = [bot.username] + [candidate.username for candidate in candidates
+                                      if candidate != bot and self._get_cached_status(candidate) is None]
+
+        usernames = usernames[:STATUS_BATCH_SIZE]
+        bot_statuses = await self.api.get_user_statuses(usernames)
+
+        now = datetime.now()
+        self.bot_statuses = {username: cached_status for username, cached_status in self.bot_statuses.items()
+                             if now - cached_status[0] < STATUS_TTL}
+
+        # Users missing in the response have closed their account and are stored as offline.
+        self.bot_statuses.update((username.lower(), (now, {})) for username in usernames)
+        self.bot_statuses.update((bot_status['id'], (now, bot_status)) for bot_status in bot_statuses)
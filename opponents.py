@@ -2,6 +2,7 @@ import json
 import os
 from collections import defaultdict
 from datetime import datetime, timedelta
+from itertools import islice
 from typing import Any
 
 from botli_dataclasses import Bot, Matchmaking_Data, Matchmaking_Type
@@ -21,16 +22,17 @@ class Opponents:
                      online_bots: list[Bot],
                      matchmaking_type: Matchmaking_Type) -> tuple[Bot, Challenge_Color] | None:
         for bot in self._filter_bots(online_bots, matchmaking_type):
-            if bot in self.busy_bots:
-                continue
-
-            data = self.opponent_dict[bot.username][matchmaking_type.perf_type]
-            if data.color == Challenge_Color.BLACK or data.release_time <= datetime.now():
+            if self._is_available(bot, matchmaking_type):
+                data = self.opponent_dict[bot.username][matchmaking_type.perf_type]
                 self.last_opponent = (bot.username, data.color, matchmaking_type)
                 return bot, data.color
 
         self.busy_bots.clear()
 
+    def get_candidates(self, online_bots: list[Bot], matchmaking_type: Matchmaking_Type, count: int) -> list[Bot]:
+        return list(islice((bot for bot in self._filter_bots(online_bots, matchmaking_type)
+                            if self._is_available(bot, matchmaking_type)), count))
+
     def add_timeout(self, success: bool, game_duration: timedelta) -> None:
         username, color, matchmaking_type = self.last_opponent
         data = self.opponent_dict[username][matchmaking_type.perf_type]
@@ -60,6 +62,13 @@ class Opponents:
 
         self.busy_bots.clear()
 
+    def _is_available(self, bot: Bot, matchmaking_type: Matchmaking_Type) -> bool:
+        if bot in self.busy_bots:
+            return False
+
+        data = self.opponent_dict[bot.username][matchmaking_type.perf_type]
+        return data.color == Challenge_Color.BLACK or data.release_time <= datetime.now()
+
     def _filter_bots(self, bots: list[Bot], matchmaking_type: Matchmaking_Type) -> list[Bot]:
         def bot_filter(bot: Bot) -> bool:
             if matchmaking_type.perf_type not in bot.rating_diffs:
@@ -0,0 +1,165 @@
+import asyncio
+import json
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any
+
+from configs import Position_Cache_Config
+
+
+@dataclass
+class Cache_Entry:
+    response: dict[str, Any] | None
+    expires_at: float
+
+
+class Position_Cache:
+    def __init__(self, config: Position_Cache_Config) -> None:
+        self.config = config
+        self.memory: OrderedDict[tuple[str, str, str], Cache_Entry] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.connection = self._connect() if config.enabled and config.path else None
+        # A single thread owns the database, so reads, writes and their commits never block the event loop.
+        self.executor = ThreadPoolExecutor(1, thread_name_prefix='position_cache') if self.connection else None
+        self.pending_rows: list[tuple[str, str, str, dict[str, Any] | None, float]] = []
+        self.write_task: asyncio.Task[None] | None = None
+
+    async def get(self, source: str, variant: str, fen: str) -> Cache_Entry | None:
+        if not self.config.enabled:
+            return
+
+        key = source, variant, self._normalize_fen(source, fen)
+        if entry := self.memory.get(key):
+            if entry.expires_at > time.time():
+                self.memory.move_to_end(key)
+                self.hits += 1
+                return entry
+
+            del self.memory[key]
+
+        if entry := await self._load_later(key):
+            self._remember(key, entry)
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+
+    def is_remembered(self, source: str, variant: str, fen: str) -> bool:
+        if not self.config.enabled:
+            return False
+
+        key = source, variant, self._normalize_fen(source, fen)
+        return (entry := self.memory.get(key)) is not None and entry.expires_at > time.time()
+
+    async def contains(self, source: str, variant: str, fen: str) -> bool:
+        if self.is_remembered(source, variant, fen):
+            return True
+
+        key = source, variant, self._normalize_fen(source, fen)
+        if entry := await self._load_later(key):
+            self._remember(key, entry)
+            return True
+
+        return False
+
+    def put(self,
+            source: str,
+            variant: str,
+            fen: str,
+            response: dict[str, Any] | None,
+            is_negative: bool = False) -> None:
+        if not self.config.enabled:
+            return
+
+        ttl = self.config.negative_ttl if is_negative else self.config.ttls[source]
+        key = source, variant, self._normalize_fen(source, fen)
+        entry = Cache_Entry(response, time.time() + ttl)
+        self._remember(key, entry)
+
+        if self.connection:
+            # Rows that arrive while a batch is written are committed together with the next batch.
+            self.pending_rows.append((*key, response, entry.expires_at))
+            if self.write_task is None:
+                self.write_task = asyncio.create_task(self._write_pending())
+
+    async def close(self) -> None:
+        if self.write_task:
+            await self.write_task
+
+        if self.connection and self.executor:
+            await asyncio.get_running_loop().run_in_executor(self.executor, self.connection.close)
+            self.executor.shutdown()
+            self.connection = None
+            self.executor = None
+
+    @staticmethod
+    def _normalize_fen(source: str, fen: str) -> str:
+        # The halfmove clock only matters for tablebase results, the fullmove number never does.
+        return ' '.join(fen.split()[:5 if source == 'egtb' else 4])
+
+    def _remember(self, key: tuple[str, str, str], entry: Cache_Entry) -> None:
+        self.memory[key] = entry
+        self.memory.move_to_end(key)
+        if len(self.memory) > self.config.memory_size:
+            self.memory.popitem(last=False)
+
+    async def _load_later(self, key: tuple[str, str, str]) -> Cache_Entry | None:
+        if not self.connection or not self.executor:
+            return
+
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, self._load, *key)
+        except sqlite3.Error as e:
+            print(f'Position cache could not be read: {e}')
+
+    async def _write_pending(self) -> None:
+        assert self.executor
+
+        try:
+            while self.pending_rows:
+                rows, self.pending_rows = self.pending_rows, []
+                await asyncio.get_running_loop().run_in_executor(self.executor, self._write, rows)
+        except sqlite3.Error as e:
+            print(f'Position cache could not be written: {e}')
+        finally:
+            self.write_task = None
+
+    def _write(self, rows: list[tuple[str, str, str, dict[str, Any] | None, float]]) -> None:
+        assert self.connection
+
+        with self.connection:
+            self.connection.executemany('INSERT OR REPLACE INTO positions VALUES (?, ?, ?, ?, ?)',
+                                        [(source, variant, fen, json.dumps(response), expires_at)
+                                         for source, variant, fen, response, expires_at in rows])
+
+    def _load(self, source: str, variant: str, fen: str) -> Cache_Entry | None:
+        assert self.connection
+
+        row = self.connection.execute('SELECT response, expires_at FROM positions '
+                                      'WHERE source = ? AND variant = ? AND fen = ?',
+                                      (source, variant, fen)).fetchone()
+        if row is None or row[1] <= time.time():
+            return
+
+        return Cache_Entry(json.loads(row[0]), row[1])
+
+    def _connect(self) -> sqlite3.Connection:
+        if directory := os.path.dirname(self.config.path):
+            os.makedirs(directory, exist_ok=True)
+
+        connection = sqlite3.connect(self.config.path, check_same_thread=False)
+        connection.execute('PRAGMA journal_mode = WAL')
+        connection.execute('PRAGMA synchronous = NORMAL')
+        with connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS positions ('
+                               'source TEXT NOT NULL, variant TEXT NOT NULL, fen TEXT NOT NULL, '
+                               'response TEXT, expires_at REAL NOT NULL, '
+                               'PRIMARY KEY (source, variant, fen))')
+            connection.execute('DELETE FROM positions WHERE expires_at <= ?', (time.time(),))
+
+        return connection
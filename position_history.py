@@ -0,0 +1,35 @@
+from collections import Counter
+from collections.abc import Hashable
+
+import chess
+
+
+class Position_History:
+    def __init__(self, board: chess.Board) -> None:
+        self.board = board
+        self.counts: Counter[Hashable] = Counter()
+
+        board_copy = board.copy()
+        self.counts[board_copy._transposition_key()] += 1
+        while board_copy.move_stack:
+            board_copy.pop()
+            self.counts[board_copy._transposition_key()] += 1
+
+    def push(self, move: chess.Move) -> None:
+        self.board.push(move)
+        self.counts[self.board._transposition_key()] += 1
+
+    def pop(self) -> chess.Move:
+        key = self.board._transposition_key()
+        self.counts[key] -= 1
+        if not self.counts[key]:
+            del self.counts[key]
+
+        return self.board.pop()
+
+    def is_repetition(self, move: chess.Move) -> bool:
+        # Same positions as chess.Board.is_repetition(count=2) after the move, without copying the move stack.
+        self.board.push(move)
+        key = self.board._transposition_key()
+        self.board.pop()
+        return key in self.counts
@@ -0,0 +1,67 @@
+import asyncio
+import time
+from collections import deque
+
+from api import API
+from botli_dataclasses import Prefetch_Request
+from config import Config
+from enums import Variant
+
+
+class Prefetcher:
+    def __init__(self, api: API, config: Config) -> None:
+        self.api = api
+        self.prefetch_config = config.online_moves.prefetch
+        self.is_enabled = self.prefetch_config.enabled and config.position_cache.enabled
+        self.semaphore = asyncio.Semaphore(self.prefetch_config.concurrency)
+        self.request_times: deque[float] = deque()
+        self.tasks: set[asyncio.Task[None]] = set()
+        self.sent = 0
+        self.skipped = 0
+
+    def submit(self, requests: list[Prefetch_Request]) -> None:
+        if not self.is_enabled:
+            return
+
+        for request in requests:
+            # Only the memory is checked here, the database is read without blocking in the fetch task.
+            if self.api.position_cache.is_remembered(request.source, request.variant, request.fen):
+                continue
+
+            task = asyncio.create_task(self._fetch(request))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    def close(self) -> None:
+        for task in self.tasks:
+            task.cancel()
+
+    def _take_budget(self) -> bool:
+        now = time.monotonic()
+        while self.request_times and now - self.request_times[0] > 60.0:
+            self.request_times.popleft()
+
+        if len(self.request_times) >= self.prefetch_config.max_requests_per_minute:
+            return False
+
+        self.request_times.append(now)
+        return True
+
+    async def _fetch(self, request: Prefetch_Request) -> None:
+        async with self.semaphore:
+            # Another game may have fetched the position while this request was waiting.
+            if await self.api.position_cache.contains(request.source, request.variant, request.fen):
+                return
+
+            if not self._take_budget():
+                self.skipped += 1
+                return
+
+            self.sent += 1
+            match request.source:
+                case 'cloud':
+                    await self.api.get_cloud_eval(request.fen, Variant(request.variant), request.timeout)
+                case 'chessdb':
+                    await self.api.get_chessdb_eval(request.fen, request.timeout)
+                case 'egtb':
+                    await self.api.get_egtb(request.fen, request.variant, request.timeout)
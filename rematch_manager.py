@@ -1,10 +1,10 @@
 import asyncio
-from typing import Any
 
 from api import API
 from botli_dataclasses import Challenge_Request, Game_Information
 from config import Config
 from enums import Challenge_Color, Variant
+from stream_events import Game_State_Event
 
 
 class Rematch_Manager:
@@ -103,6 +103,23 @@ class Rematch_Manager:
         # The actual challenge creation will be handled by the game manager
         return True
 
+    async def handle_game_end(self, game_state: Game_State_Event, info: Game_Information) -> None:
+        """Handle rematch logic after game ends."""
+        try:
+            winner = game_state.get('winner')
+            game_result = game_state.get('status', 'unknown')
+            
+            # Check if we should offer a rematch
+            if self.should_offer_rematch(info, game_result, winner):
+                await self.offer_rematch(info)
+            else:
+                # Notify rematch manager that game finished without rematch
+                opponent_name = self._get_opponent_name(info)
+                if opponent_name:
+                    self.on_game_finished(opponent_name)
+        except Exception as e:
+            print(f'Error handling rematch: {e}')
+
     def on_rematch_accepted(self, opponent_name: str) -> None:
         """Called when a rematch is accepted."""
         self.pending_rematch = None
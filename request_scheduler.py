@@ -0,0 +1,175 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import suppress
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import aiohttp
+
+from enums import Request_Priority
+
+# Requests per second and burst size of each lane and of all lanes together.
+LANE_LIMITS = {Request_Priority.MOVE: (50.0, 50),
+               Request_Priority.GAME_CONTROL: (4.0, 10),
+               Request_Priority.CHAT: (1.0, 5),
+               Request_Priority.BACKGROUND: (2.0, 10),
+               Request_Priority.CLOUD: (2.0, 10)}
+GLOBAL_LIMIT = (8.0, 20)
+# Moves have their own server limit and are never held back by other requests.
+UNSHARED_LANES = {Request_Priority.MOVE}
+DEFAULT_RETRY_AFTER = 60.0
+
+
+class Rate_Limit_Error(aiohttp.ClientError):
+    def __init__(self, priority: Request_Priority, retry_after: float) -> None:
+        super().__init__(f'Rate limited in lane {priority.name}, retrying after {retry_after:.0f} second(s).')
+        self.priority = priority
+        self.retry_after = retry_after
+
+
+@dataclass
+class Token_Bucket:
+    rate: float
+    capacity: int
+    tokens: float = field(init=False)
+    updated_at: float = field(default_factory=time.monotonic)
+
+    def __post_init__(self) -> None:
+        self.tokens = float(self.capacity)
+
+    def get_wait_time(self) -> float:
+        self._refill()
+        return max(1.0 - self.tokens, 0.0) / self.rate
+
+    def take(self) -> None:
+        self._refill()
+        self.tokens -= 1.0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.tokens + (now - self.updated_at) * self.rate, self.capacity)
+        self.updated_at = now
+
+
+@dataclass
+class Request_Lane:
+    bucket: Token_Bucket
+    waiters: deque[object] = field(default_factory=deque)
+    paused_until: float = 0.0
+    requests: int = 0
+    delayed: int = 0
+    rate_limits: int = 0
+    wait_time: float = 0.0
+    max_depth: int = 0
+
+    def get_wait_time(self) -> float:
+        return max(self.paused_until - time.monotonic(), self.bucket.get_wait_time())
+
+
+class Request_Scheduler:
+    def __init__(self) -> None:
+        self.bucket = Token_Bucket(*GLOBAL_LIMIT)
+        self.lanes = {priority: Request_Lane(Token_Bucket(*limit)) for priority, limit in LANE_LIMITS.items()}
+        self.wakeup = asyncio.Event()
+
+    async def acquire(self, priority: Request_Priority) -> None:
+        lane = self.lanes[priority]
+        waiter = object()
+        lane.waiters.append(waiter)
+        lane.max_depth = max(lane.max_depth, len(lane.waiters))
+        start_time = time.perf_counter()
+        try:
+            while (wait_time := self._get_wait_time(priority, waiter)) is None or wait_time > 0.0:
+                wakeup = self.wakeup
+                with suppress(TimeoutError):
+                    await asyncio.wait_for(wakeup.wait(), wait_time)
+
+            if priority not in UNSHARED_LANES:
+                self.bucket.take()
+            lane.bucket.take()
+        finally:
+            lane.waiters.remove(waiter)
+            self._wake()
+
+        lane.requests += 1
+        if (waited := time.perf_counter() - start_time) > 0.001:
+            lane.delayed += 1
+            lane.wait_time += waited
+
+    @staticmethod
+    def get_priority(path: str) -> Request_Priority:
+        if path.startswith('/api/bot/game/'):
+            if '/move/' in path:
+                return Request_Priority.MOVE
+
+            if path.endswith('/chat'):
+                return Request_Priority.CHAT
+
+            return Request_Priority.GAME_CONTROL
+
+        if path.startswith('/api/challenge/') and path.endswith(('/accept', '/decline')):
+            return Request_Priority.GAME_CONTROL
+
+        # Cloud evaluations are rate limited often, their own lane keeps a pause away from all other requests.
+        if path == '/api/cloud-eval':
+            return Request_Priority.CLOUD
+
+        return Request_Priority.BACKGROUND
+
+    def pause(self, priority: Request_Priority, retry_after: str | None) -> float:
+        seconds = self._parse_retry_after(retry_after)
+        lane = self.lanes[priority]
+        lane.paused_until = max(lane.paused_until, time.monotonic() + seconds)
+        lane.rate_limits += 1
+        self._wake()
+        return seconds
+
+    def get_stats(self) -> list[str]:
+        lines: list[str] = []
+        now = time.monotonic()
+        for priority, lane in self.lanes.items():
+            average_wait = lane.wait_time / lane.delayed * 1000.0 if lane.delayed else 0.0
+            paused = f', paused for {lane.paused_until - now:.0f} s' if lane.paused_until > now else ''
+            lines.append(f'{priority.name:12} {len(lane.waiters)} queued (max {lane.max_depth}), '
+                         f'{lane.requests} requests, {lane.delayed} delayed averaging {average_wait:.0f} ms, '
+                         f'{lane.rate_limits} rate limits{paused}')
+        return lines
+
+    def _get_wait_time(self, priority: Request_Priority, waiter: object) -> float | None:
+        lane = self.lanes[priority]
+        if lane.waiters[0] is not waiter:
+            return
+
+        if priority in UNSHARED_LANES:
+            return lane.get_wait_time()
+
+        # Lanes only yield the shared tokens to higher lanes that could use them right now.
+        for higher_priority in range(priority):
+            if (higher_priority := Request_Priority(higher_priority)) in UNSHARED_LANES:
+                continue
+
+            higher_lane = self.lanes[higher_priority]
+            if higher_lane.waiters and higher_lane.get_wait_time() <= 0.0:
+                return
+
+        return max(lane.get_wait_time(), self.bucket.get_wait_time())
+
+    def _wake(self) -> None:
+        self.wakeup.set()
+        self.wakeup = asyncio.Event()
+
+    @staticmethod
+    def _parse_retry_after(retry_after: str | None) -> float:
+        if not retry_after:
+            return DEFAULT_RETRY_AFTER
+
+        with suppress(ValueError):
+            return max(float(retry_after), 0.0)
+
+        with suppress(TypeError, ValueError):
+            retry_at = parsedate_to_datetime(retry_after)
+            return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+        return DEFAULT_RETRY_AFTER
@@ -0,0 +1,142 @@
+import glob
+import os
+import re
+
+import chess.engine
+import psutil
+
+from config import Config
+from engine import Engine
+
+
+class Resource_Planner:
+    def __init__(self, config: Config, worker_index: int | None = None) -> None:
+        self.planner_config = config.resource_planner
+        self.is_enabled = self.planner_config.enabled
+        self.cpus = self._get_cpus(config, worker_index) if self.is_enabled else []
+        self.engines: list[Engine] = []
+        self.affinities: dict[Engine, list[int]] = {}
+        self.game_count = 0
+
+    async def lease(self, engine: Engine) -> None:
+        if not self.is_enabled or engine in self.engines:
+            return
+
+        self.engines.append(engine)
+        self._rebalance(engine)
+
+        # The engine has not searched in this game yet, so the options are set before the first move.
+        try:
+            await engine.apply_pending_options()
+        except chess.engine.EngineError as e:
+            print(f'Engine "{engine.name}" rejected the planned options: {e}')
+
+    def release(self, engine: Engine) -> None:
+        if engine not in self.engines:
+            return
+
+        self.engines.remove(engine)
+        self.affinities.pop(engine, None)
+        engine.pending_options.clear()
+        engine.pending_cpus = None
+        self._rebalance()
+
+    def set_game_count(self, game_count: int) -> None:
+        # Games that have not leased their engine yet already get their share, so the first engine is not oversized.
+        if not self.is_enabled or game_count == self.game_count:
+            return
+
+        self.game_count = game_count
+        self._rebalance()
+
+    def _rebalance(self, new_engine: Engine | None = None) -> None:
+        shares = max(self.game_count, len(self.engines), 1)
+        hash_size = max(self.planner_config.hash // shares, self.planner_config.min_hash)
+
+        for index, engine in enumerate(self.engines):
+            cpus = self._get_share(index, shares)
+            options: dict[str, int] = {}
+            if engine is new_engine or self.planner_config.rebalance_threads:
+                options['Threads'] = len(cpus)
+
+            if self.affinities.get(engine) != cpus:
+                self.affinities[engine] = cpus
+                # Running engines get their CPUs together with the new Threads between moves.
+                if options:
+                    engine.pending_cpus = cpus
+                else:
+                    engine.set_affinity(cpus)
+
+            # A new hash size clears the hash table, so it only changes when the engine starts a game.
+            if engine is new_engine and self.planner_config.hash:
+                options['Hash'] = hash_size
+
+            for name, value in options.items():
+                if name not in engine.engine.options:
+                    continue
+
+                option = engine.engine.options[name]
+                if option.max is not None:
+                    value = min(value, option.max)
+                if option.min is not None:
+                    value = max(value, option.min)
+                if engine.engine.config.get(name) != value:
+                    engine.pending_options[name] = value
+
+    def _get_share(self, index: int, shares: int) -> list[int]:
+        if len(self.cpus) <= shares:
+            return [self.cpus[index % len(self.cpus)]]
+
+        # Contiguous slices keep an engine on neighbouring CPUs, which are on the same node in NUMA order.
+        return self.cpus[index * len(self.cpus) // shares:(index + 1) * len(self.cpus) // shares]
+
+    def _get_cpus(self, config: Config, worker_index: int | None) -> list[int]:
+        if self.planner_config.cpus:
+            cpus = sorted(set(self.planner_config.cpus))
+        elif hasattr(os, 'sched_getaffinity'):
+            cpus = sorted(os.sched_getaffinity(0))
+        else:
+            cpus = list(range(psutil.cpu_count() or 1))
+
+        # The service engine keeps its own CPUs as long as the game engines have any left.
+        if config.service_engine.enabled and config.service_engine.cpu_affinity:
+            if remaining_cpus := [cpu for cpu in cpus if cpu not in config.service_engine.cpu_affinity]:
+                cpus = remaining_cpus
+
+        if self.planner_config.numa:
+            cpus = self._sort_by_node(cpus)
+
+        # Every game worker plans its own engines on a separate slice of the CPUs.
+        if worker_index is not None and (worker_count := config.game_workers.count) > 1:
+            if len(cpus) < worker_count:
+                return [cpus[worker_index % len(cpus)]]
+
+            return cpus[worker_index * len(cpus) // worker_count:(worker_index + 1) * len(cpus) // worker_count]
+
+        return cpus
+
+    @staticmethod
+    def _sort_by_node(cpus: list[int]) -> list[int]:
+        nodes: list[tuple[int, set[int]]] = []
+        for path in glob.glob('/sys/devices/system/node/node*/cpulist'):
+            if not (match := re.search(r'node(\d+)', path)):
+                continue
+
+            node_cpus: set[int] = set()
+            with open(path, encoding='utf-8') as cpulist:
+                for part in cpulist.read().strip().split(','):
+                    if not part:
+                        continue
+
+                    first, _, last = part.partition('-')
+                    node_cpus.update(range(int(first), int(last or first) + 1))
+
+            nodes.append((int(match.group(1)), node_cpus))
+
+        if not nodes:
+            print('NUMA nodes could not be read, CPUs are planned without node information.')
+            return cpus
+
+        nodes.sort()
+        node_indices = {cpu: node for node, node_cpus in nodes for cpu in node_cpus}
+        return sorted(cpus, key=lambda cpu: (node_indices.get(cpu, len(nodes)), cpu))
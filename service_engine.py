@@ -0,0 +1,133 @@
+import asyncio
+import os
+import time
+from dataclasses import dataclass, replace
+
+import chess
+import chess.engine
+import psutil
+
+from config import Config
+from configs import Syzygy_Config
+from engine import Engine
+
+
+@dataclass
+class Service_Request:
+    board: chess.Board
+    deadline: float
+    future: asyncio.Future[list[chess.engine.InfoDict]]
+
+
+class Service_Engine:
+    def __init__(self, config: Config) -> None:
+        self.service_config = config.service_engine
+        self.is_enabled = self.service_config.enabled
+        self.engine_config = None
+        if self.is_enabled:
+            engine_config = config.engines[self.service_config.engine]
+            # Threads and Hash of the game engine are replaced, all other UCI options are kept.
+            uci_options = {name: value for name, value in engine_config.uci_options.items()
+                           if name.lower() not in ['threads', 'hash']}
+            uci_options |= {'Threads': self.service_config.threads, 'Hash': self.service_config.hash}
+            self.engine_config = replace(engine_config, ponder=False, uci_options=uci_options, time_manager='uci')
+        self.syzygy_config = config.syzygy.get('standard', Syzygy_Config(False, [], 0, False))
+        self.requests: asyncio.Queue[Service_Request] = asyncio.Queue(self.service_config.queue_size)
+        self.engine: Engine | None = None
+        self.task: asyncio.Task[None] | None = None
+        self.served = 0
+        self.expired = 0
+        self.refused = 0
+
+    async def analyse(self, board: chess.Board) -> list[chess.engine.InfoDict]:
+        if not self.is_enabled or board.uci_variant != 'chess':
+            return []
+
+        if self.task is None:
+            self.task = asyncio.create_task(self._serve(), name='service_engine')
+
+        deadline = time.monotonic() + self.service_config.deadline
+        request = Service_Request(board.copy(), deadline, asyncio.get_running_loop().create_future())
+        try:
+            self.requests.put_nowait(request)
+        except asyncio.QueueFull:
+            self.refused += 1
+            return []
+
+        try:
+            return await asyncio.wait_for(request.future, self.service_config.deadline)
+        except TimeoutError:
+            return []
+
+    async def close(self) -> None:
+        if self.task:
+            self.task.cancel()
+            self.task = None
+
+        if self.engine:
+            await self.engine.close()
+            self.engine = None
+
+        if self.served + self.expired + self.refused:
+            print(f'Service engine: {self.served} requests served, {self.expired} expired, {self.refused} refused.')
+
+    async def _serve(self) -> None:
+        while True:
+            request = await self.requests.get()
+
+            # Requests that waited past their deadline have already been answered without lines.
+            remaining = request.deadline - time.monotonic()
+            if request.future.done() or remaining <= 0.0:
+                self.expired += 1
+                continue
+
+            lines = await self._analyse(request.board, min(self.service_config.time, remaining))
+            if not request.future.done():
+                request.future.set_result(lines)
+                self.served += 1
+
+    async def _analyse(self, board: chess.Board, time_limit: float) -> list[chess.engine.InfoDict]:
+        if self.engine is None or not self.engine.is_alive:
+            try:
+                self.engine = await self._start_engine()
+            except (OSError, chess.engine.EngineError, chess.engine.EngineTerminatedError) as e:
+                print(f'Service engine could not be started, chat requests use cached lines only: {e}')
+                self.is_enabled = False
+                return []
+
+        try:
+            multipv = self.service_config.multipv if 'MultiPV' in self.engine.engine.options else None
+            lines = await self.engine.engine.analyse(board, chess.engine.Limit(time=time_limit), multipv=multipv)
+        except (chess.engine.EngineError, chess.engine.EngineTerminatedError) as e:
+            print(f'Service engine failed and is restarted on the next request: {e}')
+            self.engine.transport.close()
+            self.engine = None
+            return []
+
+        if isinstance(lines, dict):
+            lines = [lines]
+
+        return [line for line in lines if line.get('pv')]
+
+    async def _start_engine(self) -> Engine:
+        assert self.engine_config
+        engine = await Engine.spawn(self.engine_config, self.syzygy_config)
+        self._lower_priority(engine.transport.get_pid())
+        print(f'Service engine "{engine.name}" started with {self.service_config.threads} thread(s) '
+              f'and {self.service_config.hash} MB hash.')
+        return engine
+
+    def _lower_priority(self, pid: int) -> None:
+        try:
+            process = psutil.Process(pid)
+            if os.name == 'nt':
+                if self.service_config.nice > 0:
+                    process.nice(psutil.BELOW_NORMAL_PRIORITY_CLASS)
+            else:
+                process.nice(self.service_config.nice)
+
+            if self.service_config.cpu_affinity:
+                process.cpu_affinity(self.service_config.cpu_affinity)
+        except (psutil.Error, AttributeError, ValueError, OSError) as e:
+            # Not every platform supports CPU affinity, the engine still runs with the default scheduling.
+            print(f'Service engine priority could not be lowered: {e}')
@@ -0,0 +1,64 @@
+import json
+from collections.abc import Callable
+from typing import Any, cast
+
+from stream_events import Event_Stream_Event, Game_Stream_Event
+
+# The faster decoders are optional, the stdlib json module is used when neither is installed.
+try:
+    import msgspec  # pyright: ignore[reportMissingImports]
+except ImportError:
+    msgspec = None
+
+try:
+    import orjson  # pyright: ignore[reportMissingImports]
+except ImportError:
+    orjson = None
+
+BACKENDS = ['msgspec', 'orjson', 'json']
+
+
+class Stream_Decoder:
+    def __init__(self, backend: str | None = None) -> None:
+        self.backend = backend or self.get_available_backends()[0]
+        self._loads = self._get_loads(self.backend)
+
+    def decode(self, line: bytes) -> dict[str, Any] | None:
+        # Keepalive lines are skipped without allocating a stripped copy.
+        if line.isspace():
+            return
+
+        return self._loads(line)
+
+    def decode_event(self, line: bytes) -> Event_Stream_Event | None:
+        return cast(Event_Stream_Event | None, self.decode(line))
+
+    def decode_game_event(self, line: bytes) -> Game_Stream_Event | None:
+        return cast(Game_Stream_Event | None, self.decode(line))
+
+    @staticmethod
+    def get_available_backends() -> list[str]:
+        available = {'msgspec': msgspec is not None, 'orjson': orjson is not None, 'json': True}
+        return [backend for backend in BACKENDS if available[backend]]
+
+    @staticmethod
+    def _get_loads(backend: str) -> Callable[[bytes], Any]:
+        match backend:
+            case 'msgspec' if msgspec is not None:
+                decoder = msgspec.json.Decoder()
+                decode_error: type[Exception] = msgspec.DecodeError
+
+                def loads(line: bytes) -> Any:
+                    try:
+                        return decoder.decode(line)
+                    except decode_error as e:
+                        # Keep the retry conditions of the API working for every backend.
+                        raise json.JSONDecodeError(str(e), line.decode(errors='replace'), 0) from e
+
+                return loads
+            case 'orjson' if orjson is not None:
+                return orjson.loads
+            case 'json':
+                return json.loads
+            case _:
+                raise ValueError(f'Stream decoder backend "{backend}" is not available.')
@@ -0,0 +1,82 @@
+from typing import Any, Literal, NotRequired, TypedDict
+
+
+class Variant_Info(TypedDict):
+    key: str
+    name: str
+
+
+class Game_State_Event(TypedDict):
+    type: Literal['gameState']
+    moves: str
+    wtime: int
+    btime: int
+    winc: int
+    binc: int
+    status: str
+    winner: NotRequired[str]
+    wdraw: NotRequired[bool]
+    bdraw: NotRequired[bool]
+    wtakeback: NotRequired[bool]
+    btakeback: NotRequired[bool]
+
+
+class Game_Full_Event(TypedDict):
+    type: Literal['gameFull']
+    id: str
+    white: dict[str, Any]
+    black: dict[str, Any]
+    clock: dict[str, Any]
+    speed: str
+    rated: bool
+    variant: Variant_Info
+    initialFen: str
+    state: Game_State_Event
+    tournamentId: NotRequired[str]
+
+
+class Chat_Line_Event(TypedDict):
+    type: Literal['chatLine']
+    username: str
+    text: str
+    room: Literal['player', 'spectator']
+
+
+class Opponent_Gone_Event(TypedDict):
+    type: Literal['opponentGone']
+    gone: bool
+    claimWinInSeconds: NotRequired[int]
+
+
+class Challenger_Info(TypedDict):
+    id: str
+    name: str
+    title: str | None
+    rating: int
+    provisional: NotRequired[bool]
+
+
+class Challenge_Info(TypedDict):
+    id: str
+    challenger: Challenger_Info
+    destUser: dict[str, Any]
+    variant: Variant_Info
+    speed: str
+    timeControl: dict[str, Any]
+    rated: bool
+    color: str
+    declineReason: NotRequired[str]
+
+
+class Challenge_Event(TypedDict):
+    type: Literal['challenge', 'challengeCanceled', 'challengeDeclined']
+    challenge: Challenge_Info
+
+
+class Game_Event(TypedDict):
+    type: Literal['gameStart', 'gameFinish']
+    game: dict[str, Any]
+
+
+Game_Stream_Event = Game_Full_Event | Game_State_Event | Chat_Line_Event | Opponent_Gone_Event
+Event_Stream_Event = Challenge_Event | Game_Event
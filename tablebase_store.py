@@ -0,0 +1,197 @@
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, TypeVar
+
+import chess
+import chess.gaviota
+import chess.polyglot
+import chess.syzygy
+
+Tablebase = chess.syzygy.Tablebase | chess.gaviota.PythonTablebase | chess.gaviota.NativeTablebase
+Tablebase_Key = tuple[str, str, tuple[str, ...]]
+Probe_Key = tuple[Tablebase_Key, int, int, bool]
+ResultT = TypeVar('ResultT')
+
+IDLE_TIMEOUT = 900.0
+PROBE_THREADS = 2
+PROBE_CACHE_SIZE = 4096
+
+
+@dataclass
+class Tablebase_Handle:
+    tablebase: Tablebase
+    references: int = 0
+    hits: int = 0
+    released_at: float = 0.0
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    @property
+    def open_tables(self) -> int:
+        if isinstance(self.tablebase, chess.syzygy.Tablebase):
+            if self.tablebase.max_fds is not None:
+                return len(self.tablebase.lru)
+
+            tables = {*self.tablebase.wdl.values(), *self.tablebase.dtz.values()}
+            return sum(table.data is not None for table in tables)
+
+        if isinstance(self.tablebase, chess.gaviota.PythonTablebase):
+            return len(self.tablebase.streams)
+
+        return 0
+
+
+class Tablebase_Store:
+    handles: dict[Tablebase_Key, Tablebase_Handle] = {}
+    keys: dict[int, Tablebase_Key] = {}
+    evictions: int = 0
+    executor = ThreadPoolExecutor(PROBE_THREADS, thread_name_prefix='tablebase')
+    probe_cache: OrderedDict[Probe_Key, Any] = OrderedDict()
+    probes: int = 0
+    probe_hits: int = 0
+    probe_time: float = 0.0
+
+    @classmethod
+    def acquire_syzygy(cls,
+                       paths: list[str],
+                       VariantBoard: type[chess.Board],
+                       max_open_tables: int | None = None) -> chess.syzygy.Tablebase:
+        key = cls._get_key('syzygy', VariantBoard.uci_variant or 'chess', paths)
+        if (handle := cls.handles.get(key)) is None:
+            # Without a limit every table file stays mapped once probed and no LRU is kept for the probes.
+            tablebase = chess.syzygy.Tablebase(max_fds=max_open_tables, VariantBoard=VariantBoard)
+            for path in key[2]:
+                tablebase.add_directory(path)
+
+            handle = cls._add(key, tablebase)
+        else:
+            handle.hits += 1
+
+        handle.references += 1
+        tablebase = handle.tablebase
+        assert isinstance(tablebase, chess.syzygy.Tablebase)
+        return tablebase
+
+    @classmethod
+    def acquire_gaviota(cls, paths: list[str]) -> chess.gaviota.PythonTablebase | chess.gaviota.NativeTablebase:
+        # Gaviota tables only exist for standard chess.
+        key = cls._get_key('gaviota', 'chess', paths)
+        if (handle := cls.handles.get(key)) is None:
+            tablebase = chess.gaviota.open_tablebase(key[2][0])
+            for path in key[2][1:]:
+                tablebase.add_directory(path)
+
+            handle = cls._add(key, tablebase)
+        else:
+            handle.hits += 1
+
+        handle.references += 1
+        tablebase = handle.tablebase
+        assert not isinstance(tablebase, chess.syzygy.Tablebase)
+        return tablebase
+
+    @classmethod
+    def release(cls, tablebase: Tablebase) -> None:
+        if (key := cls.keys.get(id(tablebase))) is None:
+            tablebase.close()
+            return
+
+        handle = cls.handles[key]
+        handle.references = max(handle.references - 1, 0)
+        if not handle.references:
+            handle.released_at = time.monotonic()
+
+        cls._evict_idle()
+
+    @classmethod
+    async def probe(cls,
+                    tablebase: Tablebase,
+                    board: chess.Board,
+                    only_captures: bool,
+                    probe_moves: Callable[[chess.Board, list[chess.Move]], ResultT]) -> ResultT:
+        key = cls.keys[id(tablebase)]
+        probe_key = key, chess.polyglot.zobrist_hash(board), board.halfmove_clock, only_captures
+        if probe_key in cls.probe_cache:
+            cls.probe_cache.move_to_end(probe_key)
+            cls.probe_hits += 1
+            return cls.probe_cache[probe_key]
+
+        board = board.copy(stack=False)
+        moves = list(board.generate_legal_captures() if only_captures else board.generate_legal_moves())
+        handle = cls.handles[key]
+
+        def probe_locked() -> ResultT:
+            if isinstance(tablebase, chess.syzygy.Tablebase):
+                return probe_moves(board, moves)
+
+            with handle.lock:
+                return probe_moves(board, moves)
+
+        start_time = time.perf_counter()
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(cls.executor, probe_locked)
+        finally:
+            cls.probes += 1
+            cls.probe_time += time.perf_counter() - start_time
+
+        cls.probe_cache[probe_key] = result
+        if len(cls.probe_cache) > PROBE_CACHE_SIZE:
+            cls.probe_cache.popitem(last=False)
+
+        return result
+
+    @classmethod
+    def close(cls) -> None:
+        for handle in cls.handles.values():
+            handle.tablebase.close()
+
+        cls.handles.clear()
+        cls.keys.clear()
+        cls.probe_cache.clear()
+        cls.executor.shutdown(wait=False, cancel_futures=True)
+
+    @classmethod
+    def get_stats(cls) -> list[str]:
+        lines: list[str] = []
+        for (kind, variant, paths), handle in cls.handles.items():
+            lines.append(f'{kind} {variant} ({len(paths)} paths): {handle.references} references, '
+                         f'{handle.hits} hits, {handle.open_tables} open table files')
+
+        lines.append(f'{len(cls.handles)} open tablebases, {cls.evictions} evicted')
+
+        lookups = cls.probes + cls.probe_hits
+        hit_rate = cls.probe_hits / lookups * 100.0 if lookups else 0.0
+        average_time = cls.probe_time / cls.probes * 1000.0 if cls.probes else 0.0
+        lines.append(f'{cls.probes} root probes averaging {average_time:.1f} ms, '
+                     f'{hit_rate:.1f} % cache hit rate ({len(cls.probe_cache)} cached)')
+        return lines
+
+    @staticmethod
+    def _get_key(kind: str, variant: str, paths: list[str]) -> Tablebase_Key:
+        return kind, variant, tuple(os.path.realpath(path) for path in paths)
+
+    @classmethod
+    def _add(cls, key: Tablebase_Key, tablebase: Tablebase) -> Tablebase_Handle:
+        handle = cls.handles[key] = Tablebase_Handle(tablebase)
+        cls.keys[id(tablebase)] = key
+        return handle
+
+    @classmethod
+    def _evict_idle(cls) -> None:
+        now = time.monotonic()
+        for key, handle in list(cls.handles.items()):
+            if handle.references or now - handle.released_at < IDLE_TIMEOUT:
+                continue
+
+            handle.tablebase.close()
+            del cls.handles[key]
+            del cls.keys[id(handle.tablebase)]
+            cls.evictions += 1
+
+            for probe_key in [probe_key for probe_key in cls.probe_cache if probe_key[0] == key]:
+                del cls.probe_cache[probe_key]
@@ -0,0 +1,119 @@
+import time
+from collections import deque
+from dataclasses import dataclass
+
+import chess
+import chess.engine
+
+from configs import Limit_Config
+
+# Expected number of our remaining moves, shrinking as the game goes on.
+MOVE_HORIZON = 60
+MIN_MOVES_LEFT = 20
+INCREMENT_SHARE = 0.75
+BOOK_EXIT_FACTOR = 1.5
+HARD_FACTOR = 3.0
+MAX_TIME_SHARE = 0.2
+MIN_RESERVE = 1.0
+MIN_BUDGET = 0.01
+# Search ends after the soft budget once the best move survived this many depths, unstable searches get longer.
+STABLE_DEPTHS = 3
+MAX_EXTENSION = 2.0
+SCORE_SAMPLES = 4
+
+
+@dataclass
+class Move_Budget:
+    soft: float
+    hard: float
+
+
+class Budget_Time_Manager:
+    def __init__(self) -> None:
+        self.scores: deque[int] = deque(maxlen=SCORE_SAMPLES)
+        self.last_ply: int | None = None
+
+    def reset(self) -> None:
+        self.scores.clear()
+        self.last_ply = None
+
+    def get_budget(self, board: chess.Board, own_time: float, increment: float) -> Move_Budget:
+        legal_moves = board.legal_moves.count()
+        if legal_moves == 1:
+            return Move_Budget(MIN_BUDGET, MIN_BUDGET)
+
+        moves_left = max(MOVE_HORIZON - board.fullmove_number, MIN_MOVES_LEFT)
+        soft = own_time / moves_left + increment * INCREMENT_SHARE
+        soft *= self._get_complexity_factor(board, legal_moves) * self._get_stability_factor()
+
+        # The first engine move after book or online moves meets a position without any search history.
+        if self.last_ply != board.ply() - 2:
+            soft *= BOOK_EXIT_FACTOR
+
+        hard = min(soft * HARD_FACTOR, own_time * MAX_TIME_SHARE + increment, own_time - MIN_RESERVE)
+        hard = max(hard, MIN_BUDGET)
+        return Move_Budget(min(soft, hard), hard)
+
+    async def search(self,
+                     engine: chess.engine.UciProtocol,
+                     board: chess.Board,
+                     own_time: float,
+                     increment: float,
+                     limit_config: Limit_Config) -> tuple[chess.Move | None, chess.engine.InfoDict]:
+        budget = self.get_budget(board, own_time, increment)
+        hard_limit = min(budget.hard, limit_config.time) if limit_config.time else budget.hard
+        limit = chess.engine.Limit(time=hard_limit, depth=limit_config.depth, nodes=limit_config.nodes)
+        # Analysis mode would change how some engines play, the search is still meant as a game move.
+        options = {'UCI_AnalyseMode': False} if 'UCI_AnalyseMode' in engine.options else {}
+
+        start_time = time.perf_counter()
+        best_move: chess.Move | None = None
+        best_depth = 0
+        stable_depths = 0
+        with await engine.analysis(board, limit, info=chess.engine.INFO_ALL, options=options) as analysis:
+            async for info in analysis:
+                if 'pv' not in info or 'depth' not in info:
+                    continue
+
+                if info['pv'][0] != best_move:
+                    best_move = info['pv'][0]
+                    stable_depths = 0
+                elif info['depth'] > best_depth:
+                    stable_depths += info['depth'] - best_depth
+                best_depth = info['depth']
+
+                elapsed = time.perf_counter() - start_time
+                if elapsed >= budget.soft and stable_depths >= STABLE_DEPTHS:
+                    break
+
+                if elapsed >= budget.soft * MAX_EXTENSION:
+                    break
+
+        best = await analysis.wait()
+        info = analysis.info
+        self.last_ply = board.ply()
+        if 'score' in info:
+            self.scores.append(info['score'].relative.score(mate_score=40_000))
+
+        return best.move or best_move, info
+
+    def _get_complexity_factor(self, board: chess.Board, legal_moves: int) -> float:
+        # Positions with many candidate moves or tactics around the king deserve more time.
+        factor = 0.75 + legal_moves / 80
+        if board.is_check():
+            factor += 0.15
+
+        return min(factor, 1.3)
+
+    def _get_stability_factor(self) -> float:
+        if len(self.scores) < 2:
+            return 1.0
+
+        swing = max(self.scores) - min(self.scores)
+        if swing < 30:
+            return 0.85
+
+        return 1.0 + min(swing / 200, 0.5)
+
+
+TIME_MANAGERS = {'budget': Budget_Time_Manager}
@@ -4,17 +4,27 @@ import logging
 import os
 import signal
 import sys
+import time
 from enum import StrEnum
-from typing import TypeVar
+from typing import Any, TypeVar
+
+import chess
+from chess.variant import VARIANTS, find_variant
 
 from api import API
+from book_store import Book_Store
 from botli_dataclasses import Challenge_Request
 from config import Config
+from configs import Engine_Config, Syzygy_Config
 from engine import Engine
+from engine_pool import Engine_Pool
 from enums import Challenge_Color, Perf_Type, Variant
 from event_handler import Event_Handler
 from game_manager import Game_Manager
 from logo import get_logo, LOGO
+from loop_monitor import Loop_Monitor
+from loop_setup import run
+from tablebase_store import Tablebase_Store
 
 try:
     import readline
@@ -29,24 +39,30 @@ COMMANDS = {
     'help': 'Prints this message.',
     'join': 'Joins a team. Usage: join TEAM_ID [PASSWORD]',
     'leave': 'Leaves tournament. Usage: leave ID',
+    'loop': 'Shows event loop lag and the callbacks that blocked the loop the longest.',
     'matchmaking': 'Starts matchmaking mode.',
     'quit': 'Exits the bot.',
     'rechallenge': 'Challenges the opponent to the last received challenge.',
     'rematch': 'Toggles automatic rematch offering on/off.',
     'rematch_status': 'Shows current rematch configuration and statistics.',
     'rematch_reset': 'Resets all rematch counts and clears pending rematches.',
+    'requests': 'Shows queued, delayed and rate limited API requests per priority lane.',
     'reset': 'Resets matchmaking. Usage: reset PERF_TYPE',
     'stop': 'Stops matchmaking mode.',
+    'tablebases': 'Shows open tablebases, hit counts and probe statistics.',
     'tournament': 'Joins tournament. Usage: tournament ID [TEAM_ID] [PASSWORD]',
     'whitelist': 'Temporarily whitelists a user. Use config for permanent whitelisting. Usage: whitelist USERNAME'
 }
 
 EnumT = TypeVar('EnumT', bound=StrEnum)
+MAX_PARALLEL_ENGINE_TESTS = 4
 
 
 class User_Interface:
-    async def main(self, commands: list[str], config_path: str, allow_upgrade: bool) -> None:
-        self.config = Config.from_yaml(config_path)
+    async def main(self, commands: list[str], config: Config, allow_upgrade: bool) -> None:
+        self.config = config
+        self.loop_monitor = Loop_Monitor(self.config.loop_monitor)
+        self.loop_monitor.start()
 
         async with API(self.config) as self.api:
 
@@ -55,9 +71,12 @@ class User_Interface:
             print(f'{get_logo(username)} {self.config.version}\n')
             self.api.append_user_agent(username)
             await self._handle_bot_status(account.get('title'), allow_upgrade)
+
+            self.engine_pool = Engine_Pool(self.config)
             await self._test_engines()
+            self._load_books()
 
-            self.game_manager = Game_Manager(self.api, self.config, username)
+            self.game_manager = Game_Manager(self.api, self.config, username, self.engine_pool)
             self.game_manager_task = asyncio.create_task(self.game_manager.run())
 
             self.event_handler = Event_Handler(self.api, self.config, username, self.game_manager)
@@ -117,10 +136,86 @@ class User_Interface:
             sys.exit(1)
 
     async def _test_engines(self) -> None:
+        engine_groups: dict[tuple[str, tuple[tuple[str, Any], ...]], list[str]] = {}
         for engine_name, engine_config in self.config.engines.items():
-            print(f'Testing engine "{engine_name}" ... ', end='', flush=True)
-            await Engine.test(engine_config)
-            print('OK')
+            engine_groups.setdefault(self._get_engine_test_key(engine_config), []).append(engine_name)
+
+        print(f'Testing {len(engine_groups)} engine(s) ...')
+        semaphore = asyncio.BoundedSemaphore(min(MAX_PARALLEL_ENGINE_TESTS, os.cpu_count() or 1))
+        results = await asyncio.gather(*(self._test_engine(engine_names, semaphore)
+                                         for engine_names in engine_groups.values()))
+
+        names_width = max(len(', '.join(engine_names)) for engine_names in engine_groups.values())
+        for engine_names, (duration, error) in zip(engine_groups.values(), results):
+            result_str = 'OK' if error is None else f'Failed: {error}'
+            print(f'{", ".join(engine_names):{names_width}}     {duration:6.2f} s     {result_str}')
+
+        for _, error in results:
+            if error is not None:
+                raise error
+
+    async def _test_engine(self,
+                           engine_names: list[str],
+                           semaphore: asyncio.BoundedSemaphore) -> tuple[float, Exception | None]:
+        engine_config = self.config.engines[engine_names[0]]
+        async with semaphore:
+            start_time = time.perf_counter()
+            try:
+                engine = await Engine.test(engine_config)
+            except Exception as e:
+                return time.perf_counter() - start_time, e
+
+            duration = time.perf_counter() - start_time
+
+        # Tested engines only match games without syzygy, as they were not configured for it.
+        # Game workers have their own engine pools, so the engines of the main process would stay idle.
+        if not self.config.game_workers.count and not any(syzygy_config.enabled
+                                                          for syzygy_config in self.config.syzygy.values()):
+            await self.engine_pool.add(engine_names[0], Syzygy_Config(False, [], 0, False), engine)
+        else:
+            await engine.close()
+
+        return duration, None
+
+    @staticmethod
+    def _get_engine_test_key(engine_config: Engine_Config) -> tuple[str, tuple[tuple[str, Any], ...]]:
+        return engine_config.path, tuple(sorted((name, str(value))
+                                                for name, value in engine_config.uci_options.items()))
+
+    def _load_books(self) -> None:
+        if not self.config.opening_books.enabled:
+            return
+
+        unplayed_variants = self._get_unplayed_variant_names()
+        book_paths = {path
+                      for key, books_config in self.config.opening_books.books.items()
+                      if key.split('_', 1)[0] not in unplayed_variants
+                      for path in books_config.names.values()}
+        if not book_paths:
+            return
+
+        start_time = time.perf_counter()
+        Book_Store.preload(sorted(book_paths))
+        print(f'Loaded {len(book_paths)} opening book(s) in {time.perf_counter() - start_time:.2f} s.')
+
+    def _get_unplayed_variant_names(self) -> set[str]:
+        # Book keys of variants are looked up by the lowercase aliases of the variant board.
+        played_variants = set(self.config.challenge.variants)
+        played_variants.update(type_config.variant
+                               for type_config in self.config.matchmaking.types.values()
+                               if type_config.variant)
+
+        played_boards = {find_variant(variant)
+                         for variant in played_variants
+                         if variant not in ['standard', 'chess960', 'fromPosition']}
+        unplayed_names = {alias.lower()
+                          for VariantBoard in VARIANTS
+                          if VariantBoard is not chess.Board and VariantBoard not in played_boards
+                          for alias in VariantBoard.aliases}
+        if 'chess960' not in played_variants:
+            unplayed_names.add('chess960')
+
+        return unplayed_names
 
     async def _handle_command(self, command: list[str]) -> None:
         match command[0]:
@@ -136,6 +231,8 @@ class User_Interface:
                 await self._join(command)
             case 'leave':
                 self._leave(command)
+            case 'loop':
+                self._loop()
             case 'matchmaking' | 'm':
                 self._matchmaking()
             case 'quit' | 'exit' | 'q':
@@ -149,10 +246,14 @@ class User_Interface:
                 self._rematch_status()
             case 'rematch_reset':
                 self._rematch_reset()
+            case 'requests':
+                self._requests()
             case 'reset':
                 self._reset(command)
             case 'stop' | 's':
                 self._stop()
+            case 'tablebases':
+                self._tablebases()
             case 'tournament':
                 self._tournament(command)
             case 'whitelist':
@@ -238,6 +339,10 @@ class User_Interface:
 
         self.game_manager.request_tournament_leaving(command[1])
 
+    def _loop(self) -> None:
+        for line in self.loop_monitor.get_summary():
+            print(line)
+
     def _matchmaking(self) -> None:
         print('Starting matchmaking ...')
         self.game_manager.start_matchmaking()
@@ -247,6 +352,7 @@ class User_Interface:
         print('Terminating program ...')
         self.event_handler_task.cancel()
         await self.game_manager_task
+        self.loop_monitor.stop()
 
     def _rechallenge(self) -> None:
         last_challenge_event = self.event_handler.last_challenge_event
@@ -335,6 +441,10 @@ class User_Interface:
             print(f'  Cleared pending rematch with {pending_before}')
         print('  All rematch counts reset to 0')
 
+    def _requests(self) -> None:
+        for line in self.api.scheduler.get_stats():
+            print(line)
+
     def _reset(self, command: list[str]) -> None:
         if len(command) != 2:
             print(COMMANDS['reset'])
@@ -355,6 +465,10 @@ class User_Interface:
         else:
             print('Matchmaking isn\'t currently running ...')
 
+    def _tablebases(self) -> None:
+        for line in Tablebase_Store.get_stats():
+            print(line)
+
     def _tournament(self, command: list[str]) -> None:
         if len(command) < 2 or len(command) > 4:
             print(COMMANDS['tournament'])
@@ -419,4 +533,6 @@ if __name__ == '__main__':
     if args.debug:
         logging.basicConfig(level=logging.DEBUG)
 
-    asyncio.run(User_Interface().main(args.commands, args.config, args.upgrade), debug=args.debug)
+    # The loop is chosen by the config, so it has to be read before the loop starts.
+    config = Config.from_yaml(args.config)
+    run(User_Interface().main(args.commands, config, args.upgrade), config.event_loop, debug=args.debug)